@@ -0,0 +1,308 @@
+"""
+Benchmark: end-to-end warehouse pipeline at several data sizes, with per-stage timings.
+
+For every size (number of StockEvents) it
+1. generates seeded synthetic OLTP data (analytics.data.synthetic_oltp) and builds the local
+   stand-in OLTP from it (analytics.data.local_oltp),
+2. initializes a scratch warehouse and runs run_inventory_warehouse() twice: the initial load,
+   then an incremental re-run with no new events,
+3. records wall time, rows/sec and peak RSS per stage (each dimension extract/transform/load,
+   the fact extract/load, both DQ passes and view creation) from the stage hooks in
+   analytics.etl.instrumentation.
+
+Each size runs in a fresh process so peak RSS is not inherited from a previous size. Results go
+to JSON. --baseline compares against an earlier results file and exits non-zero when a stage got
+slower than --tolerance, so runs can be compared across commits.
+
+Usage:
+    python -m analytics.benchmarks.bench_pipeline --sizes 10000 100000 1000000 --json bench.json
+    python -m analytics.benchmarks.bench_pipeline --sizes 100000 --baseline bench.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+
+from analytics.data import connect_db, local_oltp
+from analytics.data.synthetic_oltp import BASE_SIZES, generate_synthetic_oltp
+from analytics.etl import instrumentation
+from analytics.etl.instrumentation import add_stage_listener, remove_stage_listener
+from analytics.etl.run_pipeline import run_inventory_warehouse
+from analytics.warehouse.init_warehouse import init_warehouse
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+# Stages faster than this are too noisy to flag as regressions.
+MIN_COMPARABLE_SECONDS = 0.05
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+
+def current_rss() -> int | None:
+    """Resident set size of this process in bytes (Linux /proc; None where unavailable)."""
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return None
+
+
+class RSSSampler(threading.Thread):
+    """Samples the process RSS every `interval` seconds so peaks can be attributed to stages."""
+
+    def __init__(self, interval: float = 0.01):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append((time.perf_counter(), current_rss()))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.samples.append((time.perf_counter(), current_rss()))
+
+    def peak(self, start: float, end: float) -> int | None:
+        """Highest RSS sampled in [start, end], or the last sample before `end` for very short stages."""
+        in_window = [rss for ts, rss in self.samples if start <= ts <= end and rss is not None]
+        if in_window:
+            return max(in_window)
+        before = [rss for ts, rss in self.samples if ts <= end and rss is not None]
+        return before[-1] if before else None
+
+
+def _mb(value):
+    return None if value is None else round(value / 2**20, 1)
+
+
+def summarize_stages(spans: list[dict], sampler: RSSSampler, run_start: float) -> list[dict]:
+    """
+    Aggregates spans by stage name (streamed transforms emit one span per batch), in first-seen order.
+    "rows" is the stage's rows_out: rows extracted, transformed or written.
+    """
+    stages = {}
+    for span in spans:
+        entry = stages.setdefault(span["stage"], {
+            "stage": span["stage"], "calls": 0, "seconds": 0.0, "rows": None, "status": "ok",
+            "offset_seconds": round(span["start"] - run_start, 4), "peak_rss": None,
+        })
+        entry["calls"] += 1
+        entry["seconds"] += span["seconds"]
+        if span["rows_out"] is not None:
+            entry["rows"] = (entry["rows"] or 0) + span["rows_out"]
+        if span["status"] != "ok":
+            entry["status"] = span["status"]
+        peak = sampler.peak(span["start"], span["end"])
+        if peak is not None:
+            entry["peak_rss"] = max(entry["peak_rss"] or 0, peak)
+
+    results = []
+    for entry in stages.values():
+        seconds = entry["seconds"]
+        results.append({
+            "stage": entry["stage"],
+            "calls": entry["calls"],
+            "seconds": round(seconds, 4),
+            "rows": entry["rows"],
+            "rows_per_sec": round(entry["rows"] / seconds) if entry["rows"] and seconds > 0 else None,
+            "peak_rss_mb": _mb(entry["peak_rss"]),
+            "offset_seconds": entry["offset_seconds"],
+            "status": entry["status"],
+        })
+    return results
+
+
+def timed_pipeline_run(mode: str, events: int, chunksize, parallel_dimensions: bool) -> dict:
+    """Runs the pipeline once with stage listeners and the RSS sampler attached."""
+    spans = []
+    add_stage_listener(spans.append)
+    sampler = RSSSampler()
+    sampler.start()
+    start = time.perf_counter()
+    error = None
+    try:
+        run_inventory_warehouse(chunksize=chunksize, parallel_dimensions=parallel_dimensions)
+    except Exception as e:
+        error = str(e)
+    finally:
+        wall = time.perf_counter() - start
+        sampler.stop()
+        remove_stage_listener(spans.append)
+
+    return {
+        "mode": mode,
+        "events": events,
+        "wall_seconds": round(wall, 4),
+        "events_per_sec": round(events / wall) if mode == "initial" and wall > 0 else None,
+        "peak_rss_mb": _mb(max((rss for _, rss in sampler.samples if rss is not None), default=None)),
+        "error": error,
+        "stages": summarize_stages(spans, sampler, start),
+    }
+
+
+def run_size(events: int, seed: int, chunksize, parallel_dimensions: bool, work_dir, verbose: bool) -> dict:
+    """
+    Benchmarks one data size end to end. Runs in a child process: it repoints the OLTP backend
+    and the warehouse at scratch files, which must not leak into other sizes.
+    """
+    if not verbose:
+        logging.disable(logging.INFO)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+    with tempfile.TemporaryDirectory(prefix=f"labhub_bench_{events}_", dir=work_dir) as tmp, output:
+        tmp = Path(tmp)
+        setup = {}
+
+        start = time.perf_counter()
+        # Entity tables grow with the event count as in synthetic_oltp's scale factor.
+        scale = max(events / BASE_SIZES["events"], 1.0)
+        sizes = generate_synthetic_oltp(tmp / "source", scale=scale, events=events, seed=seed)
+        setup["generate_seconds"] = round(time.perf_counter() - start, 4)
+
+        start = time.perf_counter()
+        local_oltp.build_local_oltp(tmp / "oltp.duckdb", parquet_dir=tmp / "source")
+        setup["build_oltp_seconds"] = round(time.perf_counter() - start, 4)
+
+        local_oltp.LOCAL_OLTP_DB = tmp / "oltp.duckdb"
+        connect_db.OLTP_BACKEND = "local"
+        connect_db.WAREHOUSE_DB = tmp / "warehouse.duckdb"
+        instrumentation.METRICS_FILE = str(tmp / "etl_metrics.prom")
+        init_warehouse(connect_db.WAREHOUSE_DB)
+
+        runs = [
+            timed_pipeline_run("initial", events, chunksize, parallel_dimensions),
+            timed_pipeline_run("incremental", events, chunksize, parallel_dimensions),
+        ]
+        with duckdb.connect(str(connect_db.WAREHOUSE_DB), read_only=True) as conn:
+            fact_rows = conn.execute("SELECT COUNT(*) FROM dw.Fact_Inventory_Transactions").fetchone()[0]
+        connect_db.get_oltp_pool().close_all()
+
+    return {"events": events, "source_sizes": sizes, "fact_rows": fact_rows, "setup": setup, "runs": runs}
+
+
+def environment_info() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "duckdb": duckdb.__version__,
+        "pyarrow": pa.__version__,
+    }
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, seed: int = 42, chunksize=None, parallel_dimensions: bool = True,
+                  work_dir=None, verbose: bool = False) -> dict:
+    results = {
+        "environment": environment_info(),
+        "config": {"seed": seed, "chunksize": chunksize, "parallel_dimensions": parallel_dimensions},
+        "sizes": [],
+    }
+    spawn = multiprocessing.get_context("spawn")
+    for events in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            results["sizes"].append(
+                executor.submit(run_size, events, seed, chunksize, parallel_dimensions, work_dir, verbose).result()
+            )
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns a line per stage (or whole run) that is slower than the baseline by more than `tolerance`."""
+    def index(data):
+        timings = {}
+        for size in data["sizes"]:
+            for run in size["runs"]:
+                timings[(size["events"], run["mode"], "TOTAL")] = run["wall_seconds"]
+                for s in run["stages"]:
+                    timings[(size["events"], run["mode"], s["stage"])] = s["seconds"]
+        return timings
+
+    before = index(baseline)
+    regressions = []
+    for key, seconds in index(results).items():
+        old = before.get(key)
+        if old is None or max(old, seconds) < MIN_COMPARABLE_SECONDS:
+            continue
+        if seconds > old * (1 + tolerance):
+            events, mode, name = key
+            regressions.append(f"{events:,} events / {mode} / {name}: {old:.3f}s -> {seconds:.3f}s "
+                               f"(+{(seconds / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_results(results: dict):
+    for size in results["sizes"]:
+        for run in size["runs"]:
+            print(f"\n{'='*92}")
+            print(f"⏱️  {size['events']:,} events — {run['mode']} run: {run['wall_seconds']:.2f}s wall, "
+                  f"peak RSS {run['peak_rss_mb']} MB" + (f"  ❌ {run['error']}" if run["error"] else ""))
+            print(f"{'='*92}")
+            print(f"  {'stage':<26}{'calls':>6}{'seconds':>10}{'rows':>12}{'rows/s':>14}{'peak MB':>10}")
+            for s in run["stages"]:
+                rows = f"{s['rows']:,}" if s["rows"] is not None else "-"
+                rate = f"{s['rows_per_sec']:,}" if s["rows_per_sec"] is not None else "-"
+                print(f"  {s['stage']:<26}{s['calls']:>6}{s['seconds']:>10.3f}{rows:>12}{rate:>14}"
+                      f"{str(s['peak_rss_mb']):>10}")
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the warehouse pipeline end to end at several sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="StockEvent counts to benchmark.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic data.")
+    parser.add_argument("--stream", type=int, default=None, metavar="CHUNK_SIZE", help="Run the pipeline in streaming mode.")
+    parser.add_argument("--sequential-dims", action="store_true", help="Extract dimensions one after another.")
+    parser.add_argument("--work-dir", type=Path, default=None, help="Directory for scratch databases (default: system temp).")
+    parser.add_argument("--json", type=Path, default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier results JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs the baseline (0.25 = 25%%).")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline logs and reports.")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sizes, args.seed, args.stream, not args.sequential_dims, args.work_dir, args.verbose)
+    print_results(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json}")
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) vs {args.baseline}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"✅ No regressions vs {args.baseline} (tolerance {args.tolerance:.0%}).")
@@ -0,0 +1,216 @@
+"""
+Benchmark: OLTP -> DuckDB staging throughput, pandas path vs Arrow path.
+
+Compares rows/sec for
+- pandas (previous path): pd.read_sql -> object columns -> duck_conn.register -> INSERT...SELECT
+- arrow cursor: cursor.fetchmany -> Arrow record batches -> DuckDB scan (staging.stage_batches)
+- pandas parquet vs arrow parquet snapshot (staging.iter_snapshot_batches)
+
+The source is an in-memory DB-API connection that replays the bundled
+inventory.StockEvent CSVs (repeated `--scale` times) with the Python types pyodbc
+returns for SQL Server (int, Decimal for DECIMAL(12,2), datetime for DATETIME2). It runs
+without SQL Server and leaves out network/driver time, so only the row -> column ->
+DuckDB conversion work differs between the paths.
+
+Usage:
+    python -m analytics.benchmarks.bench_staging --scale 20 --chunk-size 50000
+"""
+
+import argparse
+import datetime
+import decimal
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from analytics.etl.staging import DEFAULT_CHUNK_SIZE, iter_oltp_batches, iter_snapshot_batches, stage_batches
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data" / "generated_data_OLTP"
+QUERY = """
+    SELECT StockEventID, InventoryItemID, LocationID, UserID,
+           OldQuantity, NewQuantity, EventType, EventDate
+    FROM StockEvent
+"""
+
+
+def load_stock_events() -> pa.Table:
+    """Reads the bundled StockEvent CSVs into one Arrow table."""
+    tables = [
+        pa_csv.read_csv(
+            path,
+            convert_options=pa_csv.ConvertOptions(timestamp_parsers=["%m/%d/%Y %H:%M"]),
+        )
+        for path in sorted(DATA_DIR.glob("inventory_StockEvent_*.csv"))
+    ]
+    return pa.concat_tables(tables, promote_options="default")
+
+
+class ReplayCursor:
+    """Minimal DB-API cursor that serves pre-built rows, like pyodbc would after a query."""
+
+    def __init__(self, rows, description):
+        self._rows = rows
+        self._position = 0
+        self.description = description
+
+    def execute(self, query, params=None):
+        self._position = 0
+        return self
+
+    def fetchmany(self, size):
+        chunk = self._rows[self._position:self._position + size]
+        self._position += len(chunk)
+        return chunk
+
+    def fetchall(self):
+        return self.fetchmany(len(self._rows) - self._position)
+
+    def close(self):
+        pass
+
+
+class ReplayConnection:
+    """Minimal DB-API connection around ReplayCursor."""
+
+    def __init__(self, rows, description):
+        self._rows = rows
+        self._description = description
+
+    def cursor(self):
+        return ReplayCursor(self._rows, self._description)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def build_source(events: pa.Table, scale: int) -> ReplayConnection:
+    """Builds a replay connection over `scale` copies of the events, typed like pyodbc rows."""
+    description = [
+        ("StockEventID", int, None, 19, 19, 0, False),
+        ("InventoryItemID", int, None, 19, 19, 0, True),
+        ("LocationID", int, None, 19, 19, 0, True),
+        ("UserID", int, None, 19, 19, 0, True),
+        ("OldQuantity", decimal.Decimal, None, 12, 12, 2, True),
+        ("NewQuantity", decimal.Decimal, None, 12, 12, 2, True),
+        ("EventType", str, None, 32, 32, 0, True),
+        ("EventDate", datetime.datetime, None, 27, 27, 7, True),
+    ]
+    base_rows = events.to_pylist()
+    id_offset = max(row["StockEventID"] for row in base_rows)
+    rows = [
+        (
+            row["StockEventID"] + copy * id_offset, row["InventoryItemID"], row["LocationID"], row["UserID"],
+            decimal.Decimal(row["OldQuantity"]).quantize(decimal.Decimal("0.01")),
+            decimal.Decimal(row["NewQuantity"]).quantize(decimal.Decimal("0.01")),
+            row["EventType"], row["EventDate"],
+        )
+        for copy in range(scale)
+        for row in base_rows
+    ]
+    return ReplayConnection(rows, description)
+
+
+def pandas_cursor_path(duck_conn, source_conn, chunk_size):
+    df = pd.read_sql(QUERY, source_conn)
+    duck_conn.register("tmp_bench", df)
+    duck_conn.execute("CREATE OR REPLACE TEMP TABLE stg_bench AS SELECT * FROM tmp_bench;")
+    duck_conn.unregister("tmp_bench")
+    return len(df)
+
+
+def arrow_cursor_path(duck_conn, source_conn, chunk_size):
+    return stage_batches(duck_conn, "stg_bench", iter_oltp_batches(QUERY, conn=source_conn, chunksize=chunk_size))
+
+
+def pandas_snapshot_path(duck_conn, snapshot_path, chunk_size):
+    df = pd.read_parquet(snapshot_path)
+    duck_conn.register("tmp_bench", df)
+    duck_conn.execute("CREATE OR REPLACE TEMP TABLE stg_bench AS SELECT * FROM tmp_bench;")
+    duck_conn.unregister("tmp_bench")
+    return len(df)
+
+
+def arrow_snapshot_path(duck_conn, snapshot_path, chunk_size):
+    return stage_batches(duck_conn, "stg_bench", iter_snapshot_batches(snapshot_path, chunksize=chunk_size))
+
+
+def time_path(path_fn, source, chunk_size, repeats):
+    """Returns (rows, best seconds) over `repeats` runs, each into a fresh DuckDB."""
+    best = None
+    rows = 0
+    for _ in range(repeats):
+        duck_conn = duckdb.connect()
+        try:
+            start = time.perf_counter()
+            rows = path_fn(duck_conn, source, chunk_size)
+            elapsed = time.perf_counter() - start
+        finally:
+            duck_conn.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return rows, best
+
+
+def run_benchmark(scale: int = 10, chunk_size: int = DEFAULT_CHUNK_SIZE, repeats: int = 3) -> list[dict]:
+    events = load_stock_events()
+    source_conn = build_source(events, scale)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = Path(tmp_dir) / "StockEvent.parquet"
+        pq.write_table(
+            pa.Table.from_batches(list(iter_oltp_batches(QUERY, conn=source_conn, chunksize=chunk_size))),
+            snapshot_path,
+        )
+
+        cases = [
+            ("pandas cursor (previous)", pandas_cursor_path, source_conn),
+            ("arrow cursor", arrow_cursor_path, source_conn),
+            ("pandas parquet snapshot", pandas_snapshot_path, snapshot_path),
+            ("arrow parquet snapshot", arrow_snapshot_path, snapshot_path),
+        ]
+        for name, path_fn, source in cases:
+            rows, seconds = time_path(path_fn, source, chunk_size, repeats)
+            results.append({
+                "path": name,
+                "rows": rows,
+                "seconds": round(seconds, 4),
+                "rows_per_sec": round(rows / seconds) if seconds else None,
+            })
+    source_conn.close()
+    return results
+
+
+def print_results(results: list[dict]):
+    print(f"\n{'='*64}")
+    print("⏱️  STAGING THROUGHPUT (best of runs)")
+    print(f"{'='*64}")
+    baseline = {r["path"].split()[1]: r["rows_per_sec"] for r in results if r["path"].startswith("pandas")}
+    for r in results:
+        kind = r["path"].split()[1]
+        speedup = r["rows_per_sec"] / baseline[kind] if baseline.get(kind) else 1.0
+        print(f"  {r['path']:<28} {r['rows']:>10,} rows  {r['seconds']:>8.3f}s  "
+              f"{r['rows_per_sec']:>12,} rows/s  x{speedup:.2f}")
+    print(f"{'='*64}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pandas vs Arrow staging throughput.")
+    parser.add_argument("--scale", type=int, default=10, help="Copies of the bundled StockEvent CSVs to load.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per fetchmany()/record batch.")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per path; the best time is reported.")
+    parser.add_argument("--json", type=Path, default=None, help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.scale, args.chunk_size, args.repeats)
+    print_results(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
@@ -8,6 +8,14 @@ try:
     import pyodbc
 except ImportError:
     pyodbc = None
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+import os
+import threading
+import time
 import pandas as pd
 import duckdb
 from pathlib import Path
@@ -16,15 +24,26 @@ from pathlib import Path
 # Config
 # -------------------------
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
-WAREHOUSE_DB = PROJECT_ROOT / "warehouse" / "warehouse.duckdb"
+WAREHOUSE_DB = Path(os.getenv("LABHUB_WAREHOUSE_DB", PROJECT_ROOT / "warehouse" / "warehouse.duckdb"))
 
 
-Driver = 'ODBC Driver 18 for SQL Server'
-Server = r'TABLET-LTM0C509\SQLEXPRESS01'
-Database = 'CS779_LabHub_final'
+# OLTP settings can be overridden through the environment (or a .env file).
+Driver = os.getenv("LABHUB_OLTP_DRIVER", 'ODBC Driver 18 for SQL Server')
+Server = os.getenv("LABHUB_OLTP_SERVER", r'TABLET-LTM0C509\SQLEXPRESS01')
+Database = os.getenv("LABHUB_OLTP_DATABASE", 'CS779_LabHub_final')
 
-def get_oltp_connection(): 
-    """Returns a connection to the SQL Server OLTP."""
+# "mssql" (default) or "local" for the DuckDB stand-in built by analytics/data/local_oltp.py.
+OLTP_BACKEND = os.getenv("LABHUB_OLTP_BACKEND", "mssql").lower()
+
+# Max open OLTP connections (0 disables pooling) and how long to wait for a free one.
+POOL_SIZE = int(os.getenv("LABHUB_OLTP_POOL_SIZE", "4"))
+POOL_TIMEOUT = float(os.getenv("LABHUB_OLTP_POOL_TIMEOUT", "30"))
+
+def connect_oltp():
+    """Opens a new, unpooled connection to the OLTP (SQL Server, or the local stand-in)."""
+    if OLTP_BACKEND == "local":
+        from analytics.data.local_oltp import connect_local_oltp
+        return connect_local_oltp()
     conn_str = ( 
         f"DRIVER={{{Driver}}};"
         f"SERVER={Server};"
@@ -35,6 +54,182 @@ def get_oltp_connection():
     ) 
     return pyodbc.connect(conn_str)
 
+
+# -------------------------
+# Connection pool
+# -------------------------
+class PooledConnection:
+    """
+    Thin wrapper around a DB-API connection borrowed from the pool.
+    Behaves like the wrapped connection, except close() hands it back to the pool.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class OLTPConnectionPool:
+    """
+    Keeps warm OLTP connections so extractors in a pipeline run (including the
+    parallel dimension extracts) don't pay the connect + encryption handshake each time.
+
+    - At most `max_size` connections are open. When all are in use, acquire() waits
+      up to `timeout` seconds for one to be released or discarded.
+    - Idle connections are validated with a cheap query before being handed out;
+      broken ones are discarded and replaced.
+    - Counters (created / reused / discarded / waits / wait_seconds) are exposed via stats().
+
+    The open count and the idle connections are guarded by one Condition. Every path that
+    frees a slot (release, discard, close_all) notifies it, so waiters re-check both.
+    """
+
+    def __init__(self, connect=None, max_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 validation_query: str = "SELECT 1"):
+        self._connect = connect or connect_oltp
+        self.max_size = max_size
+        self.timeout = timeout
+        self.validation_query = validation_query
+        self._idle = []  # used as a LIFO stack: hands out the most recently used (warmest) connection
+        self._available = threading.Condition()
+        self._open = 0
+        self._counters = {"created": 0, "reused": 0, "discarded": 0, "waits": 0, "wait_seconds": 0.0}
+
+    def _count(self, name, amount=1):
+        with self._available:
+            self._counters[name] += amount
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.validation_query)
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._available:
+            self._open -= 1
+            self._counters["discarded"] += 1
+            self._available.notify()
+
+    def _checkout(self, deadline: float):
+        """
+        Waits until an idle connection or a free slot is available.
+        Returns (idle connection, None) or (None, True) when the caller may open a new one.
+        """
+        wait_start = None
+        with self._available:
+            try:
+                while True:
+                    if self._idle:
+                        return self._idle.pop(), None
+                    if self._open < self.max_size:
+                        self._open += 1
+                        return None, True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(
+                            f"No OLTP connection available after {self.timeout}s (pool size {self.max_size})."
+                        )
+                    # Pool exhausted: wait for another thread to release or discard a connection.
+                    if wait_start is None:
+                        wait_start = time.perf_counter()
+                        self._counters["waits"] += 1
+                    self._available.wait(remaining)
+            finally:
+                if wait_start is not None:
+                    self._counters["wait_seconds"] += time.perf_counter() - wait_start
+
+    def acquire(self) -> PooledConnection:
+        """Returns a validated connection, creating one if the pool has room."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, create = self._checkout(deadline)
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._available:
+                        self._open -= 1
+                        self._available.notify()
+                    raise
+                self._count("created")
+                return PooledConnection(self, conn)
+
+            if self._is_healthy(conn):
+                self._count("reused")
+                return PooledConnection(self, conn)
+            self._discard(conn)
+
+    def release(self, conn):
+        """Returns a connection to the pool, ending any open transaction first."""
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    def close_all(self):
+        """Closes every idle connection. Connections still checked out close on release."""
+        with self._available:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self._available:
+            stats = dict(self._counters)
+            stats["open"] = self._open
+            stats["idle"] = len(self._idle)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_oltp_pool() -> OLTPConnectionPool:
+    """Returns the process-wide OLTP pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OLTPConnectionPool()
+        return _pool
+
+def get_oltp_connection(): 
+    """
+    Returns a connection to the SQL Server OLTP.
+    Connections come from the shared pool; calling close() returns them to it.
+    Set LABHUB_OLTP_POOL_SIZE=0 to get a fresh unpooled connection instead.
+    """
+    if POOL_SIZE <= 0:
+        return connect_oltp()
+    return get_oltp_pool().acquire()
+
 def get_warehouse_conn():
     """Returns a connection to the DuckDB Warehouse."""
     return duckdb.connect(str(WAREHOUSE_DB))
@@ -0,0 +1,235 @@
+"""
+LOCAL STAND-IN FOR THE SQL SERVER OLTP.
+BUILDS A DUCKDB FILE WITH THE SAME core.* AND inventory.* TABLES, USING THE T-SQL DDL IN `sql db/`
+AND THE CSV EXPORTS IN generated_data_OLTP/, SO THE ETL CAN RUN (AND BE BENCHMARKED) WITHOUT SQL SERVER.
+
+Usage:
+    python -m analytics.data.local_oltp --scale 10
+    LABHUB_OLTP_BACKEND=local python -m analytics.etl.run_pipeline
+"""
+
+import argparse
+import os
+import re
+from pathlib import Path
+
+import duckdb
+from analytics.etl.instrumentation import get_logger
+
+# --- Logging Setup ---
+logger = get_logger(__name__, "Local_OLTP")
+
+# -------------------------
+# Config
+# -------------------------
+DATA_DIR = Path(__file__).resolve().parent
+CSV_DIR = DATA_DIR / "generated_data_OLTP"
+DDL_DIR = DATA_DIR.parents[1] / "sql db" / "CS779_LabHub_db"
+LOCAL_OLTP_DB = Path(os.getenv("LABHUB_LOCAL_OLTP_DB", DATA_DIR / "local_oltp.duckdb"))
+
+# Scripts replayed in order. Workflow/supply-chain tables are not read by the ETL.
+DDL_SCRIPTS = ("02_core_tables.sql", "05_inventory.sql", "10_seed_data.sql")
+
+# (target table, CSV file or glob, extra read_csv arguments for the non-ISO date exports)
+CSV_SOURCES = (
+    ('core.Product', "core.Product_01.csv", ""),
+    ('core.Vendor', "core.Vendor_01.csv", ""),
+    ('core."User"', "core.User_02.csv", ""),
+    ('inventory.Location', "inventory.location.csv", ""),
+    ('inventory.InventoryItem', "inventory_InventoryItem_02.csv", "dateformat='%m/%d/%Y'"),
+    ('inventory.StockEvent', "inventory_StockEvent_*.csv", "timestampformat='%m/%d/%Y %H:%M'"),
+)
+
+# Synthesized copies of an event land within +/- this many days of the original.
+JITTER_DAYS = 7
+
+# -------------------------
+# T-SQL -> DuckDB
+# -------------------------
+_TSQL_ONLY_LINE = re.compile(r"^\s*(GO|USE\s+\w+;?|BEGIN\s+TRAN(SACTION)?;?|COMMIT;?)\s*$", re.IGNORECASE)
+_IDENTITY_TABLE = re.compile(r'CREATE TABLE (\w+)\.("?)(\w+)"?(\s*\(\s*\w+\s+BIGINT)\s+IDENTITY', re.IGNORECASE)
+
+
+def translate_tsql(sql: str) -> str:
+    """
+    Rewrites the repo's T-SQL DDL/seed scripts into DuckDB SQL.
+    Drops batch separators and USE/transaction lines, turns IDENTITY columns into
+    sequence defaults and maps the SQL Server-only types and functions.
+    """
+    sql = "\n".join(line for line in sql.splitlines() if not _TSQL_ONLY_LINE.match(line))
+    sql = re.sub(r"\[(\w+)\]", r'"\1"', sql)
+    sql = re.sub(r"\bDATETIME2\b", "TIMESTAMP", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bSYSDATETIME\(\)", "current_timestamp", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bCREATE SCHEMA (\w+)", r"CREATE SCHEMA IF NOT EXISTS \1", sql, flags=re.IGNORECASE)
+
+    def identity_to_sequence(match):
+        schema, quote, table, first_column = match.groups()
+        sequence = f"{schema}.seq_{table.lower()}"
+        return (
+            f"CREATE SEQUENCE IF NOT EXISTS {sequence};\n"
+            f"CREATE TABLE {schema}.{quote}{table}{quote}{first_column} DEFAULT nextval('{sequence}')"
+        )
+
+    return _IDENTITY_TABLE.sub(identity_to_sequence, sql)
+
+# -------------------------
+# Build
+# -------------------------
+def load_csv(conn, table: str, pattern: str, options: str = "") -> int:
+    """Appends one CSV export (or a glob of them) to an OLTP table, matching columns by name."""
+    path = str(CSV_DIR / pattern).replace("'", "''")
+    extra = f", {options}" if options else ""
+    # Read into a scratch table first; inserting straight from read_csv would parse with the target's types.
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE tmp_csv AS SELECT * FROM read_csv('{path}', header=true{extra});")
+    conn.execute(f"INSERT INTO {table} BY NAME SELECT * FROM tmp_csv;")
+    conn.execute("DROP TABLE tmp_csv;")
+    return conn.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+
+
+def load_parquet(conn, table: str, path: Path) -> int:
+    """Appends a Parquet snapshot (e.g. from analytics.data.synthetic_oltp) to an OLTP table."""
+    conn.execute(f"INSERT INTO {table} BY NAME SELECT * FROM read_parquet(?);", [str(path)])
+    return conn.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+
+
+def advance_sequences(conn):
+    """
+    Moves every IDENTITY sequence past the IDs loaded into its column, so later inserts without
+    an explicit ID do not collide. DuckDB has no setval, and a sequence used by a column default
+    cannot be recreated with a new START, so each one is advanced with nextval().
+    """
+    columns = conn.execute("""
+        SELECT schema_name, table_name, column_name, column_default
+        FROM duckdb_columns()
+        WHERE column_default LIKE 'nextval(%';
+    """).fetchall()
+    for schema, table, column, default in columns:
+        sequence = re.search(r"nextval\('([^']+)'\)", default).group(1)
+        seq_schema, seq_name = sequence.split(".", 1)
+        last_value = conn.execute(
+            "SELECT COALESCE(last_value, 0) FROM duckdb_sequences() WHERE schema_name = ? AND sequence_name = ?",
+            [seq_schema, seq_name],
+        ).fetchone()[0]
+        max_id = conn.execute(f'SELECT COALESCE(MAX({column}), 0) FROM {schema}."{table}"').fetchone()[0]
+        if max_id > last_value:
+            conn.execute(f"SELECT MAX(nextval('{sequence}')) FROM range({max_id - last_value});")
+
+
+def synthesize_stock_events(conn, scale: int, seed: int = 42) -> int:
+    """
+    Grows inventory.StockEvent to `scale` times its loaded size for load testing.
+    Each extra copy keeps the item/location/user/quantities of an original event, gets a new
+    StockEventID and a deterministic (seeded) time shift of up to JITTER_DAYS, clamped to the
+    original date range, so daily volumes scale while the seasonal shape is preserved.
+    """
+    conn.execute(f"""
+        INSERT INTO inventory.StockEvent
+        SELECT
+            e.StockEventID + copy.i * bounds.MaxID,
+            e.InventoryItemID,
+            e.LocationID,
+            e.UserID,
+            e.OldQuantity,
+            e.NewQuantity,
+            e.EventType,
+            LEAST(GREATEST(
+                e.EventDate + to_seconds(
+                    (hash(e.StockEventID, copy.i, ?) % {2 * JITTER_DAYS * 86400})::BIGINT - {JITTER_DAYS * 86400}
+                ),
+                bounds.MinDate), bounds.MaxDate)
+        FROM inventory.StockEvent e
+        CROSS JOIN range(1, ?) copy(i)
+        CROSS JOIN (
+            SELECT MAX(StockEventID) AS MaxID, MIN(EventDate) AS MinDate, MAX(EventDate) AS MaxDate
+            FROM inventory.StockEvent
+        ) bounds;
+    """, [seed, scale])
+    return conn.execute("SELECT COUNT(*) FROM inventory.StockEvent;").fetchone()[0]
+
+
+def build_local_oltp(db_path=LOCAL_OLTP_DB, scale: int = 1, seed: int = 42, parquet_dir=None) -> Path:
+    """
+    (Re)creates the local OLTP database file.
+
+    Args:
+        db_path: Target DuckDB file; an existing file is replaced.
+        scale: StockEvent multiplier (1 = the CSVs as-is, 10-1000 for load tests).
+        seed: Seed for the synthesized event timestamps.
+        parquet_dir: Optional directory of <schema>.<Table>.parquet snapshots (see synthetic_oltp.py).
+            Tables with a snapshot there are loaded from it instead of the bundled CSVs.
+    """
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    for stale in (db_path, db_path.with_name(db_path.name + ".wal")):
+        if stale.exists():
+            stale.unlink()
+
+    conn = duckdb.connect(str(db_path))
+    try:
+        for script in DDL_SCRIPTS:
+            conn.execute(translate_tsql((DDL_DIR / script).read_text(encoding="utf-8-sig")))
+
+        for table, pattern, options in CSV_SOURCES:
+            snapshot = Path(parquet_dir) / (table.replace('"', "") + ".parquet") if parquet_dir else None
+            if snapshot is not None and snapshot.exists():
+                rows = load_parquet(conn, table, snapshot)
+            else:
+                rows = load_csv(conn, table, pattern, options)
+            logger.info(f"Loaded {rows} rows into {table}.")
+
+        if scale > 1:
+            rows = synthesize_stock_events(conn, scale, seed)
+            logger.info(f"Synthesized StockEvents up to {rows} rows (scale x{scale}).")
+        advance_sequences(conn)
+        conn.execute("CHECKPOINT;")
+    finally:
+        conn.close()
+
+    logger.info(f"✅ Local OLTP ready at {db_path}")
+    return db_path
+
+# -------------------------
+# Connection
+# -------------------------
+class LocalOLTPConnection:
+    """
+    DB-API style connection to the local OLTP, shaped like the pyodbc one the extractors expect.
+    Opened read-only; commit/rollback are no-ops so the connection pool can recycle it.
+    """
+
+    def __init__(self, db_path):
+        self._conn = duckdb.connect(str(db_path), read_only=True)
+
+    def cursor(self):
+        return self._conn.cursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+def connect_local_oltp(db_path=None) -> LocalOLTPConnection:
+    """Opens the local OLTP built by build_local_oltp() (LOCAL_OLTP_DB unless a path is given)."""
+    db_path = db_path or LOCAL_OLTP_DB
+    if not Path(db_path).exists():
+        raise FileNotFoundError(
+            f"Local OLTP not found at {db_path}. Build it with: python -m analytics.data.local_oltp"
+        )
+    return LocalOLTPConnection(db_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local DuckDB stand-in for the OLTP.")
+    parser.add_argument("--db", type=Path, default=LOCAL_OLTP_DB, help="Target DuckDB file.")
+    parser.add_argument("--scale", type=int, default=1, help="StockEvent multiplier for load testing (e.g. 10-1000).")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for synthesized event timestamps.")
+    parser.add_argument("--from-parquet", type=Path, default=None,
+                        help="Load tables from Parquet snapshots in this directory (e.g. synthetic_oltp output).")
+    args = parser.parse_args()
+
+    build_local_oltp(args.db, args.scale, args.seed, args.from_parquet)
@@ -0,0 +1,323 @@
+"""
+SYNTHETIC OLTP DATA GENERATOR FOR SCALING BENCHMARKS.
+WRITES OLTP-SHAPED Product, User, Location, InventoryItem AND StockEvent PARQUET FILES AT A CHOSEN SCALE.
+
+- Deterministic: the same seed and sizes give the same files, whatever the chunk size.
+- Realistic skew: a few hot products take most of the events (Zipf), a few rooms hold most of the
+  items, and event volume follows the academic calendar (weekday/weekend, semester peaks, summer dip).
+- Quantities are consistent: each event's OldQuantity is the previous event's NewQuantity for
+  that item and stock never goes negative. InventoryItem.Quantity is the final stock level.
+- StockEvents stream to Parquet one chunk (row group) at a time, so memory is bounded by the chunk
+  size and the entity tables, not the number of events.
+
+Column names match the OLTP tables, so the output can be loaded into the local stand-in OLTP:
+    python -m analytics.data.synthetic_oltp --events 10000000 --out /tmp/labhub_10m
+    python -m analytics.data.local_oltp --from-parquet /tmp/labhub_10m
+"""
+
+import argparse
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from analytics.etl.instrumentation import get_logger
+
+# --- Logging Setup ---
+logger = get_logger(__name__, "Synthetic_OLTP")
+
+# -------------------------
+# Config
+# -------------------------
+CSV_DIR = Path(__file__).resolve().parent / "generated_data_OLTP"
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parent / "synthetic_OLTP"
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+# Sizes of the bundled CSV data set (scale 1). Entity tables grow with sqrt(scale), events linearly.
+BASE_SIZES = {"products": 500, "locations": 113, "users": 334, "items": 1000, "events": 7000}
+
+# Distribution shape
+PRODUCT_ZIPF = 1.1      # hot products
+LOCATION_ZIPF = 0.8     # skewed rooms
+USER_ZIPF = 0.6         # a core of very active users
+EVENT_TYPES = np.array(["Add", "Remove", "Transfer"])
+EVENT_TYPE_WEIGHTS = [0.30, 0.45, 0.25]
+MAX_EVENT_QUANTITY = 50
+WEEKDAY_WEIGHTS = np.array([1.0, 1.05, 1.05, 1.0, 0.9, 0.35, 0.25])  # Mon..Sun
+MONTH_WEIGHTS = np.array([0.8, 1.0, 1.05, 1.1, 0.9, 0.7, 0.6, 0.75, 1.1, 1.15, 1.05, 0.65])  # Jan..Dec
+HOUR_WEIGHTS = np.array([1, 1, 1, 1, 1, 2, 4, 8, 14, 16, 16, 14, 10, 14, 16, 15, 12, 8, 5, 3, 2, 2, 1, 1], dtype=float)
+HOUR_WEIGHTS /= HOUR_WEIGHTS.sum()
+
+QUANTITY_TYPE = pa.decimal128(12, 2)
+STOCK_EVENT_SCHEMA = pa.schema([
+    ("StockEventID", pa.int64()),
+    ("InventoryItemID", pa.int64()),
+    ("LocationID", pa.int64()),
+    ("UserID", pa.int64()),
+    ("OldQuantity", QUANTITY_TYPE),
+    ("NewQuantity", QUANTITY_TYPE),
+    ("EventType", pa.string()),
+    ("EventDate", pa.timestamp("s")),
+])
+
+
+def scaled_sizes(scale: float = 1.0, events: int | None = None) -> dict:
+    """Row counts per table for a scale factor. `events` overrides the StockEvent count."""
+    entity_factor = max(scale, 1.0) ** 0.5
+    sizes = {name: max(1, round(base * entity_factor)) for name, base in BASE_SIZES.items()}
+    sizes["events"] = events if events is not None else round(BASE_SIZES["events"] * scale)
+    return sizes
+
+
+def _zipf_weights(rng, n: int, exponent: float) -> np.ndarray:
+    """Zipf-like popularity over n entities, assigned to entities in random order."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.permutation(weights) / weights.sum()
+
+
+def _sample(rng, cdf: np.ndarray, size: int) -> np.ndarray:
+    """Draws indices from a precomputed CDF (much cheaper than rng.choice(p=...) per call)."""
+    return np.minimum(np.searchsorted(cdf, rng.random(size), side="right"), len(cdf) - 1)
+
+
+def _quantities(values: np.ndarray) -> pa.Array:
+    """Whole-unit quantities as DECIMAL(12,2). Goes through int32 since an int64 cast could overflow 12 digits."""
+    return pa.array(values, pa.int32()).cast(QUANTITY_TYPE)
+
+
+def _write_table(table: pa.Table, path: Path):
+    pq.write_table(table, path)
+    logger.info(f"Wrote {table.num_rows:,} rows to {path.name}.")
+
+# -------------------------
+# Entity tables
+# -------------------------
+def generate_products(rng, n: int, start: date) -> pa.Table:
+    """Products cycle through the bundled catalogue; repeats get a lot suffix."""
+    base = pa_csv.read_csv(CSV_DIR / "core.Product_01.csv").to_pydict()
+    idx = np.arange(n) % len(base["ProductID"])
+    lot = np.arange(n) // len(base["ProductID"])
+    names = [
+        name if k == 0 else f"{name} (Lot {k + 1})"
+        for name, k in zip(np.array(base["ProductName"], dtype=object)[idx], lot)
+    ]
+    created = np.datetime64(start, "s") - rng.integers(30, 1500, n).astype("timedelta64[D]")
+    return pa.table({
+        "ProductID": np.arange(1, n + 1),
+        "ProductName": names,
+        "ProductCategoryID": np.array(base["ProductCategoryID"])[idx],
+        "UnitID": np.array(base["UnitID"])[idx],
+        "CreatedAt": pa.array(created, pa.timestamp("s")),
+    })
+
+
+def generate_locations(n: int) -> pa.Table:
+    """Locations cycle through the bundled sites/buildings; repeats get new room numbers."""
+    base = pa_csv.read_csv(CSV_DIR / "inventory.location.csv",
+                           convert_options=pa_csv.ConvertOptions(column_types={"RoomNumber": pa.string()})).to_pydict()
+    size = len(base["LocationID"])
+    rows = [(i % size, i // size) for i in range(n)]
+    return pa.table({
+        "LocationID": np.arange(1, n + 1),
+        "SiteName": [base["SiteName"][i] for i, _ in rows],
+        "Building": [base["Building"][i] for i, _ in rows],
+        "RoomNumber": [base["RoomNumber"][i] if k == 0 else f"{base['RoomNumber'][i]}-{k}" for i, k in rows],
+        "StorageType": [base["StorageType"][i] for i, _ in rows],
+    })
+
+
+def generate_users(rng, n: int, start: date) -> pa.Table:
+    """Users combine the bundled first/last names; emails are unique by construction."""
+    base = pa_csv.read_csv(CSV_DIR / "core.User_02.csv").to_pydict()
+    first_names = np.array(sorted(set(base["FirstName"])), dtype=object)
+    last_names = np.array(sorted(set(base["LastName"])), dtype=object)
+    first = first_names[rng.integers(0, len(first_names), n)]
+    last = last_names[rng.integers(0, len(last_names), n)]
+    user_ids = np.arange(1, n + 1)
+    created = np.datetime64(start, "s") - rng.integers(1, 1000, n).astype("timedelta64[D]")
+    return pa.table({
+        "UserID": user_ids,
+        "FirstName": first,
+        "LastName": last,
+        "Email": [f"{f}.{l}.{i}@labhub.edu".lower() for f, l, i in zip(first, last, user_ids)],
+        "UserRoleID": rng.choice([1, 2, 3, 4], n, p=[0.05, 0.15, 0.72, 0.08]),
+        "UserCreatedAt": pa.array(created, pa.timestamp("s")),
+        "DepartmentID": rng.integers(1, 11, n),
+    })
+
+# -------------------------
+# StockEvents
+# -------------------------
+def day_weights(start: date, days: int) -> np.ndarray:
+    """Relative event volume per day: weekday x month seasonality x a slight upward trend."""
+    dates = np.datetime64(start, "D") + np.arange(days)
+    weekday = (dates.astype("int64") + 3) % 7  # 1970-01-01 was a Thursday
+    month = dates.astype("datetime64[M]").astype("int64") % 12
+    weights = WEEKDAY_WEIGHTS[weekday] * MONTH_WEIGHTS[month] * (1 + 0.15 * np.arange(days) / max(days, 1))
+    return weights / weights.sum()
+
+
+def _day_events(rng, count: int, item_cdf, user_cdf):
+    """One day of events in time order: (seconds into the day, item index, user index, type, delta)."""
+    seconds = rng.choice(24, count, p=HOUR_WEIGHTS) * 3600 + rng.integers(0, 3600, count)
+    order = np.argsort(seconds, kind="stable")
+    items = _sample(rng, item_cdf, count)
+    users = _sample(rng, user_cdf, count)
+    types = rng.choice(len(EVENT_TYPES), count, p=EVENT_TYPE_WEIGHTS)
+    sizes = rng.integers(1, MAX_EVENT_QUANTITY + 1, count)
+    # Add restocks, Remove consumes, Transfer mostly moves stock out (occasionally small inbound moves).
+    inbound_transfer = rng.random(count) < 0.1
+    deltas = np.where(types == 0, sizes, np.where((types == 2) & inbound_transfer, np.minimum(sizes, 15), -sizes))
+    return seconds[order], items[order], users[order], types[order], deltas[order]
+
+
+def apply_stock_changes(stock: np.ndarray, items: np.ndarray, deltas: np.ndarray):
+    """
+    Turns per-event deltas (in time order) into (OldQuantity, NewQuantity) pairs and advances `stock`.
+    Per item this is new = max(0, old + delta); vectorized as the walk minus its running minimum
+    (computed per item with one minimum.accumulate over group-offset values).
+    """
+    order = np.argsort(items, kind="stable")
+    sorted_items = items[order]
+    sorted_deltas = deltas[order]
+    is_start = np.r_[True, sorted_items[1:] != sorted_items[:-1]]
+    starts = np.flatnonzero(is_start)
+    group = np.cumsum(is_start) - 1
+
+    running = np.cumsum(sorted_deltas)
+    walk = stock[sorted_items[starts]][group] + running - (running[starts] - sorted_deltas[starts])[group]
+    offset = 2 * (int(np.abs(walk).max()) + 1)
+    floor = np.minimum.accumulate(walk - group * offset) + group * offset
+    new = walk - np.minimum(floor, 0)
+
+    old = np.empty_like(new)
+    old[1:] = new[:-1]
+    old[starts] = stock[sorted_items[starts]]
+    ends = np.r_[starts[1:] - 1, len(new) - 1]
+    stock[sorted_items[ends]] = new[ends]
+
+    old_quantity = np.empty_like(old)
+    new_quantity = np.empty_like(new)
+    old_quantity[order] = old
+    new_quantity[order] = new
+    return old_quantity, new_quantity
+
+
+def generate_stock_events(path: Path, sizes: dict, start: date, days: int, seed: int,
+                          item_location: np.ndarray, stock: np.ndarray,
+                          chunk_rows: int = DEFAULT_CHUNK_ROWS) -> int:
+    """
+    Streams StockEvents to one Parquet file, one row group per chunk of days.
+    StockEventID increases with EventDate, like an IDENTITY column fed in real time.
+    `stock` is updated in place to the final quantity per item.
+    """
+    setup_rng = np.random.default_rng([seed, 1])
+    product_weights = _zipf_weights(setup_rng, sizes["products"], PRODUCT_ZIPF)
+    item_product = np.arange(sizes["items"]) % sizes["products"]
+    # Items of a hot product are hot; jitter so items of one product differ a little.
+    item_weights = product_weights[item_product] * setup_rng.uniform(0.5, 1.5, sizes["items"])
+    item_cdf = np.cumsum(item_weights / item_weights.sum())
+    user_cdf = np.cumsum(_zipf_weights(setup_rng, sizes["users"], USER_ZIPF))
+    daily_counts = setup_rng.multinomial(sizes["events"], day_weights(start, days))
+
+    start_ts = np.datetime64(start, "s")
+    next_id = 1
+    pending = []
+    pending_rows = 0
+
+    def flush(writer):
+        nonlocal next_id, pending, pending_rows
+        seconds, items, users, types, deltas = (np.concatenate(parts) for parts in zip(*pending))
+        old_quantity, new_quantity = apply_stock_changes(stock, items, deltas)
+        writer.write_table(pa.table({
+            "StockEventID": np.arange(next_id, next_id + len(items)),
+            "InventoryItemID": items + 1,
+            "LocationID": item_location[items],
+            "UserID": users + 1,
+            "OldQuantity": _quantities(old_quantity),
+            "NewQuantity": _quantities(new_quantity),
+            "EventType": EVENT_TYPES[types],
+            "EventDate": pa.array(start_ts + seconds.astype("timedelta64[s]"), pa.timestamp("s")),
+        }, schema=STOCK_EVENT_SCHEMA))
+        next_id += len(items)
+        logger.info(f"Wrote StockEvents up to ID {next_id - 1:,} of {sizes['events']:,}.")
+        pending, pending_rows = [], 0
+
+    with pq.ParquetWriter(path, STOCK_EVENT_SCHEMA) as writer:
+        for day, count in enumerate(daily_counts):
+            if count:
+                # One generator per day keeps the output independent of the chunk size.
+                seconds, *rest = _day_events(np.random.default_rng([seed, 2, day]), int(count), item_cdf, user_cdf)
+                pending.append((seconds + day * 86400, *rest))
+                pending_rows += count
+            if pending_rows >= chunk_rows:
+                flush(writer)
+        if pending:
+            flush(writer)
+    return next_id - 1
+
+# -------------------------
+# Main
+# -------------------------
+def generate_synthetic_oltp(output_dir=DEFAULT_OUTPUT_DIR, scale: float = 1.0, events: int | None = None,
+                            start: date = date(2025, 1, 1), days: int = 730, seed: int = 42,
+                            chunk_rows: int = DEFAULT_CHUNK_ROWS) -> dict:
+    """
+    Writes one Parquet file per OLTP table (e.g. inventory.StockEvent.parquet) into `output_dir`.
+
+    Args:
+        scale: Size relative to the bundled CSVs (events x scale, entities x sqrt(scale)).
+        events: Exact StockEvent count; overrides the scale for events only.
+        start, days: Event date range.
+        seed: Seed for every random draw.
+        chunk_rows: Approximate StockEvent rows held in memory / per Parquet row group.
+
+    Returns:
+        Row counts per table.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    sizes = scaled_sizes(scale, events)
+    logger.info(f"Generating synthetic OLTP data: {sizes} over {days} days from {start} (seed {seed}).")
+    rng = np.random.default_rng([seed, 0])
+
+    _write_table(generate_products(rng, sizes["products"], start), output_dir / "core.Product.parquet")
+    _write_table(generate_locations(sizes["locations"]), output_dir / "inventory.Location.parquet")
+    _write_table(generate_users(rng, sizes["users"], start), output_dir / "core.User.parquet")
+
+    location_cdf = np.cumsum(_zipf_weights(rng, sizes["locations"], LOCATION_ZIPF))
+    item_location = _sample(rng, location_cdf, sizes["items"]) + 1
+    stock = rng.integers(0, 300, sizes["items"])
+    item_added = np.datetime64(start, "D") - rng.integers(1, 720, sizes["items"]).astype("timedelta64[D]")
+
+    generate_stock_events(output_dir / "inventory.StockEvent.parquet", sizes, start, days, seed,
+                          item_location, stock, chunk_rows)
+
+    # Written last so Quantity reflects the stock after every event.
+    _write_table(pa.table({
+        "InventoryItemID": np.arange(1, sizes["items"] + 1),
+        "ProductID": np.arange(sizes["items"]) % sizes["products"] + 1,
+        "LocationID": item_location,
+        "Quantity": _quantities(stock),
+        "ExpirationDate": pa.array(item_added + rng.integers(90, 1100, sizes["items"]).astype("timedelta64[D]")),
+        "AddedAt": pa.array(item_added.astype("datetime64[s]"), pa.timestamp("s")),
+    }), output_dir / "inventory.InventoryItem.parquet")
+
+    logger.info(f"✅ Synthetic OLTP data written to {output_dir}")
+    return sizes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate seeded, OLTP-shaped Parquet data for scaling benchmarks.")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUTPUT_DIR, help="Output directory.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Size relative to the bundled CSVs.")
+    parser.add_argument("--events", type=int, default=None, help="Exact StockEvent count (overrides --scale for events).")
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2025, 1, 1), help="First event date (YYYY-MM-DD).")
+    parser.add_argument("--days", type=int, default=730, help="Number of days with events.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="StockEvent rows per chunk/row group.")
+    args = parser.parse_args()
+
+    generate_synthetic_oltp(args.out, args.scale, args.events, args.start, args.days, args.seed, args.chunk_rows)
@@ -0,0 +1,113 @@
+"""
+Change detection for the dimension loads.
+
+Products, users and locations rarely change, but every run used to re-extract and re-compare
+all of them. Each dimension now has a whole-table fingerprint: the row count and an aggregate
+checksum of its extract query, computed on the OLTP side in one query, so no rows are shipped.
+The fingerprint of the last successful load is stored in dw.etl_fingerprint. A refresh whose
+source fingerprint matches is skipped before the extract.
+
+When a dimension did change, the upsert compares each staged row's content hash with the
+RowHash column stored on the dimension row, instead of re-hashing the stored columns.
+
+The OLTP tables carry no UpdatedAt column to watermark on, so the fingerprint is content-based.
+On SQL Server it sums a SHA2_256 hash of each row (all columns, serialized with FOR JSON)
+rather than CHECKSUM_AGG(BINARY_CHECKSUM(*)): that aggregate is XOR-like, so two offsetting
+changes cancel out, and BINARY_CHECKSUM ignores some column types.
+
+The skip is a best-effort optimisation, not a guarantee: a changed dimension whose
+fingerprint still matches (a hash collision, or a change outside the extract query) is not
+reloaded until the next --full-reload.
+"""
+
+from analytics.data import connect_db
+from analytics.data.connect_db import get_oltp_connection
+from analytics.etl.instrumentation import get_logger, timed_stage
+from analytics.etl.upsert import EFFECTIVE_FROM, EFFECTIVE_TO, IS_CURRENT, SCD_START
+
+logger = get_logger(__name__, "Change_Detection")
+
+FINGERPRINT_TABLE = "dw.etl_fingerprint"
+
+# Dimensions that keep a per-row content hash (see upsert(hash_column=...)).
+ROW_HASH_COLUMN = "RowHash"
+ROW_HASH_TABLES = ("dw.Dim_Product", "dw.Dim_User", "dw.Dim_Location")
+
+
+def ensure_change_tracking(duck_conn):
+    """Creates dw.etl_fingerprint and the RowHash / SCD2 columns on warehouses initialized before they existed."""
+    duck_conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {FINGERPRINT_TABLE} (
+            DimensionName VARCHAR(64) PRIMARY KEY,
+            Fingerprint VARCHAR(128) NOT NULL,
+            UpdatedAt TIMESTAMP NOT NULL
+        );
+    """)
+    for table in ROW_HASH_TABLES:
+        duck_conn.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {ROW_HASH_COLUMN} UBIGINT;")
+        # SCD Type 2 validity columns (see upsert_scd2); existing rows become the first versions.
+        duck_conn.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {EFFECTIVE_FROM} TIMESTAMP DEFAULT TIMESTAMP '{SCD_START}';"
+        )
+        duck_conn.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {EFFECTIVE_TO} TIMESTAMP;")
+        duck_conn.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {IS_CURRENT} BOOLEAN DEFAULT TRUE;")
+
+
+def get_fingerprints(duck_conn) -> dict:
+    """Fingerprints of the last committed load, by dimension name (e.g. "Dim_Product")."""
+    ensure_change_tracking(duck_conn)
+    return dict(duck_conn.execute(f"SELECT DimensionName, Fingerprint FROM {FINGERPRINT_TABLE}").fetchall())
+
+
+def save_fingerprint(duck_conn, name: str, fingerprint: str | None):
+    """Records the fingerprint a dimension was loaded from. Part of the pipeline transaction."""
+    if fingerprint is None:
+        return
+    updated = duck_conn.execute(
+        f"UPDATE {FINGERPRINT_TABLE} SET Fingerprint = ?, UpdatedAt = current_timestamp WHERE DimensionName = ?",
+        [fingerprint, name],
+    ).fetchone()[0]
+    if not updated:
+        duck_conn.execute(
+            f"INSERT INTO {FINGERPRINT_TABLE} VALUES (?, ?, current_timestamp)", [name, fingerprint]
+        )
+
+
+def fingerprint_query(query: str, backend: str) -> str:
+    """The OLTP statement returning (row count, checksum) of an extract query on `backend`."""
+    query = query.strip().rstrip(";")
+    if backend == "local":
+        return f"SELECT COUNT(*), SUM(hash(src)) FROM ({query}) src"
+    # SQL Server rejects a subquery inside an aggregate (Msg 130), so each row's SHA2_256 is
+    # computed in a CROSS APPLY; its first 8 bytes are summed as DECIMAL so it cannot overflow.
+    return f"""
+        SELECT COUNT_BIG(*), SUM(CAST(CAST(CAST(row_hash.RowHash AS BINARY(8)) AS BIGINT) AS DECIMAL(38, 0)))
+        FROM ({query}) src
+        CROSS APPLY (
+            SELECT HASHBYTES('SHA2_256',
+                (SELECT src.* FOR JSON PATH, WITHOUT_ARRAY_WRAPPER, INCLUDE_NULL_VALUES)) AS RowHash
+        ) row_hash
+    """
+
+
+@timed_stage("{name}.fingerprint")
+def source_fingerprint(name: str, query: str, extra: str = "") -> str:
+    """
+    Row count and order-independent checksum of an extract query, computed on the OLTP.
+
+    Args:
+        name: Dimension name, used for the stage span.
+        query: The dimension's extract query.
+        extra: Appended to the fingerprint for inputs outside the OLTP (e.g. a CSV's mtime).
+    """
+    checksum_query = fingerprint_query(query, connect_db.OLTP_BACKEND)
+
+    conn = get_oltp_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(checksum_query)
+        rows, checksum = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    return f"{rows}:{checksum}{':' + extra if extra else ''}"
@@ -3,107 +3,238 @@ import pandas as pd
 from datetime import datetime
 from pathlib import Path
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from analytics.etl.instrumentation import annotate, timed_stage
+from analytics.etl.dq_rules import DQ_RULES, rules_for
 
-def run_dq_checks(duck_conn, scope: str = "all")-> dict:
+# Delta mode (scope="delta"): the fact checks only audit the fact rows of the run's delta, and
+# the critical ones are repeated on a random window of DQ_SPOT_CHECK_ROWS TransactionIDs.
+# A full audit (scope="all") is due once the last successful one is DQ_FULL_AUDIT_HOURS old.
+DQ_SPOT_CHECK_ROWS = int(os.getenv("LABHUB_DQ_SPOT_CHECK_ROWS", "10000"))
+DQ_FULL_AUDIT_HOURS = float(os.getenv("LABHUB_DQ_FULL_AUDIT_HOURS", "24"))
+FACT_SOURCE = "dw.Fact_Inventory_Transactions"
+
+# Parallel audits (parallel=True, outside the load transaction): queries run on this many
+# cursors at once. Rules still pending after DQ_TIME_BUDGET_SECONDS are reported as TIMEOUT
+# (0 = no budget).
+DQ_WORKERS = int(os.getenv("LABHUB_DQ_WORKERS", "4"))
+DQ_TIME_BUDGET_SECONDS = float(os.getenv("LABHUB_DQ_TIME_BUDGET_SECONDS", "0"))
+
+TIMEOUT = "time budget exceeded"
+
+DQ_RESULTS_TABLE = "dw.dq_results"
+
+# Rows sampled per table for inspect_warehouse(stats=True)
+INSPECT_SAMPLE_ROWS = int(os.getenv("LABHUB_INSPECT_SAMPLE_ROWS", "100000"))
+
+# -------------------------
+# Rule execution
+# -------------------------
+# The rules live in dq_rules.py. All rules on a table are compiled into a single SELECT
+# (one aggregate per rule), so a table is scanned once no matter how many rules it has.
+
+def compile_checks(table: str, rules, where: str = "") -> str:
+    """One SELECT computing the aggregate of every rule on `table` (rows matching `where`), in order."""
+    today_key = str(int(datetime.now().strftime('%Y%m%d')))
+    aggregates = ",\n    ".join(
+        f'{rule["aggregate"].replace("{today_key}", today_key)} AS "{rule["name"]}"' for rule in rules
+    )
+    return f"SELECT\n    {aggregates}\nFROM {table} {where}"
+
+
+def _delta_filters(duck_conn, delta_view: str) -> dict:
+    """
+    Fact row filters for delta mode: the run's TransactionIDs ("new rows"), and a random
+    TransactionID window ("spot check"). The BETWEEN bounds are inline so zone maps apply.
+    """
+    low, high = duck_conn.execute(f"SELECT MIN(TransactionID), MAX(TransactionID) FROM {delta_view}").fetchone()
+    new_rows = (
+        f"WHERE TransactionID BETWEEN {low} AND {high} AND TransactionID IN (SELECT TransactionID FROM {delta_view})"
+        if low is not None else "WHERE FALSE"
+    )
+    first, last = duck_conn.execute(f"SELECT MIN(TransactionID), MAX(TransactionID) FROM {FACT_SOURCE}").fetchone()
+    start = random.randint(first, max(first, last - DQ_SPOT_CHECK_ROWS + 1)) if first is not None else 0
+    return {
+        "new rows": new_rows,
+        "spot check": f"WHERE TransactionID BETWEEN {start} AND {start + DQ_SPOT_CHECK_ROWS - 1}",
+    }
+
+
+def full_audit_due(duck_conn) -> bool:
+    """True if no full audit (DQ.all) passed within DQ_FULL_AUDIT_HOURS, per dw.etl_run_log."""
+    try:
+        last = duck_conn.execute(
+            "SELECT MAX(StartedAt) FROM dw.etl_run_log WHERE Stage = 'DQ.all' AND Status = 'ok'"
+        ).fetchone()[0]
+    except duckdb.CatalogException:
+        return True  # no run log yet
+    return last is None or (datetime.now() - last).total_seconds() >= DQ_FULL_AUDIT_HOURS * 3600
+
+
+def _plans(duck_conn, scope: str, delta_view: str | None) -> list:
+    """(table, row filter, rules, label appended to the rule names): one query each."""
+    def per_table(rules, where="", label=""):
+        return [
+            (table, where, [rule for rule in rules if rule["table"] == table], label)
+            for table in dict.fromkeys(rule["table"] for rule in rules)
+        ]
+
+    if scope != "delta":
+        return per_table(rules_for(scope))
+    filters = _delta_filters(duck_conn, delta_view)
+    fact_rules = [rule for rule in rules_for("facts") if rule["table"] == FACT_SOURCE]
+    return (
+        per_table(rules_for("dimensions"))
+        + per_table(fact_rules, filters["new rows"], " [new rows]")
+        + per_table([rule for rule in fact_rules if rule["severity"] == "critical"], filters["spot check"], " [spot check]")
+        + per_table([rule for rule in rules_for("facts") if rule["table"] != FACT_SOURCE])
+    )
+
+
+def _run_plan(conn, plan) -> tuple:
+    """Runs one compiled query. Returns (values, error, seconds)."""
+    table, where, rules, _ = plan
+    start = time.perf_counter()
+    try:
+        values = conn.execute(compile_checks(table, rules, where)).fetchone()
+        return values, None, time.perf_counter() - start
+    except Exception as e:
+        return None, str(e), time.perf_counter() - start
+
+
+def _run_plans_parallel(duck_conn, plans, budget: float) -> list:
+    """
+    Runs the plans concurrently, each on its own cursor. Cursors do not see the caller's open
+    transaction, so this is only for audits outside the load transaction. Queries still
+    running when the budget is spent are interrupted.
+    """
+    cursors = [duck_conn.cursor() for _ in plans]
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, DQ_WORKERS), thread_name_prefix="dq") as pool:
+            futures = [pool.submit(_run_plan, cursor, plan) for cursor, plan in zip(cursors, plans)]
+            _, pending = wait(futures, timeout=budget or None)
+            for future, cursor in zip(futures, cursors):
+                if future in pending and not future.cancel():
+                    cursor.interrupt()
+        return [
+            (None, TIMEOUT, budget) if future in pending else future.result()
+            for future in futures
+        ]
+    finally:
+        for cursor in cursors:
+            cursor.close()
+
+
+def _run_plans_sequential(duck_conn, plans, budget: float) -> list:
+    """Runs the plans one after another on the caller's connection; once the budget is spent the rest time out."""
+    start, outcomes = time.perf_counter(), []
+    for plan in plans:
+        if budget and time.perf_counter() - start >= budget:
+            outcomes.append((None, TIMEOUT, 0.0))
+        else:
+            outcomes.append(_run_plan(duck_conn, plan))
+    return outcomes
+
+
+@timed_stage("DQ.{scope}")
+def run_dq_checks(duck_conn, scope: str = "all", delta_view: str | None = None,
+                  parallel: bool = False, budget: float | None = None)-> dict:
     """
     Runs a Data Quality audit against the provided DuckDB connection.
+    Rules come from the dq_rules registry, evaluated with one query per table.
 
     Args:
         duck_conn: An active DuckDB connection (managed by the caller).
-        scope: "dimensions", "facts", or "all" (default).
+        scope: "dimensions", "facts", "all" (default), or "delta": the dimension rules, the
+            fact-table rules on the fact rows in `delta_view` only, the critical ones again on
+            a random spot-check window, and the other fact-scope rules, so the cost follows
+            the batch size.
+        delta_view: The run's staged fact rows (fact_inventory.DELTA_VIEW); required for "delta".
+        parallel: Run the per-table queries concurrently on separate cursors. Only for audits
+            outside a transaction: the cursors cannot see uncommitted rows.
+        budget: Seconds the audit may take (DQ_TIME_BUDGET_SECONDS by default, 0 = no limit);
+            rules not evaluated in time are reported as TIMEOUT.
     """
     
     report = {
     "title": "🛡️ LabHub Warehouse Audit",
     "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M'),
+    "checked_at": datetime.now(),
     "scope": scope,
     "checks": [],
     "passed_all": True
     }
 
-    def add_check(name, query, expected_zero=True, critical=False):
-        try:
-            val = duck_conn.execute(query).fetchone()[0]
-            passed = (val == 0) if expected_zero else (val > 0)
-            status = "✅ PASS" if passed else ("❌ FAIL" if critical else "⚠️ WARN")
-            if not passed and critical:
+    budget = DQ_TIME_BUDGET_SECONDS if budget is None else budget
+    plans = _plans(duck_conn, scope, delta_view)
+    run_plans = _run_plans_parallel if parallel else _run_plans_sequential
+    outcomes = run_plans(duck_conn, plans, budget)
+
+    # Reported in registration order, the labelled variants of a rule next to each other
+    order = {rule["name"]: i for i, rule in enumerate(DQ_RULES)}
+    results = [
+        (order[rule["name"]], rule, label, table, value, error, seconds)
+        for (table, _, rules, label), (values, error, seconds) in zip(plans, outcomes)
+        for rule, value in zip(rules, values or [None] * len(rules))
+    ]
+    results.sort(key=lambda result: result[0])
+
+    for _, rule, label, table, val, error, seconds in results:
+        check = {"check_name": rule["name"] + label, "table": table, "severity": rule["severity"], "seconds": round(seconds, 4)}
+        critical = rule["severity"] == "critical"
+        if error is not None:
+            check.update(status="⏱️ TIMEOUT" if error == TIMEOUT else "💥 ERROR", error=error)
+            if critical or error != TIMEOUT:
                 report["passed_all"] = False
-            report["checks"].append({
-                "check_name": name,
-                "value": val,
-                "status": status
-            })
-        except Exception as e:
-            report["checks"].append({
-                "check_name": name,
-                "status": "💥 ERROR",
-                "error": str(e)
-            })
+            report["checks"].append(check)
+            continue
+        passed = (val == 0) if rule["expect"] == "zero" else (val > 0)
+        status = "✅ PASS" if passed else ("❌ FAIL" if critical else "⚠️ WARN")
+        if not passed and critical:
             report["passed_all"] = False
+        check.update(value=val, status=status)
+        report["checks"].append(check)
 
-    # --- Dimension checks ---
-    if scope in ("dimensions", "all"):
-        add_check(
-            "Dim_Product populated",
-            "SELECT COUNT(*) FROM dw.Dim_Product",
-            expected_zero=False, critical=True
-        )
-        add_check(
-            "Dim_Location populated",
-            "SELECT COUNT(*) FROM dw.Dim_Location",
-            expected_zero=False, critical=True
-        )
-        add_check(
-            "Dim_User populated",
-            "SELECT COUNT(*) FROM dw.Dim_User",
-            expected_zero=False, critical=True
-        )
-        add_check(
-            "Dim_Date populated",
-            "SELECT COUNT(*) FROM dw.Dim_Date",
-            expected_zero=False, critical=True
-        )
-        add_check(
-            "Missing AI Descriptions",
-            "SELECT COUNT(*) FROM dw.Dim_Product WHERE Description IS NULL OR length(trim(Description)) < 5",
-            critical=False
-        )
-
-    # --- Fact checks ---
-    if scope in ("facts", "all"):
-        add_check(
-            "Negative Stock (Absolute)",
-            "SELECT COUNT(*) FROM dw.Fact_Inventory_Transactions WHERE AbsoluteQuantity < 0",
-            critical=True
-        )
-        add_check(
-            "Orphaned Products",
-            """SELECT COUNT(*) FROM dw.Fact_Inventory_Transactions f
-               LEFT JOIN dw.Dim_Product p ON f.ProductKey = p.ProductKey
-               WHERE p.ProductKey IS NULL""",
-            critical=True
-        )
-        add_check(
-            "Orphaned Locations",
-            """SELECT COUNT(*) FROM dw.Fact_Inventory_Transactions f
-               LEFT JOIN dw.Dim_Location l ON f.LocationKey = l.LocationKey
-               WHERE l.LocationKey IS NULL""",
-            critical=True
-        )
-        add_check(
-            "Duplicate Transaction IDs",
-            "SELECT COUNT(TransactionID) - COUNT(DISTINCT TransactionID) FROM dw.Fact_Inventory_Transactions",
-            critical=True
-        )
-        today_key = int(datetime.now().strftime('%Y%m%d'))
-        add_check(
-            "Data is from Today",
-            f"SELECT COUNT(*) FROM dw.Fact_Inventory_Transactions WHERE DateKey = {today_key}",
-            expected_zero=False, critical=False
-        )
-
+    annotate(rows_out=len(report["checks"]), status="ok" if report["passed_all"] else "failed")
     return report
 
+
+def ensure_dq_results_table(duck_conn):
+    """Creates dw.dq_results on warehouses initialized before it existed."""
+    duck_conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DQ_RESULTS_TABLE} (
+            RunID VARCHAR(32),
+            CheckedAt TIMESTAMP NOT NULL,
+            Scope VARCHAR(16) NOT NULL,
+            CheckName VARCHAR(160) NOT NULL,
+            TableName VARCHAR(128),
+            Severity VARCHAR(16),
+            Status VARCHAR(16) NOT NULL,
+            Value BIGINT,
+            Error VARCHAR,
+            DurationSeconds DOUBLE
+        );
+    """)
+
+
+def save_dq_results(duck_conn, reports, run_id: str | None = None):
+    """
+    Appends the checks of one or more reports to dw.dq_results. Call it outside the load
+    transaction, so the results of rolled-back runs are kept too.
+    """
+    ensure_dq_results_table(duck_conn)
+    rows = [
+        (run_id, report["checked_at"], report["scope"], check["check_name"], check.get("table"),
+         check.get("severity"), check["status"].split()[-1], check.get("value"), check.get("error"),
+         check.get("seconds"))
+        for report in reports
+        for check in report["checks"]
+    ]
+    if rows:
+        duck_conn.executemany(f"INSERT INTO {DQ_RESULTS_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
 def print_dq_report(report: dict):
     print(f"\n{'='*40}")
     print(f"WAREHOUSE AUDIT REPORT [{report.get('scope', 'all').upper()}]: {report['timestamp']}")
@@ -114,53 +245,146 @@ def print_dq_report(report: dict):
     print("✅ STATUS: HEALTHY" if report["passed_all"] else "🛑 STATUS: ISSUES DETECTED")
     print()
 
-def inspect_warehouse(duck_conn):
+def _format_bytes(size: int) -> str:
+    """Human-readable size in binary units, e.g. 1536 -> "1.5 KiB"."""
+    for unit in ("bytes", "KiB", "MiB", "GiB", "TiB"):
+        if size < 1024 or unit == "TiB":
+            return f"{size} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _table_shapes(duck_conn) -> tuple[dict, int]:
+    """
+    Estimated rows and on-disk bytes per dw table plus the database's used bytes, in one
+    metadata query. DuckDB does not report bytes per table, so the used blocks are split
+    across the tables by their share of cells (estimated rows * columns): a rough figure
+    that ignores type widths and compression, but needs no per-table storage scan.
+    """
+    rows = duck_conn.execute("""
+        SELECT t.table_name, t.estimated_size,
+            COALESCE(ROUND(
+                db.used_blocks * db.block_size * t.estimated_size * t.column_count
+                / NULLIF(SUM(t.estimated_size * t.column_count) OVER (), 0)
+            ), 0)::BIGINT AS estimated_bytes,
+            db.used_blocks * db.block_size AS used_bytes
+        FROM duckdb_tables() t
+        JOIN pragma_database_size() db ON db.database_name = t.database_name
+        WHERE t.schema_name = 'dw' AND t.database_name = current_database()
+        ORDER BY t.table_name;
+    """).fetchall()
+    shapes = {table_name: (row_count, size) for table_name, row_count, size, _ in rows}
+    return shapes, rows[0][3] if rows else 0
+
+
+def _column_stats(duck_conn, table_name: str, columns, rows: int, sample_rows: int) -> dict:
+    """
+    Null %, approximate distinct count (HyperLogLog) and min/max per column, in one query over
+    a system sample of about `sample_rows` rows. System sampling picks whole vectors, so it
+    skips most of a large table instead of reading it.
     """
-    Prints a shape summary of every table in the dw schema:
-    row counts and column names. Useful for quick sanity checks.
+    sample = ""
+    if rows > sample_rows:
+        sample = f"TABLESAMPLE {max(100 * sample_rows / rows, 0.01):.4f}% (system)"
+    aggregates = ", ".join(
+        f'COUNT("{name}"), approx_count_distinct("{name}"), MIN("{name}")::VARCHAR, MAX("{name}")::VARCHAR'
+        for name, _ in columns
+    )
+    values = duck_conn.execute(f"SELECT COUNT(*), {aggregates} FROM dw.{table_name} {sample}").fetchone()
+    sampled, values = values[0], values[1:]
+    return {
+        "sampled_rows": sampled,
+        "columns": {
+            name: {
+                "null_pct": round(100 * (sampled - values[4 * i]) / sampled, 1) if sampled else None,
+                "distinct": values[4 * i + 1],
+                "min": values[4 * i + 2],
+                "max": values[4 * i + 3],
+            }
+            for i, (name, _) in enumerate(columns)
+        },
+    }
+
+
+def inspect_warehouse(duck_conn, stats: bool = False, sample_rows: int = INSPECT_SAMPLE_ROWS) -> dict:
+    """
+    Prints a shape summary of every table in the dw schema: row counts, approximate size on
+    disk and column names, plus the view names. Useful for quick sanity checks.
+
+    Row counts and sizes come from one storage-metadata query and all columns from one catalog
+    query, so no table is scanned: safe on a multi-GB warehouse. Views are listed but not
+    counted, since counting a view runs it. The row counts are storage estimates and can
+    include rows deleted since the last checkpoint; sizes are apportioned estimates (see
+    _table_shapes).
+
+    Args:
+        stats: Also report per-column null %, distinct estimate and min/max, computed on a
+            sample of about `sample_rows` rows per table.
+
+    Returns:
+        {table name: {"rows", "bytes", "columns", and "stats" if requested}}
     """
     print(f"\n{'='*50}")
     print("🏗️  WAREHOUSE SHAPE INSPECTOR")
     print(f"{'='*50}")
 
-    tables = duck_conn.execute("""
-        SELECT table_name
-        FROM information_schema.tables
-        WHERE table_schema = 'dw'
-        ORDER BY table_name;
-    """).fetchall()
+    tables, used_bytes = _table_shapes(duck_conn)
+
+    columns = {}
+    for table_name, column_name, data_type in duck_conn.execute("""
+        SELECT table_name, column_name, data_type
+        FROM duckdb_columns()
+        WHERE schema_name = 'dw'
+        ORDER BY table_name, column_index;
+    """).fetchall():
+        columns.setdefault(table_name, []).append((column_name, data_type))
 
     if not tables:
         print("  No tables found in schema 'dw'.")
-        return
+        return {}
 
-    for (table_name,) in tables:
-        row_count = duck_conn.execute(
-            f"SELECT COUNT(*) FROM dw.{table_name}"
-        ).fetchone()[0]
+    print(f"  Database size: {_format_bytes(used_bytes)}")
 
-        columns = duck_conn.execute(f"""
-            SELECT column_name, data_type
-            FROM information_schema.columns
-            WHERE table_schema = 'dw' AND table_name = '{table_name}'
-            ORDER BY ordinal_position;
-        """).fetchall()
+    summary = {}
+    for table_name, (row_count, size) in tables.items():
+        table_columns = columns.get(table_name, [])
+        summary[table_name] = {"rows": row_count, "bytes": size, "columns": table_columns}
 
-        col_summary = ", ".join(f"{c[0]} ({c[1]})" for c in columns)
+        col_summary = ", ".join(f"{c[0]} ({c[1]})" for c in table_columns)
         print(f"\n  📋 dw.{table_name}")
-        print(f"     Rows   : {row_count:,}")
+        print(f"     Rows   : ~{row_count:,}")
+        print(f"     Size   : ~{_format_bytes(size)}")
         print(f"     Columns: {col_summary}")
 
+        if stats and row_count:
+            table_stats = _column_stats(duck_conn, table_name, table_columns, row_count, sample_rows)
+            summary[table_name]["stats"] = table_stats
+            print(f"     Stats  : sample of {table_stats['sampled_rows']:,} rows")
+            for name, col in table_stats["columns"].items():
+                print(
+                    f"        {name:<28} null {col['null_pct']}%  ~distinct {col['distinct']:,}  "
+                    f"min {str(col['min'])[:24]}  max {str(col['max'])[:24]}"
+                )
+
+    views = [name for name in columns if name not in tables]
+    if views:
+        print(f"\n  👁️  Views: {', '.join(f'dw.{name}' for name in views)}")
+
     print(f"\n{'='*50}\n")
+    return summary
 
 
 if __name__ == "__main__":
+    import argparse
     from analytics.data.connect_db import get_warehouse_conn
+    parser = argparse.ArgumentParser(description="Inspect the warehouse and run a full DQ audit.")
+    parser.add_argument("--stats", action="store_true", help="Add sampled per-column stats to the inspector.")
+    args = parser.parse_args()
     conn = get_warehouse_conn()
     try:
-        inspect_warehouse(conn)
-        report = run_dq_checks(conn)
+        inspect_warehouse(conn, stats=args.stats)
+        report = run_dq_checks(conn, parallel=True)
         print_dq_report(report)
+        save_dq_results(conn, [report])
     finally:
         conn.close()
 
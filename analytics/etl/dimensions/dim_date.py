@@ -1,17 +1,19 @@
-import logging
 import pandas as pd
-from analytics.data.connect_db import get_oltp_connection, get_warehouse_conn
+import pyarrow as pa
+from analytics.data.connect_db import get_warehouse_conn
+from analytics.etl.staging import iter_oltp_batches, stage_batches
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+from analytics.etl.upsert import upsert
+from analytics.etl.change_detection import get_fingerprints, save_fingerprint
 
 # --- Logging Setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - [Dim_Date] - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, "Dim_Date")
 
+STAGING_TABLE = "tmp_dim_date"
 
 # 1.Extract
 # -------------------------
+@timed_stage("Dim_Date.extract")
 def extract_date_range():
     """
     Queries OLTP to find the actual date boundaries of the business data.
@@ -22,18 +24,16 @@ def extract_date_range():
             MAX(EventDate) AS MaxDate 
         FROM inventory.StockEvent;
     """
-    conn = get_oltp_connection()
     min_date = None
     max_date = None
 
     try:
-        df_dates = pd.read_sql(query, conn)
-        min_date = df_dates['MinDate'].iloc[0]
-        max_date = df_dates['MaxDate'].iloc[0]
+        date_bounds = next(iter_oltp_batches(query)).to_pylist()
+        if date_bounds:
+            min_date = date_bounds[0]['MinDate']
+            max_date = date_bounds[0]['MaxDate']
     except Exception as e:
         logger.error(f"Error querying date range: {e}")
-    finally:
-        conn.close()
 
     # Fallback logic if table is empty or query fails
     if pd.isna(min_date) or pd.isna(max_date):
@@ -46,6 +46,7 @@ def extract_date_range():
 # -------------------------
 # 2.Transform
 # -------------------------
+@timed_stage("Dim_Date.transform")
 def transform_dim_date(min_date, max_date) -> pd.DataFrame:
     """
     Generates a continuous sequence of dates and calculates attributes.
@@ -71,40 +72,48 @@ def transform_dim_date(min_date, max_date) -> pd.DataFrame:
 # 3.Load
 # -------------------------
 
+@timed_stage("Dim_Date.load")
 def load_dim_date(duck_conn, dim_date_df: pd.DataFrame):
     """
     Incremental insert into dw.Dim_Date — only adds dates not already present.
     """
     logger.info(f"Inserting new dates from {len(dim_date_df)}-row range into dw.Dim_Date...")
-    duck_conn.register("tmp_dim_date", dim_date_df)
-    duck_conn.execute("""
-        INSERT INTO dw.Dim_Date (DateKey, FullDate, Day, Month, MonthName, Quarter, Year, DayOfWeek)
-        SELECT
-            tmp_dim_date.DateKey,
-            tmp_dim_date.FullDate,
-            tmp_dim_date.Day,
-            tmp_dim_date.Month,
-            tmp_dim_date.MonthName,
-            tmp_dim_date.Quarter,
-            tmp_dim_date.Year,
-            tmp_dim_date.DayOfWeek
-        FROM tmp_dim_date
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.Dim_Date
-            WHERE dw.Dim_Date.DateKey = tmp_dim_date.DateKey
-        );
-    """)
-    logger.info("Dim_Date incremental load completed successfully.")
+    staged = stage_batches(duck_conn, STAGING_TABLE, [pa.Table.from_pandas(dim_date_df, preserve_index=False)])
+    # Calendar rows never change once written, so this is insert-only (no hash-diff pass)
+    counts = upsert(
+        duck_conn, "dw.Dim_Date", STAGING_TABLE,
+        keys=["DateKey"], columns=["FullDate", "Day", "Month", "MonthName", "Quarter", "Year", "DayOfWeek"],
+    )
+    annotate(rows_in=staged, rows_out=counts["inserted"])
+    logger.info(f"Dim_Date incremental load completed successfully. {counts['inserted']} new dates.")
+    return counts
 
 # -------------------------
 # Orchestration
 # -------------------------
 
-def run_dim_date_etl(duck_conn):
+def prepare_dim_date(known_fingerprint: str | None = None):
+    """
+    Discovers the OLTP date range and builds the calendar rows.
+    No warehouse access, so the pipeline can run it in a worker thread.
+    The range itself is the fingerprint: returns (None, fingerprint) if it has not moved.
+    """
+    min_d, max_d = extract_date_range()
+    fingerprint = f"{min_d.date()}:{max_d.date()}"
+    if fingerprint == known_fingerprint:
+        return None, fingerprint
+    return transform_dim_date(min_d, max_d), fingerprint
+
+@timed_stage("Dim_Date")
+def run_dim_date_etl(duck_conn, force: bool = False):
     try:
-        min_d, max_d = extract_date_range()
-        dim_date_df = transform_dim_date(min_d, max_d)
+        known_fingerprint = None if force else get_fingerprints(duck_conn).get("Dim_Date")
+        dim_date_df, fingerprint = prepare_dim_date(known_fingerprint)
+        if dim_date_df is None:
+            logger.info("⏭️ Dim_Date range unchanged since the last load. Skipping.")
+            return
         load_dim_date(duck_conn, dim_date_df)
+        save_fingerprint(duck_conn, "Dim_Date", fingerprint)
         logger.info("✅ Dim_Date ETL completed successfully.")
     except Exception as e:
         logger.error(f"Dim_Date ETL process failed: {e}")
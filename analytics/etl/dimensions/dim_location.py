@@ -1,113 +1,141 @@
-import logging
-import pandas as pd
-from analytics.data.connect_db import get_oltp_connection, get_warehouse_conn
+import pyarrow as pa
+import pyarrow.compute as pc
+from analytics.data.connect_db import get_warehouse_conn
+from analytics.etl.staging import iter_oltp_batches, stage_batches
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+from analytics.etl.upsert import IS_CURRENT, SCD2_DIMENSIONS, upsert, upsert_scd2
+from analytics.etl.change_detection import ROW_HASH_COLUMN, get_fingerprints, save_fingerprint, source_fingerprint
 
 # --- Logging Setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - [Dim_Location] - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, "Dim_Location")
+
+STAGING_TABLE = "tmp_dim_location"
+# Tracked attributes: overwritten when they change in the OLTP (SCD Type 1),
+# or versioned if the dimension is listed in LABHUB_SCD2_DIMENSIONS (SCD Type 2)
+ATTRIBUTES = ["SiteName", "Building", "RoomNumber", "StorageType"]
 
 # -------------------------
 # Extract
 # -------------------------
-def extract_locations():
+EXTRACT_QUERY = """
+    SELECT
+        Location.LocationID,
+        Location.SiteName,
+        Location.Building,
+        Location.RoomNumber,
+        Location.StorageType
+    FROM inventory.Location
+"""
+
+@timed_stage("Dim_Location.extract")
+def extract_locations(chunksize: int | None = None):
     """
     Pulls location data from the OLTP database.
     Joins Site, Building, and Room to create a flattened location record.
+    Returns an Arrow table, or with a chunksize an iterator of record batches (streaming mode).
     """
-    query = """
-        SELECT
-            Location.LocationID,
-            Location.SiteName,
-            Location.Building,
-            Location.RoomNumber,
-            Location.StorageType
-        FROM inventory.Location
-    """
-    conn = get_oltp_connection()
+    if chunksize:
+        return iter_oltp_batches(EXTRACT_QUERY, chunksize=chunksize)
+
     try:
-        df_locations = pd.read_sql(query, conn)
-        logger.info(f"Successfully extracted {len(df_locations)} locations.")
-        return df_locations
+        locations = pa.Table.from_batches(list(iter_oltp_batches(EXTRACT_QUERY)))
+        logger.info(f"Successfully extracted {locations.num_rows} locations.")
+        return locations
     except Exception as e:
         logger.error(f"Failed to extract locations: {e}")
         raise
-    finally:
-        conn.close()
 
 # -------------------------
 # Transform
 # -------------------------
-def transform_dim_location(df_locations: pd.DataFrame) -> pd.DataFrame:
+@timed_stage("Dim_Location.transform")
+def transform_dim_location(locations: pa.Table) -> pa.Table:
     """
     Shapes OLTP location data into Dim_Location rows.
     """
     logger.info("Transforming location data...")
-    dim_location_df = df_locations.copy()
+    dim_location = locations
 
     # Ensures SiteName and Building are capitalized
-    dim_location_df['SiteName'] = dim_location_df['SiteName'].str.strip().str.title()
-    dim_location_df['Building'] = dim_location_df['Building'].str.strip().str.title()
+    for column in ("SiteName", "Building"):
+        dim_location = dim_location.set_column(
+            dim_location.schema.get_field_index(column),
+            column,
+            pc.utf8_title(pc.utf8_trim_whitespace(dim_location[column])),
+        )
 
-    dim_location_df = dim_location_df[["LocationID", "SiteName", "Building", "RoomNumber", "StorageType"]]
-    return dim_location_df
+    return dim_location.select(["LocationID", "SiteName", "Building", "RoomNumber", "StorageType"])
 
 # -------------------------
 # Load
 # -------------------------
-def load_dim_location(duck_conn, dim_df: pd.DataFrame):
+@timed_stage("Dim_Location.load")
+def load_dim_location(duck_conn, dim_location: pa.Table | None = None):
     """
     Loads transformed data into DuckDB Dim_Location.
-    Incremental SCD Type 1 upsert into dw.Dim_Location.
+    Incremental SCD Type 1 upsert into dw.Dim_Location (Type 2 versioning if enabled in LABHUB_SCD2_DIMENSIONS).
     - New LocationIDs are inserted.
     - Existing LocationIDs have their attributes overwritten if anything changed.
+    Reads from the tmp_dim_location staging table; if dim_location is given it is staged first.
     Transaction is managed by the pipeline.
     """
     logger.info("Upserting data into dw.Dim_Location...")
-    duck_conn.register("tmp_dim_location", dim_df)
+    if dim_location is not None:
+        stage_batches(duck_conn, STAGING_TABLE, [dim_location])
 
-    #1. SCD1
-    duck_conn.execute("""
-        UPDATE dw.Dim_Location
-        SET
-            SiteName = tmp.SiteName,
-            Building = tmp.Building,
-            RoomNumber = tmp.RoomNumber,
-            StorageType = tmp.StorageType
-        FROM tmp_dim_location AS tmp
-        WHERE dw.Dim_Location.LocationID = tmp.LocationID
-          AND (
-              dw.Dim_Location.SiteName IS DISTINCT FROM tmp.SiteName OR
-              dw.Dim_Location.Building IS DISTINCT FROM tmp.Building OR
-              dw.Dim_Location.RoomNumber IS DISTINCT FROM tmp.RoomNumber OR
-              dw.Dim_Location.StorageType IS DISTINCT FROM tmp.StorageType
-          );
-    """)
+    # Single pass: classify staged rows against the current dw.Dim_Location rows by hash-diff, then insert/update
+    if "Dim_Location" in SCD2_DIMENSIONS:
+        counts = upsert_scd2(duck_conn, "dw.Dim_Location", STAGING_TABLE, keys=["LocationID"], columns=ATTRIBUTES,
+                             hash_column=ROW_HASH_COLUMN)
+    else:
+        counts = upsert(duck_conn, "dw.Dim_Location", STAGING_TABLE, keys=["LocationID"], columns=ATTRIBUTES, update_columns=ATTRIBUTES,
+                        hash_column=ROW_HASH_COLUMN, current_column=IS_CURRENT)
+    annotate(rows_in=counts["source"], rows_out=counts["inserted"] + counts["updated"])
+    logger.info(
+        f"Dim_Location upsert complete. Source rows: {counts['source']}, {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['unchanged']} unchanged."
+    )
+    return counts
 
-    # 2. Insert new locations
-    duck_conn.execute("""
-        INSERT INTO dw.Dim_Location (LocationID, SiteName, Building, RoomNumber, StorageType)
-        SELECT tmp.LocationID, tmp.SiteName, tmp.Building, tmp.RoomNumber, tmp.StorageType
-        FROM tmp_dim_location AS tmp
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.Dim_Location
-            WHERE dw.Dim_Location.LocationID = tmp.LocationID
-        );
-    """)
-
-    logger.info(f"Dim_Location upsert complete. Source rows: {len(dim_df)}.")
 # -------------------------
 # Orchestration
 # -------------------------
-def run_dim_location_etl(duck_conn):
+def prepare_dim_location(known_fingerprint: str | None = None):
+    """
+    Extract + transform for locations (OLTP only, thread-safe).
+    Returns (dim_location, fingerprint); dim_location is None if the source is unchanged since known_fingerprint.
+    """
+    fingerprint = source_fingerprint("Dim_Location", EXTRACT_QUERY)
+    if fingerprint == known_fingerprint:
+        return None, fingerprint
+    return transform_dim_location(extract_locations()), fingerprint
+
+@timed_stage("Dim_Location")
+def run_dim_location_etl(duck_conn, chunksize: int | None = None, force: bool = False):
     """Orchestrates the Location Dimension ETL.
-    Accepts a shared connection from the pipeline — does NOT open its own or manage transactions."""
+    Accepts a shared connection from the pipeline — does NOT open its own or manage transactions.
+    With a chunksize, the extract is streamed in chunks of that size into the staging table.
+    Skipped when the source fingerprint matches the last committed load, unless force is set."""
     try:
-        raw_locations = extract_locations()
-        dim_location_df = transform_dim_location(raw_locations)
-        load_dim_location(duck_conn, dim_location_df)
+        known_fingerprint = None if force else get_fingerprints(duck_conn).get("Dim_Location")
+        if chunksize:
+            # Fingerprint before extracting: a change in between only causes one extra reload next run
+            fingerprint = source_fingerprint("Dim_Location", EXTRACT_QUERY)
+            if fingerprint == known_fingerprint:
+                logger.info("⏭️ Dim_Location source unchanged since the last load. Skipping.")
+                return
+            staged = stage_batches(duck_conn, STAGING_TABLE, extract_locations(chunksize), transform=transform_dim_location)
+            if not staged:
+                logger.warning("No locations extracted. Skipping Dim_Location load.")
+                return
+            load_dim_location(duck_conn)
+        else:
+            location_rows, fingerprint = prepare_dim_location(known_fingerprint)
+            if location_rows is None:
+                logger.info("⏭️ Dim_Location source unchanged since the last load. Skipping.")
+                return
+            load_dim_location(duck_conn, location_rows)
+        save_fingerprint(duck_conn, "Dim_Location", fingerprint)
         logger.info("✅ Dim_Location ETL completed successfully.")
     except Exception as e:
         logger.error(f"❌ Dim_Location ETL failed: {e}")
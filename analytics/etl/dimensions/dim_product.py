@@ -1,123 +1,166 @@
-import logging
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
 from pathlib import Path
-from analytics.data.connect_db import get_oltp_connection, get_warehouse_conn
+from analytics.data.connect_db import get_warehouse_conn
+from analytics.etl.staging import iter_oltp_batches, stage_batches
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+from analytics.etl.upsert import IS_CURRENT, SCD2_DIMENSIONS, upsert, upsert_scd2
+from analytics.etl.change_detection import ROW_HASH_COLUMN, get_fingerprints, save_fingerprint, source_fingerprint
 
 # --- Logging Setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - [Dim_Product] - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, "Dim_Product")
 
-PROJECT_ROOT = Path(__file__).resolve().parents[1] 
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
 CSV_DESCRIPTION_PATH = PROJECT_ROOT / "data" / "generated_data_OLTP" / "core.Product_with_Descriptions.csv"
+STAGING_TABLE = "tmp_dim_product"
+# Tracked attributes: overwritten when they change in the OLTP (SCD Type 1),
+# or versioned if the dimension is listed in LABHUB_SCD2_DIMENSIONS (SCD Type 2)
+ATTRIBUTES = ["ProductName", "CategoryName", "UnitOfMeasure", "Description"]
 
 # 1. EXTRACT
-def extract_products():
+EXTRACT_QUERY = """
+    SELECT
+        Product.ProductID,
+        Product.ProductName,
+        ProductCategory.CategoryName,
+        UnitOfMeasure.UnitName AS UnitOfMeasure
+    FROM core.Product
+    JOIN core.ProductCategory ON Product.ProductCategoryID = ProductCategory.CategoryID
+    JOIN core.UnitOfMeasure ON Product.UnitID = UnitOfMeasure.UnitID;
+"""
+
+@timed_stage("Dim_Product.extract")
+def extract_products(chunksize: int | None = None):
     """
     Extracts raw product data from SQL Server.
+    Returns an Arrow table, or with a chunksize an iterator of record batches (streaming mode).
     """
-    query = """
-        SELECT
-            Product.ProductID,
-            Product.ProductName,
-            ProductCategory.CategoryName,
-            UnitOfMeasure.UnitName AS UnitOfMeasure
-        FROM core.Product
-        JOIN core.ProductCategory ON Product.ProductCategoryID = ProductCategory.CategoryID
-        JOIN core.UnitOfMeasure ON Product.UnitID = UnitOfMeasure.UnitID;
-    """
-    conn = get_oltp_connection()
+    if chunksize:
+        return iter_oltp_batches(EXTRACT_QUERY, chunksize=chunksize)
+
     try:
-        df_products = pd.read_sql(query, conn)
-        logger.info(f"Successfully extracted {len(df_products)} products.")
-        return df_products
+        products = pa.Table.from_batches(list(iter_oltp_batches(EXTRACT_QUERY)))
+        logger.info(f"Successfully extracted {products.num_rows} products.")
+        return products
     except Exception as e:
         logger.error(f"Failed to extract products: {e}")
         raise
-    finally:
-        conn.close()
 
 # 2. TRANSFORM
-def transform_dim_product(df_products: pd.DataFrame) -> pd.DataFrame:
+@timed_stage("Dim_Product.transform")
+def transform_dim_product(products: pa.Table) -> pa.Table:
     """
     Shapes OLTP product data into Dim_Product rows.
     Merges AI-generated descriptions from CSV if available —
     description is not an OLTP attribute so it is handled here in the ETL layer.
     """
     logger.info("Transforming product data...")
-    dim_product_df = df_products.copy()
-    dim_product_df['ProductName'] = dim_product_df['ProductName'].str.strip()
+    dim_product = products.set_column(
+        products.schema.get_field_index("ProductName"),
+        "ProductName",
+        pc.utf8_trim_whitespace(products["ProductName"]),
+    )
 
     if CSV_DESCRIPTION_PATH.exists():
         try:
-            df_descriptions = pd.read_csv(CSV_DESCRIPTION_PATH, usecols=["ProductID", "Description"])
-            dim_product_df = dim_product_df.merge(df_descriptions, on="ProductID", how="left")
-            logger.info(f"Descriptions merged from CSV ({len(df_descriptions)} rows).")
+            descriptions = pa_csv.read_csv(
+                CSV_DESCRIPTION_PATH,
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=["ProductID", "Description"],
+                    column_types={"ProductID": dim_product.schema.field("ProductID").type},
+                ),
+            )
+            dim_product = dim_product.join(descriptions, keys="ProductID", join_type="left outer")
+            logger.info(f"Descriptions merged from CSV ({descriptions.num_rows} rows).")
         except Exception as e:
             logger.warning(f"Failed to load descriptions CSV: {e}. Description column will be NULL.")
-            dim_product_df['Description'] = None
+            dim_product = dim_product.append_column("Description", pa.nulls(dim_product.num_rows, pa.string()))
     else:
         logger.warning(f"Descriptions CSV not found at {CSV_DESCRIPTION_PATH}. Description column will be NULL.")
-        dim_product_df['Description'] = None
+        dim_product = dim_product.append_column("Description", pa.nulls(dim_product.num_rows, pa.string()))
 
-    return dim_product_df[["ProductID", "ProductName", "CategoryName", "UnitOfMeasure", "Description"]]
+    return dim_product.select(["ProductID", "ProductName", "CategoryName", "UnitOfMeasure", "Description"])
 
 
 # 3. LOAD
-def load_dim_product(duck_conn, dim_df: pd.DataFrame):
-    
+@timed_stage("Dim_Product.load")
+def load_dim_product(duck_conn, dim_product: pa.Table | None = None):
+    """
+    Incremental SCD Type 1 upsert into dw.Dim_Product (Type 2 versioning if enabled in LABHUB_SCD2_DIMENSIONS).
+    Reads from the tmp_dim_product staging table; if dim_product is given it is staged first.
+    """
     logger.info("Upserting data into dw.Dim_Product...")
-    duck_conn.register("tmp_dim_product", dim_df)
-
-    # Step 1: Update changed attributes on existing rows
-    duck_conn.execute("""
-        UPDATE dw.Dim_Product
-        SET
-            ProductName   = tmp_dim_product.ProductName,
-            CategoryName  = tmp_dim_product.CategoryName,
-            UnitOfMeasure = tmp_dim_product.UnitOfMeasure,
-            Description   = tmp_dim_product.Description
-        FROM tmp_dim_product
-        WHERE dw.Dim_Product.ProductID = tmp_dim_product.ProductID
-          AND (
-              dw.Dim_Product.ProductName   IS DISTINCT FROM tmp_dim_product.ProductName   OR
-              dw.Dim_Product.CategoryName  IS DISTINCT FROM tmp_dim_product.CategoryName  OR
-              dw.Dim_Product.UnitOfMeasure IS DISTINCT FROM tmp_dim_product.UnitOfMeasure OR
-              dw.Dim_Product.Description   IS DISTINCT FROM tmp_dim_product.Description
-          );
-    """)
-
-    # Step 2: Insert new products
-    duck_conn.execute("""
-        INSERT INTO dw.Dim_Product (ProductID, ProductName, CategoryName, UnitOfMeasure, Description)
-        SELECT
-            tmp_dim_product.ProductID,
-            tmp_dim_product.ProductName,
-            tmp_dim_product.CategoryName,
-            tmp_dim_product.UnitOfMeasure,
-            tmp_dim_product.Description
-        FROM tmp_dim_product
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.Dim_Product
-            WHERE dw.Dim_Product.ProductID = tmp_dim_product.ProductID
-        );
-    """)
-
-    logger.info(f"Dim_Product upsert complete. Source rows: {len(dim_df)}.")
+    if dim_product is not None:
+        stage_batches(duck_conn, STAGING_TABLE, [dim_product])
+
+    # Single pass: classify staged rows against the current dw.Dim_Product rows by hash-diff, then insert/update
+    if "Dim_Product" in SCD2_DIMENSIONS:
+        counts = upsert_scd2(duck_conn, "dw.Dim_Product", STAGING_TABLE, keys=["ProductID"], columns=ATTRIBUTES,
+                             hash_column=ROW_HASH_COLUMN)
+    else:
+        counts = upsert(duck_conn, "dw.Dim_Product", STAGING_TABLE, keys=["ProductID"], columns=ATTRIBUTES, update_columns=ATTRIBUTES,
+                        hash_column=ROW_HASH_COLUMN, current_column=IS_CURRENT)
+    annotate(rows_in=counts["source"], rows_out=counts["inserted"] + counts["updated"])
+    logger.info(
+        f"Dim_Product upsert complete. Source rows: {counts['source']}, {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['unchanged']} unchanged."
+    )
+    return counts
 
 
 # 4. ORCHESTRATION
-def run_dim_product_etl(duck_conn):
+def product_fingerprint() -> str:
+    """Source fingerprint of the product query, plus the descriptions CSV's size and mtime."""
+    csv_state = ""
+    if CSV_DESCRIPTION_PATH.exists():
+        stat = CSV_DESCRIPTION_PATH.stat()
+        csv_state = f"{stat.st_size}:{stat.st_mtime_ns}"
+    return source_fingerprint("Dim_Product", EXTRACT_QUERY, extra=csv_state)
+
+def prepare_dim_product(known_fingerprint: str | None = None):
+    """
+    Extracts products and merges descriptions, without touching the warehouse.
+    The pipeline runs this in a worker thread and applies load_dim_product() itself.
+    Returns (dim_product, fingerprint); dim_product is None when the source fingerprint
+    matches known_fingerprint, i.e. nothing changed since the last load.
+    """
+    fingerprint = product_fingerprint()
+    if fingerprint == known_fingerprint:
+        return None, fingerprint
+    return transform_dim_product(extract_products()), fingerprint
+
+@timed_stage("Dim_Product")
+def run_dim_product_etl(duck_conn, chunksize: int | None = None, force: bool = False):
     """
     Orchestrates the Product Dimension ETL.
     Accepts a shared connection — does NOT open its own or manage transactions.
+    Skipped when the source fingerprint matches the last committed load.
+
+    Args:
+        chunksize: If set, streams the extract in chunks of this size into the staging table.
+        force: If True, reloads even when the source fingerprint is unchanged.
     """
     try:
-        raw_products = extract_products()
-        dim_product_df = transform_dim_product(raw_products)
-        load_dim_product(duck_conn, dim_product_df)
+        known_fingerprint = None if force else get_fingerprints(duck_conn).get("Dim_Product")
+        if chunksize:
+            # Fingerprint before extracting: a change in between only causes one extra reload next run
+            fingerprint = product_fingerprint()
+            if fingerprint == known_fingerprint:
+                logger.info("⏭️ Dim_Product source unchanged since the last load. Skipping.")
+                return
+            staged = stage_batches(duck_conn, STAGING_TABLE, extract_products(chunksize), transform=transform_dim_product)
+            if not staged:
+                logger.warning("No products extracted. Skipping Dim_Product load.")
+                return
+            load_dim_product(duck_conn)
+        else:
+            product_rows, fingerprint = prepare_dim_product(known_fingerprint)
+            if product_rows is None:
+                logger.info("⏭️ Dim_Product source unchanged since the last load. Skipping.")
+                return
+            load_dim_product(duck_conn, product_rows)
+        save_fingerprint(duck_conn, "Dim_Product", fingerprint)
         logger.info("✅ Dim_Product ETL completed successfully.")
     except Exception as e:
         logger.error(f"Dim_Product ETL failed: {e}")
@@ -1,114 +1,145 @@
-import logging
-import pandas as pd
-from analytics.data.connect_db import get_oltp_connection, get_warehouse_conn
+import pyarrow as pa
+import pyarrow.compute as pc
+from analytics.data.connect_db import get_warehouse_conn
+from analytics.etl.staging import iter_oltp_batches, stage_batches
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+from analytics.etl.upsert import IS_CURRENT, SCD2_DIMENSIONS, upsert, upsert_scd2
+from analytics.etl.change_detection import ROW_HASH_COLUMN, get_fingerprints, save_fingerprint, source_fingerprint
 
 # --- Logging Setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - [Dim_User] - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, "Dim_User")
+
+STAGING_TABLE = "tmp_dim_user"
+# Tracked attributes: overwritten when they change in the OLTP (SCD Type 1),
+# or versioned if the dimension is listed in LABHUB_SCD2_DIMENSIONS (SCD Type 2)
+ATTRIBUTES = ["UserName", "UserRole", "DepartmentName"]
 
 # -------------------------
 # Extract
 # -------------------------
-def extract_users():
+EXTRACT_QUERY = """
+    SELECT
+        "User".UserID,
+        -- NULL when either part is NULL, as FirstName + ' ' + LastName was (CONCAT would not)
+        CASE
+            WHEN "User".FirstName IS NULL OR "User".LastName IS NULL THEN NULL
+            ELSE CONCAT("User".FirstName, ' ', "User".LastName)
+        END AS UserName,
+        UserRole.UserRoleName AS UserRole,
+        Department.DepartmentName
+    FROM core."User"
+    JOIN core.UserRole ON "User".UserRoleID = UserRole.UserRoleID
+    JOIN core.Department ON "User".DepartmentID = Department.DepartmentID;
+"""
+
+@timed_stage("Dim_User.extract")
+def extract_users(chunksize: int | None = None):
     """
     Pulls user data from the OLTP database, joining Role and Department.
+    Returns an Arrow table, or with a chunksize an iterator of record batches (streaming mode).
     """
     logger.info("Extracting user data from OLTP...")
-    query = """
-        SELECT
-            [User].UserID,
-            [User].FirstName + ' ' + [User].LastName AS UserName,
-            UserRole.UserRoleName AS UserRole,
-            Department.DepartmentName
-        FROM core.[User]
-        JOIN core.UserRole ON [User].UserRoleID = UserRole.UserRoleID
-        JOIN core.Department ON [User].DepartmentID = Department.DepartmentID;
-    """
-    conn = get_oltp_connection()
+    if chunksize:
+        return iter_oltp_batches(EXTRACT_QUERY, chunksize=chunksize)
+
     try:
-        df_users = pd.read_sql(query, conn)
-        logger.info(f"Successfully extracted {len(df_users)} users.")
-        return df_users
+        users = pa.Table.from_batches(list(iter_oltp_batches(EXTRACT_QUERY)))
+        logger.info(f"Successfully extracted {users.num_rows} users.")
+        return users
     except Exception as e:
         logger.error(f"Failed to extract users: {e}")
         raise
-    finally:
-        conn.close()
 
 # -------------------------
 # Transform
 # -------------------------
-def transform_dim_user(df_users: pd.DataFrame) -> pd.DataFrame:
+@timed_stage("Dim_User.transform")
+def transform_dim_user(users: pa.Table) -> pa.Table:
     """
     Shapes OLTP user data into Dim_User rows.
     """
     logger.info("Transforming user data...")
-    dim_user_df = df_users.copy()
-    
+
     # Cleans whitespace and ensures proper casing if needed
-    dim_user_df['UserName'] = dim_user_df['UserName'].str.strip()
-    
+    dim_user = users.set_column(
+        users.schema.get_field_index("UserName"),
+        "UserName",
+        pc.utf8_trim_whitespace(users["UserName"]),
+    )
+
     # Enforces schema column order
-    dim_user_df = dim_user_df[["UserID", "UserName", "UserRole", "DepartmentName"]]
-    return dim_user_df
+    return dim_user.select(["UserID", "UserName", "UserRole", "DepartmentName"])
 
 # -------------------------
 # Load
 # -------------------------
-def load_dim_user(duck_conn, dim_df: pd.DataFrame):
+@timed_stage("Dim_User.load")
+def load_dim_user(duck_conn, dim_user: pa.Table | None = None):
     """
-    Incremental SCD Type 1 upsert into dw.Dim_User.
+    Incremental SCD Type 1 upsert into dw.Dim_User (Type 2 versioning if enabled in LABHUB_SCD2_DIMENSIONS).
+    Reads from the tmp_dim_user staging table; if dim_user is given it is staged first.
     """
     logger.info("Upserting data into dw.Dim_User...")
-    duck_conn.register("tmp_dim_user", dim_df)
-
-    # Step 1: Update changed attributes on existing rows
-    duck_conn.execute("""
-        UPDATE dw.Dim_User
-        SET
-            UserName       = tmp_dim_user.UserName,
-            UserRole       = tmp_dim_user.UserRole,
-            DepartmentName = tmp_dim_user.DepartmentName
-        FROM tmp_dim_user
-        WHERE dw.Dim_User.UserID = tmp_dim_user.UserID
-          AND (
-              dw.Dim_User.UserName       IS DISTINCT FROM tmp_dim_user.UserName       OR
-              dw.Dim_User.UserRole       IS DISTINCT FROM tmp_dim_user.UserRole       OR
-              dw.Dim_User.DepartmentName IS DISTINCT FROM tmp_dim_user.DepartmentName
-          );
-    """)
-
-    # Step 2: Insert new users
-    duck_conn.execute("""
-        INSERT INTO dw.Dim_User (UserID, UserName, UserRole, DepartmentName)
-        SELECT
-            tmp_dim_user.UserID,
-            tmp_dim_user.UserName,
-            tmp_dim_user.UserRole,
-            tmp_dim_user.DepartmentName
-        FROM tmp_dim_user
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.Dim_User
-            WHERE dw.Dim_User.UserID = tmp_dim_user.UserID
-        );
-    """)
-
-    logger.info(f"Dim_User upsert complete. Source rows: {len(dim_df)}.")
+    if dim_user is not None:
+        stage_batches(duck_conn, STAGING_TABLE, [dim_user])
+
+    # Single pass: classify staged rows against the current dw.Dim_User rows by hash-diff, then insert/update
+    if "Dim_User" in SCD2_DIMENSIONS:
+        counts = upsert_scd2(duck_conn, "dw.Dim_User", STAGING_TABLE, keys=["UserID"], columns=ATTRIBUTES,
+                             hash_column=ROW_HASH_COLUMN)
+    else:
+        counts = upsert(duck_conn, "dw.Dim_User", STAGING_TABLE, keys=["UserID"], columns=ATTRIBUTES, update_columns=ATTRIBUTES,
+                        hash_column=ROW_HASH_COLUMN, current_column=IS_CURRENT)
+    annotate(rows_in=counts["source"], rows_out=counts["inserted"] + counts["updated"])
+    logger.info(
+        f"Dim_User upsert complete. Source rows: {counts['source']}, {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['unchanged']} unchanged."
+    )
+    return counts
 
 
 # 4. ORCHESTRATION
-def run_dim_user_etl(duck_conn):
+def prepare_dim_user(known_fingerprint: str | None = None):
+    """
+    Extract + transform for users (OLTP only, thread-safe).
+    Returns (dim_user, fingerprint); dim_user is None if the source is unchanged since known_fingerprint.
+    """
+    fingerprint = source_fingerprint("Dim_User", EXTRACT_QUERY)
+    if fingerprint == known_fingerprint:
+        return None, fingerprint
+    return transform_dim_user(extract_users()), fingerprint
+
+@timed_stage("Dim_User")
+def run_dim_user_etl(duck_conn, chunksize: int | None = None, force: bool = False):
     """
     Orchestrates the User Dimension ETL.
     Accepts a shared connection — does NOT open its own or manage transactions.
+    Skipped when the source fingerprint matches the last committed load.
+
+    Args:
+        chunksize: If set, streams the extract in chunks of this size into the staging table.
+        force: If True, reloads even when the source fingerprint is unchanged.
     """
     try:
-        raw_users = extract_users()
-        dim_user_df = transform_dim_user(raw_users)
-        load_dim_user(duck_conn, dim_user_df)
+        known_fingerprint = None if force else get_fingerprints(duck_conn).get("Dim_User")
+        if chunksize:
+            # Fingerprint before extracting: a change in between only causes one extra reload next run
+            fingerprint = source_fingerprint("Dim_User", EXTRACT_QUERY)
+            if fingerprint == known_fingerprint:
+                logger.info("⏭️ Dim_User source unchanged since the last load. Skipping.")
+                return
+            staged = stage_batches(duck_conn, STAGING_TABLE, extract_users(chunksize), transform=transform_dim_user)
+            if not staged:
+                logger.warning("No users extracted. Skipping Dim_User load.")
+                return
+            load_dim_user(duck_conn)
+        else:
+            user_rows, fingerprint = prepare_dim_user(known_fingerprint)
+            if user_rows is None:
+                logger.info("⏭️ Dim_User source unchanged since the last load. Skipping.")
+                return
+            load_dim_user(duck_conn, user_rows)
+        save_fingerprint(duck_conn, "Dim_User", fingerprint)
         logger.info("✅ Dim_User ETL completed successfully.")
     except Exception as e:
         logger.error(f"❌ Dim_User ETL failed: {e}")
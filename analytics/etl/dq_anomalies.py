@@ -0,0 +1,173 @@
+"""
+Statistical anomaly checks on a load batch.
+
+The rules in dq_rules.py are invariants (a count that must be zero). This stage asks whether
+a batch looks like the recent past instead. For every product-day and location-day the rows
+the run inserted fall on (fact_inventory.NEW_ROWS_VIEW, so lookback re-reads of loaded days
+are not scored again), three daily metrics
+
+    Events       Remove + Add transactions
+    Consumed     units removed (the negative side of QuantityDelta)
+    RemoveShare  Removes / (Removes + Adds)
+
+are scored against the same product's (or location's) days in the preceding
+DQ_ANOMALY_BASELINE_DAYS days: a z-score (|x - mean| / stddev above DQ_ANOMALY_Z) and Tukey
+fences (outside [Q1 - k * IQR, Q3 + k * IQR], k = DQ_ANOMALY_IQR_K). DQ_ANOMALY_METHOD picks
+"zscore", "iqr", or "both" (flag only when the two agree, the default: counts are skewed and
+either test alone is noisy on short baselines).
+
+Everything is read from dw.Fact_Inventory_Daily, which the fact load has already refreshed
+from the batch, and scored in one query per grain. Days without activity have no
+rollup row, so the baselines are over active days, and keys with fewer than
+DQ_ANOMALY_MIN_DAYS of them are not scored. Findings are warnings: they are reported and
+stored in dw.dq_results but never roll a load back.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+
+logger = get_logger(__name__, "DQ_Anomalies")
+
+DAILY_TABLE = "dw.Fact_Inventory_Daily"
+
+DQ_ANOMALY_BASELINE_DAYS = int(os.getenv("LABHUB_DQ_ANOMALY_BASELINE_DAYS", "90"))
+DQ_ANOMALY_MIN_DAYS = int(os.getenv("LABHUB_DQ_ANOMALY_MIN_DAYS", "10"))
+DQ_ANOMALY_Z = float(os.getenv("LABHUB_DQ_ANOMALY_Z", "3"))
+DQ_ANOMALY_IQR_K = float(os.getenv("LABHUB_DQ_ANOMALY_IQR_K", "1.5"))
+DQ_ANOMALY_METHOD = os.getenv("LABHUB_DQ_ANOMALY_METHOD", "both")   # zscore, iqr or both
+
+# Grain name -> key column; each grain is baselined on its own
+GRAINS = {
+    "product": "ProductKey",
+    "location": "LocationKey",
+}
+
+# Metric -> (report label, daily expression over the rollup)
+METRICS = {
+    "Events": ("Event count", "SUM(TransactionCount + ReplenishmentCount)"),
+    "Consumed": ("Units consumed", "SUM(TotalQuantityConsumed)"),
+    "RemoveShare": ("Remove share", "SUM(TransactionCount) / NULLIF(SUM(TransactionCount + ReplenishmentCount), 0)"),
+}
+
+
+def _outlier(metric: str) -> str:
+    """SQL condition flagging `metric` against its baseline columns, per DQ_ANOMALY_METHOD."""
+    z_out = f"abs({metric} - {metric}_mean) > {DQ_ANOMALY_Z} * NULLIF({metric}_std, 0)"
+    iqr = f"({metric}_q3 - {metric}_q1)"
+    iqr_out = f"({metric} < {metric}_q1 - {DQ_ANOMALY_IQR_K} * {iqr} OR {metric} > {metric}_q3 + {DQ_ANOMALY_IQR_K} * {iqr})"
+    return {"zscore": z_out, "iqr": iqr_out}.get(DQ_ANOMALY_METHOD, f"{z_out} AND {iqr_out}")
+
+
+def _anomaly_query(grain: str, delta_view: str, from_key: int, last_key: int) -> str:
+    """Flagged (grain key, day, metric) rows among the days `delta_view` touched, one row per finding."""
+    key = GRAINS[grain]
+    daily_metrics = ",\n                ".join(f"{expr} AS {metric}" for metric, (_, expr) in METRICS.items())
+    baselines = ",\n                ".join(
+        f"AVG(h.{m}) AS {m}_mean, STDDEV_SAMP(h.{m}) AS {m}_std, "
+        f"quantile_cont(h.{m}, 0.25) AS {m}_q1, quantile_cont(h.{m}, 0.75) AS {m}_q3"
+        for m in METRICS
+    )
+    findings = "\n        UNION ALL\n        ".join(
+        f"""SELECT '{grain}' AS Grain, GrainKey, DateKey, '{m}' AS Metric, {m} AS Value,
+               {m}_mean AS BaselineMean, ({m} - {m}_mean) / NULLIF({m}_std, 0) AS ZScore,
+               {m}_q1 AS BaselineQ1, {m}_q3 AS BaselineQ3, BaselineDays
+        FROM Scored WHERE {_outlier(m)}"""
+        for m in METRICS
+    )
+    # Baselines are aggregated only for the touched days: each is range-joined to its own
+    # window of earlier days, so the cost follows the batch, not the history.
+    return f"""
+        WITH Touched AS (
+            SELECT DISTINCT {key} AS GrainKey, DateKey FROM {delta_view}
+        ),
+        Daily AS (
+            SELECT r.{key} AS GrainKey, r.DateKey, d.FullDate,
+                {daily_metrics}
+            FROM {DAILY_TABLE} r
+            JOIN dw.Dim_Date d ON d.DateKey = r.DateKey
+            WHERE r.DateKey BETWEEN {from_key} AND {last_key}
+              AND r.{key} IN (SELECT GrainKey FROM Touched)
+            GROUP BY r.{key}, r.DateKey, d.FullDate
+        ),
+        Scored AS (
+            SELECT b.GrainKey, b.DateKey, {", ".join(f"b.{m}" for m in METRICS)},
+                COUNT(*) AS BaselineDays,
+                {baselines}
+            FROM Daily b
+            JOIN Touched t ON t.GrainKey = b.GrainKey AND t.DateKey = b.DateKey
+            JOIN Daily h ON h.GrainKey = b.GrainKey
+                AND h.FullDate >= b.FullDate - INTERVAL {DQ_ANOMALY_BASELINE_DAYS} DAYS
+                AND h.FullDate < b.FullDate
+            GROUP BY ALL
+            HAVING COUNT(*) >= {DQ_ANOMALY_MIN_DAYS}
+        )
+        {findings}
+    """
+
+
+@timed_stage("DQ.anomalies")
+def run_anomaly_checks(duck_conn, delta_view: str, top: int = 10) -> dict:
+    """
+    Scores the days of the run's inserted fact rows against their rolling baselines.
+
+    Args:
+        duck_conn: The pipeline connection, after the daily rollup was refreshed from the batch.
+        delta_view: The fact rows this run inserted (fact_inventory.NEW_ROWS_VIEW). The
+            pipeline skips the scan on full reloads and on the first load of an empty
+            warehouse, where the whole history would be scored as one batch.
+        top: How many of the strongest findings to keep in report["anomalies"].
+
+    Returns:
+        A report shaped like run_dq_checks()'s (print_dq_report / save_dq_results accept it),
+        one warning check per grain and metric whose value is the number of flagged days,
+        plus "anomalies": a DataFrame of the `top` findings by |z-score|.
+    """
+    report = {
+        "title": "📈 LabHub Batch Anomaly Scan",
+        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M'),
+        "checked_at": datetime.now(),
+        "scope": "anomalies",
+        "checks": [],
+        "passed_all": True,   # findings are warnings only
+        "anomalies": None,
+    }
+
+    first_key, last_key = duck_conn.execute(f"SELECT MIN(DateKey), MAX(DateKey) FROM {delta_view}").fetchone()
+    if first_key is None:
+        annotate(rows_out=0)
+        return report
+    first_day = datetime.strptime(str(first_key), "%Y%m%d") - timedelta(days=DQ_ANOMALY_BASELINE_DAYS)
+    from_key = int(first_day.strftime("%Y%m%d"))
+
+    flagged = pd.concat([
+        duck_conn.execute(_anomaly_query(grain, delta_view, from_key, last_key)).df()
+        for grain in GRAINS
+    ], ignore_index=True)
+    counts = flagged.groupby(["Grain", "Metric"]).size()
+
+    for grain in GRAINS:
+        for metric, (label, _) in METRICS.items():
+            value = int(counts.get((grain, metric), 0))
+            report["checks"].append({
+                "check_name": f"{label} outliers ({grain})",
+                "table": DAILY_TABLE,
+                "severity": "warning",
+                "value": value,
+                "status": "⚠️ WARN" if value else "✅ PASS",
+            })
+
+    report["anomalies"] = (
+        flagged.assign(_abs_z=flagged["ZScore"].abs())
+        .sort_values("_abs_z", ascending=False, na_position="last")
+        .drop(columns="_abs_z")
+        .head(top)
+    )
+    annotate(rows_out=len(flagged))
+    if len(flagged):
+        logger.warning(f"{len(flagged)} anomalous product/location days in this batch. Strongest:\n"
+                       f"{report['anomalies'].to_string(index=False)}")
+    return report
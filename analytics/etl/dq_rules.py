@@ -0,0 +1,111 @@
+"""
+Registry of the Data Quality rules run by data_quality.run_dq_checks().
+
+A rule is a name, a scope ("dimensions" / "facts"), a target table, a severity and either a
+SQL row predicate (the rule counts the rows matching it) or an aggregate expression. Rules
+are registered with dq_rule(), here or from any module imported before the audit, or listed
+in a YAML file named by LABHUB_DQ_RULES_FILE (needs PyYAML):
+
+    - name: Stale reject backlog
+      table: dw.Fact_Inventory_Rejects
+      predicate: RetryCount > 10
+      severity: warning
+
+run_dq_checks() compiles all rules on a table into one query, so adding a rule does not add
+a scan. `{today_key}` in a predicate or aggregate is replaced with today's YYYYMMDD key.
+"""
+
+import os
+from pathlib import Path
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from analytics.etl.instrumentation import get_logger
+
+logger = get_logger(__name__, "DQ_Rules")
+
+SCOPES = ("dimensions", "facts")
+SEVERITIES = ("critical", "warning")   # a failed critical rule fails the audit (and rolls the load back)
+EXPECTATIONS = ("zero", "nonzero")     # what the rule's value must be to pass
+
+RULES_FILE = os.getenv("LABHUB_DQ_RULES_FILE")
+
+DQ_RULES = []
+
+
+def dq_rule(name: str, table: str, predicate: str | None = None, aggregate: str | None = None,
+            scope: str = "facts", severity: str = "critical", expect: str = "zero") -> dict:
+    """
+    Registers a rule and returns it. Reported in registration order.
+
+    Args:
+        name: Unique name shown in the report and dw.dq_results.
+        table: Schema-qualified table the rule reads, e.g. "dw.Fact_Inventory_Transactions".
+        predicate: Row condition counted as violations (COUNT(*) FILTER (WHERE predicate)).
+        aggregate: Any aggregate expression over `table`, instead of a predicate.
+        scope: "dimensions" or "facts"; run_dq_checks(scope=...) selects rules by it.
+        severity: "critical" or "warning".
+        expect: "zero" (pass when the value is 0) or "nonzero" (pass when it is > 0).
+    """
+    if (predicate is None) == (aggregate is None):
+        raise ValueError(f"DQ rule {name!r}: give exactly one of predicate or aggregate.")
+    if scope not in SCOPES or severity not in SEVERITIES or expect not in EXPECTATIONS:
+        raise ValueError(f"DQ rule {name!r}: invalid scope, severity or expect.")
+    if any(rule["name"] == name for rule in DQ_RULES):
+        raise ValueError(f"DQ rule {name!r} is already registered.")
+    rule = {
+        "name": name,
+        "scope": scope,
+        "table": table,
+        "aggregate": aggregate or f"COUNT(*) FILTER (WHERE {predicate})",
+        "severity": severity,
+        "expect": expect,
+    }
+    DQ_RULES.append(rule)
+    return rule
+
+
+def load_rules_file(path) -> int:
+    """Registers the rules listed in a YAML file (a list of dq_rule() arguments). Returns how many."""
+    if yaml is None:
+        raise RuntimeError("PyYAML is required to load DQ rules from a file.")
+    entries = yaml.safe_load(Path(path).read_text(encoding="utf-8")) or []
+    for entry in entries:
+        dq_rule(**entry)
+    return len(entries)
+
+
+def rules_for(scope: str) -> list:
+    """Registered rules of a scope ("all" for every rule)."""
+    return [rule for rule in DQ_RULES if scope == "all" or rule["scope"] == scope]
+
+
+# -------------------------
+# Built-in rules
+# -------------------------
+
+FACT_TABLE = "dw.Fact_Inventory_Transactions"
+
+dq_rule("Dim_Product populated", "dw.Dim_Product", aggregate="COUNT(*)", scope="dimensions", expect="nonzero")
+dq_rule("Dim_Location populated", "dw.Dim_Location", aggregate="COUNT(*)", scope="dimensions", expect="nonzero")
+dq_rule("Dim_User populated", "dw.Dim_User", aggregate="COUNT(*)", scope="dimensions", expect="nonzero")
+dq_rule("Dim_Date populated", "dw.Dim_Date", aggregate="COUNT(*)", scope="dimensions", expect="nonzero")
+dq_rule("Missing AI Descriptions", "dw.Dim_Product", predicate="Description IS NULL OR length(trim(Description)) < 5",
+        scope="dimensions", severity="warning")
+
+dq_rule("Negative Stock (Absolute)", FACT_TABLE, predicate="AbsoluteQuantity < 0")
+# NOT IN: DuckDB builds each dimension's key set once and probes it during the fact scan
+dq_rule("Orphaned Products", FACT_TABLE, predicate="ProductKey NOT IN (SELECT ProductKey FROM dw.Dim_Product)")
+dq_rule("Orphaned Locations", FACT_TABLE, predicate="LocationKey NOT IN (SELECT LocationKey FROM dw.Dim_Location)")
+dq_rule("Duplicate Transaction IDs", FACT_TABLE, aggregate="COUNT(TransactionID) - COUNT(DISTINCT TransactionID)")
+dq_rule("Data is from Today", FACT_TABLE, predicate="DateKey = {today_key}", severity="warning", expect="nonzero")
+dq_rule("Negative Location Balances", "dw.Current_Stock", predicate="AbsoluteQuantity < 0", severity="warning")
+
+if RULES_FILE:
+    try:
+        logger.info(f"{load_rules_file(RULES_FILE)} DQ rules loaded from {RULES_FILE}.")
+    except Exception as e:
+        logger.warning(f"Could not load DQ rules from {RULES_FILE}: {e}")
@@ -0,0 +1,148 @@
+"""
+Clustered rewrite of dw.Fact_Inventory_Transactions.
+
+Fact rows are appended in extract order. DuckDB keeps min/max statistics (zone maps) per row
+group and skips row groups a filter cannot match, but only if the filtered column is
+clustered. compact_fact_table() rewrites the table ordered by CLUSTER_ORDER, in one
+transaction: the sorted copy is built next to the table, then swapped in by DROP + RENAME
+(DuckDB rejects re-inserting primary keys deleted in the same transaction, so DELETE +
+INSERT is not an option).
+
+scan_stats() reads the zone maps from pragma_storage_info and reports how many row groups an
+average one-month DateKey filter and an average single-ProductKey filter still have to read.
+The pipeline checks them after each load that inserted rows (metadata and dimension keys
+only) and compacts once the month figure exceeds what a clustered table would read by more
+than LABHUB_COMPACT_SCAN_SLACK, or on --compact. With few row groups even a clustered table
+reads a large share, so a fixed threshold would rewrite the table on every run for nothing.
+Run standalone from a scheduler with
+
+    python -m analytics.etl.facts.compaction [--force]
+
+ProductKey comes second in the order, so a product filter alone only skips within a date
+range; the stats show both.
+"""
+
+import argparse
+import os
+import re
+
+from analytics.data.connect_db import get_warehouse_conn
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+
+logger = get_logger(__name__, "Fact_Compaction")
+
+FACT_TABLE = "dw.Fact_Inventory_Transactions"
+COMPACT_TABLE = "dw.Fact_Inventory_Transactions_compact"
+CLUSTER_ORDER = "DateKey, ProductKey, LocationKey, TransactionID"
+
+# Compact when a one-month DateKey filter reads more than this share of the row groups above
+# what it would read on a clustered table.
+COMPACT_SCAN_SLACK = float(os.getenv("LABHUB_COMPACT_SCAN_SLACK", "0.25"))
+
+
+def _zone_maps(duck_conn, column: str) -> list:
+    """(min, max) of `column` per row group of the fact table, from its segment statistics."""
+    return duck_conn.execute(f"""
+        SELECT
+            MIN(TRY_CAST(regexp_extract(stats, 'Min: (-?\\d+)', 1) AS BIGINT)),
+            MAX(TRY_CAST(regexp_extract(stats, 'Max: (-?\\d+)', 1) AS BIGINT))
+        FROM pragma_storage_info('{FACT_TABLE}')
+        WHERE column_name = ? AND segment_type <> 'VALIDITY'
+        GROUP BY row_group_id
+        ORDER BY row_group_id
+    """, [column]).fetchall()
+
+
+def _scan_share(zones: list, ranges: list) -> float:
+    """Average share of row groups whose [min, max] overlaps each (low, high) filter range."""
+    if not zones or not ranges:
+        return 0.0
+    hits = sum(
+        sum(1 for zone_min, zone_max in zones if zone_min <= high and zone_max >= low)
+        for low, high in ranges
+    )
+    return round(hits / (len(zones) * len(ranges)), 3)
+
+
+def scan_stats(duck_conn) -> dict:
+    """
+    Zone-map view of the fact table's layout:
+        row_groups:           number of row groups
+        month_scan:           average share of row groups a one-month DateKey filter reads
+        clustered_month_scan: the same on a table clustered by date: one month's share of
+                              the rows plus the row group at its boundary
+        product_scan:         average share of row groups a single-ProductKey filter reads
+    Only metadata and dw.Dim_Product are read, never the fact rows.
+    """
+    date_zones = _zone_maps(duck_conn, "DateKey")
+    product_zones = _zone_maps(duck_conn, "ProductKey")
+    months, products = [], []
+    if date_zones:
+        months = duck_conn.execute("""
+            SELECT DISTINCT DateKey // 100 * 100, DateKey // 100 * 100 + 99
+            FROM dw.Dim_Date WHERE DateKey BETWEEN ? AND ?
+        """, [min(low for low, _ in date_zones), max(high for _, high in date_zones)]).fetchall()
+        products = [(key, key) for (key,) in duck_conn.execute("SELECT ProductKey FROM dw.Dim_Product").fetchall()]
+    clustered = min(1.0, 1 / len(months) + 1 / len(date_zones)) if months else 1.0
+    return {
+        "row_groups": len(date_zones),
+        "month_scan": _scan_share(date_zones, months),
+        "clustered_month_scan": round(clustered, 3),
+        "product_scan": _scan_share(product_zones, products),
+    }
+
+
+def compaction_due(stats: dict) -> bool:
+    """True when a month filter reads clearly more row groups than it would after compaction."""
+    return stats["row_groups"] > 1 and stats["month_scan"] > stats["clustered_month_scan"] + COMPACT_SCAN_SLACK
+
+
+@timed_stage("Fact_Inventory.compact")
+def compact_fact_table(duck_conn, force: bool = False) -> dict | None:
+    """
+    Rewrites the fact table clustered by CLUSTER_ORDER when its zone maps show it is due
+    (or force=True). Runs in its own transaction, so call it after the load's COMMIT.
+
+    Returns:
+        {"before": scan_stats, "after": scan_stats}, or None when no rewrite was needed.
+    """
+    before = scan_stats(duck_conn)
+    if not force and not compaction_due(before):
+        logger.info(f"Fact layout OK, compaction skipped: {before}")
+        return None
+
+    ddl = duck_conn.execute(
+        "SELECT sql FROM duckdb_tables() WHERE schema_name = 'dw' AND table_name = 'Fact_Inventory_Transactions'"
+    ).fetchone()[0]
+    compact_ddl = re.sub(re.escape(FACT_TABLE) + r"\b", COMPACT_TABLE, ddl, count=1)
+
+    duck_conn.execute("BEGIN TRANSACTION;")
+    try:
+        duck_conn.execute(f"DROP TABLE IF EXISTS {COMPACT_TABLE};")
+        duck_conn.execute(compact_ddl)
+        rows = duck_conn.execute(
+            f"INSERT INTO {COMPACT_TABLE} SELECT * FROM {FACT_TABLE} ORDER BY {CLUSTER_ORDER};"
+        ).fetchone()[0]
+        duck_conn.execute(f"DROP TABLE {FACT_TABLE};")
+        duck_conn.execute(f"ALTER TABLE {COMPACT_TABLE} RENAME TO {FACT_TABLE.split('.', 1)[1]};")
+        duck_conn.execute("COMMIT;")
+    except Exception:
+        duck_conn.execute("ROLLBACK;")
+        raise
+    duck_conn.execute("CHECKPOINT;")  # release the old table's blocks
+
+    after = scan_stats(duck_conn)
+    annotate(rows_in=rows, rows_out=rows)
+    logger.info(f"✅ {FACT_TABLE} compacted by ({CLUSTER_ORDER}): {rows} rows. Before {before}, after {after}.")
+    return {"before": before, "after": after}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rewrite the fact table clustered for zone-map skipping.")
+    parser.add_argument("--force", action="store_true", help="Compact even if the layout looks fine.")
+    args = parser.parse_args()
+    duck_conn = get_warehouse_conn()
+    try:
+        compact_fact_table(duck_conn, force=args.force)
+    finally:
+        duck_conn.close()
@@ -0,0 +1,122 @@
+"""
+dw.Product_Usage_Cumulative: running consumption total per product, one row per day with usage.
+
+v_product_performance_global computed its 30-day / 6-month / 12-month usage with conditional
+sums over the fact table, anchored on CURRENT_DATE, so every query rescanned the year and
+nothing carried over between days. With a prefix sum per product
+
+    CumulativeConsumed(p, d) = units of p consumed on or before day d
+
+the usage of any window is CumulativeConsumed at its last day minus CumulativeConsumed before
+its first day: two ASOF lookups per product (see the dw.product_usage_window macro in
+create_views.py), whatever the window length.
+
+The series is derived from dw.Fact_Inventory_Daily. A load recomputes, for each product in
+its staged delta, the suffix of the series from the earliest touched day on (late events shift
+every later total). Facts are insert-only, so no existing day disappears and the suffix is
+upserted. Runs inside the pipeline transaction, after the daily rollup.
+"""
+
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+from analytics.etl.upsert import swap_table
+
+logger = get_logger(__name__, "Cumulative_Usage")
+
+CUMULATIVE_TABLE = "dw.Product_Usage_Cumulative"
+DAILY_TABLE = "dw.Fact_Inventory_Daily"
+
+
+def ensure_cumulative_table(duck_conn):
+    """Creates dw.Product_Usage_Cumulative on warehouses initialized before it existed."""
+    duck_conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CUMULATIVE_TABLE} (
+            ProductKey INT NOT NULL,
+            DateKey INT NOT NULL,
+            DailyConsumed DECIMAL(18,2) NOT NULL,
+            CumulativeConsumed DECIMAL(18,2) NOT NULL,
+            PRIMARY KEY (ProductKey, DateKey)
+        );
+    """)
+
+
+def _series(from_keys: str | None = None) -> str:
+    """
+    Prefix sums over the daily rollup. With `from_keys` (a relation of ProductKey, FromKey),
+    only those products from FromKey on, continuing from their stored total before FromKey.
+    """
+    if from_keys is None:
+        return f"""
+            SELECT ProductKey, DateKey, DailyConsumed,
+                   SUM(DailyConsumed) OVER (PARTITION BY ProductKey ORDER BY DateKey) AS CumulativeConsumed
+            FROM (
+                SELECT ProductKey, DateKey, SUM(TotalQuantityConsumed) AS DailyConsumed
+                FROM {DAILY_TABLE}
+                GROUP BY ProductKey, DateKey
+                HAVING SUM(TotalQuantityConsumed) > 0
+            )
+        """
+    return f"""
+        WITH Touched AS (
+            SELECT t.ProductKey, t.FromKey, COALESCE(MAX(c.CumulativeConsumed), 0) AS BaseConsumed
+            FROM {from_keys} t
+            LEFT JOIN {CUMULATIVE_TABLE} c ON c.ProductKey = t.ProductKey AND c.DateKey < t.FromKey
+            GROUP BY t.ProductKey, t.FromKey
+        ),
+        Daily AS (
+            SELECT d.ProductKey, d.DateKey, SUM(d.TotalQuantityConsumed) AS DailyConsumed
+            FROM {DAILY_TABLE} d
+            JOIN Touched ON d.ProductKey = Touched.ProductKey AND d.DateKey >= Touched.FromKey
+            GROUP BY d.ProductKey, d.DateKey
+            HAVING SUM(d.TotalQuantityConsumed) > 0
+        )
+        SELECT Daily.ProductKey, Daily.DateKey, Daily.DailyConsumed,
+               Touched.BaseConsumed
+                 + SUM(Daily.DailyConsumed) OVER (PARTITION BY Daily.ProductKey ORDER BY Daily.DateKey) AS CumulativeConsumed
+        FROM Daily
+        JOIN Touched ON Daily.ProductKey = Touched.ProductKey
+    """
+
+
+@timed_stage("Cumulative_Usage.rebuild")
+def rebuild_cumulative_usage(duck_conn) -> int:
+    """Recomputes dw.Product_Usage_Cumulative from the whole daily rollup. Returns the number of rows."""
+    ensure_cumulative_table(duck_conn)
+    rows = swap_table(duck_conn, CUMULATIVE_TABLE, _series())
+    annotate(rows_out=rows)
+    logger.info(f"✅ {CUMULATIVE_TABLE} rebuilt: {rows} product-days.")
+    return rows
+
+
+@timed_stage("Cumulative_Usage.refresh")
+def refresh_cumulative_usage(duck_conn, delta_view: str, full: bool = False) -> int:
+    """
+    Recomputes the series of the products consumed in the run's staged fact rows, from the
+    earliest staged consumption day of each product on.
+
+    Args:
+        delta_view: This run's staged fact rows (fact_inventory.DELTA_VIEW).
+        full: Rebuild from the whole daily rollup instead. Also done when the table is empty.
+
+    Returns:
+        Number of product-days inserted or rewritten.
+    """
+    ensure_cumulative_table(duck_conn)
+    if full or not duck_conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {CUMULATIVE_TABLE} LIMIT 1)").fetchone()[0]:
+        return rebuild_cumulative_usage(duck_conn)
+
+    from_keys = f"""(
+        SELECT ProductKey, MIN(DateKey) AS FromKey
+        FROM {delta_view}
+        WHERE QuantityDelta < 0
+        GROUP BY ProductKey
+    )"""
+    rows = duck_conn.execute(f"""
+        INSERT INTO {CUMULATIVE_TABLE}
+        {_series(from_keys)}
+        ON CONFLICT (ProductKey, DateKey) DO UPDATE SET
+            DailyConsumed = excluded.DailyConsumed,
+            CumulativeConsumed = excluded.CumulativeConsumed;
+    """).fetchone()[0]
+    annotate(rows_out=rows)
+    logger.info(f"{CUMULATIVE_TABLE}: {rows} product-days refreshed.")
+    return rows
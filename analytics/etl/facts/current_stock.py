@@ -0,0 +1,88 @@
+"""
+dw.Current_Stock: the latest AbsoluteQuantity per (ProductKey, LocationKey).
+
+The stock views and the stock-detail dialog used to rank the whole fact table with
+ROW_NUMBER() OVER (PARTITION BY ProductKey, LocationKey ORDER BY DateKey DESC, TransactionID DESC)
+on every query. The fact load now maintains that result as a table: after each load, only the
+run's staged rows (tmp_fact_delta) are ranked, and a pair's row is replaced when the staged
+event is later than the stored one. Readers scan products x locations rows instead of every
+transaction.
+
+The refresh runs inside the pipeline transaction, so a DQ rollback also rolls it back.
+"""
+
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+from analytics.etl.upsert import swap_table
+
+logger = get_logger(__name__, "Current_Stock")
+
+CURRENT_STOCK_TABLE = "dw.Current_Stock"
+FACT_TABLE = "dw.Fact_Inventory_Transactions"
+
+# The latest event per pair, the same order the views used to rank by.
+LATEST_FIRST = "ORDER BY DateKey DESC, TransactionID DESC"
+
+
+def ensure_current_stock_table(duck_conn):
+    """Creates dw.Current_Stock on warehouses initialized before it existed."""
+    duck_conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CURRENT_STOCK_TABLE} (
+            ProductKey INT NOT NULL,
+            LocationKey INT NOT NULL,
+            AbsoluteQuantity DECIMAL(12,2) NOT NULL,
+            DateKey INT NOT NULL,
+            TransactionID INT NOT NULL,
+            PRIMARY KEY (ProductKey, LocationKey)
+        );
+    """)
+
+
+def _latest_per_pair(source: str) -> str:
+    return f"""
+        SELECT ProductKey, LocationKey, AbsoluteQuantity, DateKey, TransactionID
+        FROM {source}
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY ProductKey, LocationKey {LATEST_FIRST}) = 1
+    """
+
+
+@timed_stage("Current_Stock.rebuild")
+def rebuild_current_stock(duck_conn) -> int:
+    """Recomputes dw.Current_Stock from the whole fact table. Returns the number of pairs."""
+    ensure_current_stock_table(duck_conn)
+    pairs = swap_table(duck_conn, CURRENT_STOCK_TABLE, _latest_per_pair(FACT_TABLE))
+    annotate(rows_out=pairs)
+    logger.info(f"✅ {CURRENT_STOCK_TABLE} rebuilt: {pairs} product/location pairs.")
+    return pairs
+
+
+@timed_stage("Current_Stock.refresh")
+def refresh_current_stock(duck_conn, delta_view: str, full: bool = False) -> int:
+    """
+    Applies the run's staged fact rows to dw.Current_Stock.
+
+    Args:
+        delta_view: This run's staged fact rows (fact_inventory.DELTA_VIEW). Rows that were
+            already loaded by an earlier run are harmless: they never beat the stored event.
+        full: Rebuild from the whole fact table instead. Also done when the table is empty
+            while the fact table is not (warehouses loaded before it existed).
+
+    Returns:
+        Number of pairs inserted or moved to a later event.
+    """
+    ensure_current_stock_table(duck_conn)
+    if full or not duck_conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {CURRENT_STOCK_TABLE} LIMIT 1)").fetchone()[0]:
+        return rebuild_current_stock(duck_conn)
+
+    changed = duck_conn.execute(f"""
+        INSERT INTO {CURRENT_STOCK_TABLE}
+        {_latest_per_pair(delta_view)}
+        ON CONFLICT (ProductKey, LocationKey) DO UPDATE SET
+            AbsoluteQuantity = excluded.AbsoluteQuantity,
+            DateKey = excluded.DateKey,
+            TransactionID = excluded.TransactionID
+        WHERE excluded.DateKey > Current_Stock.DateKey
+           OR (excluded.DateKey = Current_Stock.DateKey AND excluded.TransactionID > Current_Stock.TransactionID);
+    """).fetchone()[0]
+    annotate(rows_out=changed)
+    logger.info(f"{CURRENT_STOCK_TABLE}: {changed} product/location pairs updated.")
+    return changed
@@ -0,0 +1,101 @@
+"""
+dw.Fact_Inventory_Daily: the fact table rolled up per product, location, user and day.
+
+dw.v_inventory_metrics_base used to group the whole fact table every time v_monthly_usage or
+v_consumption_summary was queried. The same aggregates are now stored, and each load only
+recomputes the days its staged rows (tmp_fact_delta) fall on: those days are re-aggregated
+from the fact table and upserted. Facts are never deleted, so a day's groups only change or
+grow. The trend views read the rollup, whose size follows products x locations x users x days
+instead of the number of transactions.
+
+The refresh runs inside the pipeline transaction, so a DQ rollback also rolls it back.
+"""
+
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+from analytics.etl.upsert import swap_table
+
+logger = get_logger(__name__, "Daily_Rollup")
+
+DAILY_TABLE = "dw.Fact_Inventory_Daily"
+FACT_TABLE = "dw.Fact_Inventory_Transactions"
+
+GRAIN = ("ProductKey", "LocationKey", "UserKey", "DateKey")
+MEASURES = ("TotalQuantityConsumed", "TransactionCount", "ReplenishmentCount", "NetStockChange")
+
+
+def ensure_daily_table(duck_conn):
+    """Creates dw.Fact_Inventory_Daily on warehouses initialized before it existed."""
+    duck_conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DAILY_TABLE} (
+            ProductKey INT NOT NULL,
+            LocationKey INT NOT NULL,
+            UserKey INT NOT NULL,
+            DateKey INT NOT NULL,
+            TotalQuantityConsumed DECIMAL(18,2) NOT NULL,
+            TransactionCount BIGINT NOT NULL,
+            ReplenishmentCount BIGINT NOT NULL,
+            NetStockChange DECIMAL(18,2) NOT NULL,
+            PRIMARY KEY (ProductKey, LocationKey, UserKey, DateKey)
+        );
+    """)
+
+
+def _rollup(where: str = "") -> str:
+    """The metrics of dw.v_inventory_metrics_base, over the fact rows matching `where`."""
+    return f"""
+        SELECT
+            {", ".join(GRAIN)},
+            ABS(SUM(CASE WHEN QuantityDelta < 0 THEN QuantityDelta ELSE 0 END)) AS TotalQuantityConsumed,
+            COUNT(CASE WHEN QuantityDelta < 0 THEN 1 END) AS TransactionCount,
+            COUNT(CASE WHEN QuantityDelta > 0 THEN 1 END) AS ReplenishmentCount,
+            SUM(QuantityDelta) AS NetStockChange
+        FROM {FACT_TABLE}
+        {where}
+        GROUP BY {", ".join(GRAIN)}
+    """
+
+
+@timed_stage("Daily_Rollup.rebuild")
+def rebuild_daily_rollup(duck_conn) -> int:
+    """Recomputes dw.Fact_Inventory_Daily from the whole fact table. Returns the number of rows."""
+    ensure_daily_table(duck_conn)
+    rows = swap_table(duck_conn, DAILY_TABLE, _rollup())
+    annotate(rows_out=rows)
+    logger.info(f"✅ {DAILY_TABLE} rebuilt: {rows} daily rows.")
+    return rows
+
+
+@timed_stage("Daily_Rollup.refresh")
+def refresh_daily_rollup(duck_conn, delta_view: str, full: bool = False) -> int:
+    """
+    Re-aggregates the days touched by the run's staged fact rows.
+
+    Args:
+        delta_view: This run's staged fact rows (fact_inventory.DELTA_VIEW). Re-read rows only
+            cause their day to be recomputed to the same values.
+        full: Rebuild from the whole fact table instead. Also done when the table is empty
+            (warehouses loaded before it existed).
+
+    Returns:
+        Number of daily rows inserted or rewritten.
+    """
+    ensure_daily_table(duck_conn)
+    if full or not duck_conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {DAILY_TABLE} LIMIT 1)").fetchone()[0]:
+        return rebuild_daily_rollup(duck_conn)
+
+    first_key, last_key, days = duck_conn.execute(
+        f"SELECT MIN(DateKey), MAX(DateKey), COUNT(DISTINCT DateKey) FROM {delta_view}"
+    ).fetchone()
+    if not days:
+        return 0
+
+    # The inline BETWEEN lets the fact scan skip row groups outside the touched range.
+    rows = duck_conn.execute(f"""
+        INSERT INTO {DAILY_TABLE}
+        {_rollup(f"WHERE DateKey BETWEEN {first_key} AND {last_key} AND DateKey IN (SELECT DateKey FROM {delta_view})")}
+        ON CONFLICT ({", ".join(GRAIN)}) DO UPDATE SET
+            {", ".join(f"{measure} = excluded.{measure}" for measure in MEASURES)};
+    """).fetchone()[0]
+    annotate(rows_out=rows)
+    logger.info(f"{DAILY_TABLE}: {rows} daily rows refreshed over {days} touched days.")
+    return rows
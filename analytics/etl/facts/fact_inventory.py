@@ -1,22 +1,123 @@
-import logging
+import os
+from datetime import datetime, timedelta
 import pandas as pd
-from analytics.data.connect_db import get_oltp_connection, get_warehouse_conn
+import pyarrow as pa
+import pyarrow.compute as pc
+from analytics.data.connect_db import get_warehouse_conn
+from analytics.etl.staging import iter_oltp_batches, stage_batches
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+from analytics.etl.upsert import upsert
+from analytics.etl.change_detection import ensure_change_tracking
+from analytics.etl.facts.surrogate_keys import FactKeyMaps, build_key_maps
+from analytics.etl.facts.current_stock import refresh_current_stock
+from analytics.etl.facts.daily_rollup import refresh_daily_rollup
+from analytics.etl.facts.cumulative_usage import refresh_cumulative_usage
 
 # --- Logging Setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - [Fact_Inventory] - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, "Fact_Inventory")
+
+# Watermark config: the fact extract only pulls StockEvents past the last loaded
+# StockEventID, plus a lookback window on EventDate for late-arriving events
+# (rows committed after a higher ID was already loaded). The NOT EXISTS in the
+# load step dedupes whatever the lookback re-reads.
+WATERMARK_SOURCE = "inventory.StockEvent"
+LOOKBACK_DAYS = int(os.getenv("LABHUB_FACT_LOOKBACK_DAYS", "3"))
+STAGING_TABLE = "tmp_fact_inventory"
 
 
 # 1.Extract
 # -------------------------
 
-def extract_fact_source_data():
+def ensure_watermark_table(duck_conn):
+    """Creates dw.etl_watermark on warehouses initialized before it existed."""
+    duck_conn.execute("""
+        CREATE TABLE IF NOT EXISTS dw.etl_watermark (
+            SourceName VARCHAR(64) PRIMARY KEY,
+            LastEventID BIGINT,
+            LastEventDate TIMESTAMP,
+            UpdatedAt TIMESTAMP NOT NULL
+        );
+    """)
+
+def get_watermark(duck_conn, quiet: bool = False):
+    """
+    Returns (LastEventID, LastEventDate) for the StockEvent source.
+    If no watermark was stored yet but the fact table already has rows,
+    the watermark is seeded from the loaded facts. Returns (None, None)
+    for an empty warehouse. quiet=True skips the seeding message, for callers
+    that are about to store the watermark rather than extract from it.
+    """
+    ensure_watermark_table(duck_conn)
+    row = duck_conn.execute(
+        "SELECT LastEventID, LastEventDate FROM dw.etl_watermark WHERE SourceName = ?",
+        [WATERMARK_SOURCE]
+    ).fetchone()
+    if row:
+        return row[0], row[1]
+
+    # Fact DateKeys only carry the day, so the seeded date is the start of that day.
+    row = duck_conn.execute("""
+        SELECT MAX(Fact_Inventory_Transactions.TransactionID), MAX(Dim_Date.FullDate)
+        FROM dw.Fact_Inventory_Transactions
+        JOIN dw.Dim_Date ON Fact_Inventory_Transactions.DateKey = Dim_Date.DateKey
+    """).fetchone()
+    if row[0] is None:
+        return None, None
+    if not quiet:
+        logger.info(f"No stored watermark. Seeded from loaded facts: ID {row[0]}, date {row[1]}.")
+    return row[0], pd.Timestamp(row[1]).to_pydatetime()
+
+def update_watermark(duck_conn, rejected: pa.Table | None = None):
+    """
+    Advances the watermark to the highest StockEventID / EventDate in the staged batch,
+    including the batch's quarantined events (they are retried from the rejects table).
+    Runs inside the pipeline transaction, so a DQ rollback also rolls the watermark back.
+    """
+    batch_id, batch_date = duck_conn.execute(
+        f"SELECT MAX(TransactionID), MAX(EventDate) FROM {STAGING_TABLE}"
+    ).fetchone()
+    if rejected is not None and rejected.num_rows:
+        rejected_id = pc.max(rejected["TransactionID"]).as_py()
+        rejected_date = pc.max(rejected["EventDate"]).as_py()
+        batch_id = rejected_id if batch_id is None else max(batch_id, rejected_id)
+        if rejected_date is not None:
+            batch_date = rejected_date if batch_date is None else max(pd.Timestamp(batch_date), pd.Timestamp(rejected_date))
+    if batch_id is None:
+        return
+    last_id, last_date = get_watermark(duck_conn, quiet=True)
+    batch_id = int(batch_id)
+    batch_date = pd.Timestamp(batch_date).to_pydatetime() if batch_date is not None else last_date
+
+    new_id = batch_id if last_id is None else max(last_id, batch_id)
+    new_date = batch_date if last_date is None else max(last_date, batch_date)
+
+    # UPDATE + INSERT rather than DELETE + INSERT: DuckDB rejects re-inserting a
+    # primary key deleted earlier in the same transaction.
+    duck_conn.execute(
+        "UPDATE dw.etl_watermark SET LastEventID = ?, LastEventDate = ?, UpdatedAt = ? WHERE SourceName = ?",
+        [new_id, new_date, datetime.now(), WATERMARK_SOURCE]
+    )
+    duck_conn.execute(
+        """
+        INSERT INTO dw.etl_watermark
+        SELECT ?, ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM dw.etl_watermark WHERE SourceName = ?)
+        """,
+        [WATERMARK_SOURCE, new_id, new_date, datetime.now(), WATERMARK_SOURCE]
+    )
+    logger.info(f"Watermark advanced to StockEventID {new_id}, EventDate {new_date}.")
+
+@timed_stage("Fact_Inventory.extract")
+def extract_fact_source_data(since_id=None, since_date=None, chunksize: int | None = None):
     """
     Pulls raw events and current item states from OLTP.
     Joins StockEvent with InventoryItem to resolve the ProductID.
+
+    Args:
+        since_id: Only events with a higher StockEventID are pulled. None pulls everything.
+        since_date: Events on/after this date are re-pulled as well (late-arriving lookback).
+        chunksize: If set, returns an iterator of Arrow record batches (streaming mode)
+            instead of one Arrow table.
     """
     logger.info("Extracting raw inventory events from OLTP...")
     query = """
@@ -24,7 +125,7 @@ def extract_fact_source_data():
             StockEvent.StockEventID AS TransactionID,
             InventoryItem.ProductID,
             StockEvent.LocationID,
-            StockEvent.[UserID],
+            StockEvent.UserID,
             StockEvent.EventDate,
             StockEvent.OldQuantity,
             StockEvent.NewQuantity,
@@ -33,84 +134,310 @@ def extract_fact_source_data():
         FROM inventory.StockEvent
         LEFT JOIN inventory.InventoryItem ON StockEvent.InventoryItemID = InventoryItem.InventoryItemID
     """
-    conn = get_oltp_connection()
+    params = None
+    if since_id is not None:
+        query += " WHERE StockEvent.StockEventID > ? OR StockEvent.EventDate >= ?"
+        params = [since_id, since_date]
+
+    if chunksize:
+        return iter_oltp_batches(query, params=params, chunksize=chunksize)
+
     try:
-        df = pd.read_sql(query, conn)
-        logger.info(f"Successfully extracted {len(df)} inventory events.")
-        return df
+        events = pa.Table.from_batches(list(iter_oltp_batches(query, params=params)))
+        logger.info(f"Successfully extracted {events.num_rows} inventory events.")
+        return events
     except Exception as e:
         logger.error(f"Failed to extract fact data: {e}")
         raise
-    finally:
-        conn.close()
 
 #3. Load
-def load_fact_inventory(duck_conn, df_fact_inventory: pd.DataFrame):
+FACT_COLUMNS = [
+    "DateKey", "ProductKey", "LocationKey", "UserKey",
+    "QuantityDelta", "AbsoluteQuantity", "CurrentStockSnapshot", "EventType",
+]
+
+REJECTS_TABLE = "dw.Fact_Inventory_Rejects"
+RETRY_TABLE = "tmp_fact_retry"
+
+# Quarantined events older than this many days are no longer retried by incremental runs
+# (0 retries them all); --full-reload retries every reject.
+REJECT_RETRY_DAYS = int(os.getenv("LABHUB_REJECT_RETRY_DAYS", "30"))
+
+# TEMP view over the fact rows staged by the current run: new events, lookback re-reads and
+# resolved rejects. It outlives the COMMIT on the pipeline connection, so follow-up steps
+# (Current_Stock, the daily rollup and usage series, Parquet export) can work on the run's delta only. Re-read rows may already have been
+# loaded before, so consumers must treat it as "possibly touched", not "new".
+DELTA_VIEW = "tmp_fact_delta"
+
+# TEMP table of the TransactionIDs this run inserted (new events and resolved rejects),
+# recorded by an anti-join just before each insert, and the DELTA_VIEW rows among them:
+# the rows that are new, as opposed to possibly touched.
+INSERTED_TABLE = "tmp_fact_inserted"
+NEW_ROWS_VIEW = "tmp_fact_new"
+
+# Source event columns kept with a rejected event, in extract order
+EVENT_COLUMNS = [
+    "TransactionID", "ProductID", "LocationID", "UserID", "EventDate",
+    "OldQuantity", "NewQuantity", "EventType", "CurrentStockSnapshot",
+]
+
+
+def fact_source(staging_table: str = STAGING_TABLE) -> str:
+    """Staged events (keys already attached) shaped as fact rows, as a subquery for upsert()."""
+    return f"""(
+    SELECT
+        TransactionID,
+        DateKey,
+        ProductKey,
+        LocationKey,
+        UserKey,
+        (NewQuantity - OldQuantity) AS QuantityDelta,
+        NewQuantity AS AbsoluteQuantity,
+        CurrentStockSnapshot,
+        EventType
+    FROM {staging_table}
+)"""
+
+
+def ensure_rejects_table(duck_conn):
+    """Creates dw.Fact_Inventory_Rejects (and its retry columns) on warehouses initialized before they existed."""
+    duck_conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {REJECTS_TABLE} (
+            TransactionID BIGINT NOT NULL,
+            ProductID INT,
+            LocationID INT,
+            UserID INT,
+            EventDate TIMESTAMP,
+            OldQuantity DECIMAL(12,2),
+            NewQuantity DECIMAL(12,2),
+            EventType VARCHAR(32),
+            CurrentStockSnapshot DECIMAL(12,2),
+            RejectReason VARCHAR(128) NOT NULL,
+            RejectedAt TIMESTAMP NOT NULL
+        );
+    """)
+    duck_conn.execute(f"ALTER TABLE {REJECTS_TABLE} ADD COLUMN IF NOT EXISTS RetryCount INTEGER DEFAULT 0;")
+    duck_conn.execute(f"ALTER TABLE {REJECTS_TABLE} ADD COLUMN IF NOT EXISTS LastRetriedAt TIMESTAMP;")
+
+
+def quarantine_rejected(duck_conn, rejected: pa.Table | None) -> int:
     """
-    Performs dimension lookups and incrementally inserts only new rows
-    into Fact_Inventory_Transactions, skipping any TransactionID that
-    already exists.
+    Bulk-inserts events rejected while staging (see FactKeyMaps.attach) into
+    dw.Fact_Inventory_Rejects. Events already quarantined or already in the fact table
+    (re-read by the lookback window) are not added again.
     """
-    logger.info("Performing incremental load into Fact_Inventory_Transactions...")
-    # Count existing rows before insert for accurate delta reporting
-    
-    before_count = duck_conn.execute(
-        "SELECT COUNT(*) FROM dw.Fact_Inventory_Transactions"
-    ).fetchone()[0]
+    if rejected is None or not rejected.num_rows:
+        return 0
+    duck_conn.register("tmp_rejected_batch", rejected)
+    try:
+        return duck_conn.execute(f"""
+            INSERT INTO {REJECTS_TABLE} ({", ".join(EVENT_COLUMNS)}, RejectReason, RejectedAt)
+            SELECT {", ".join(f"s.{col}" for col in EVENT_COLUMNS)}, s.RejectReason, current_timestamp
+            FROM tmp_rejected_batch s
+            ANTI JOIN {REJECTS_TABLE} r ON s.TransactionID = r.TransactionID
+            ANTI JOIN dw.Fact_Inventory_Transactions f ON s.TransactionID = f.TransactionID;
+        """).fetchone()[0]
+    finally:
+        duck_conn.unregister("tmp_rejected_batch")
 
-    duck_conn.register("tmp_fact_inventory", df_fact_inventory)
 
-    duck_conn.execute("""
-        INSERT INTO dw.Fact_Inventory_Transactions (
-                TransactionID, DateKey, ProductKey, LocationKey, UserKey,
-                QuantityDelta, AbsoluteQuantity, CurrentStockSnapshot, EventType
-        )
-        SELECT 
-            tmp_fact_inventory.TransactionID,
-            Dim_Date.DateKey,
-            Dim_Product.ProductKey,
-            Dim_Location.LocationKey,
-            Dim_User.UserKey,
-            (tmp_fact_inventory.NewQuantity - tmp_fact_inventory.OldQuantity) AS QuantityDelta,
-            tmp_fact_inventory.NewQuantity AS AbsoluteQuantity,
-            tmp_fact_inventory.CurrentStockSnapshot,
-            tmp_fact_inventory.EventType
-        FROM tmp_fact_inventory            
-        JOIN dw.Dim_Date ON CAST(strftime(tmp_fact_inventory.EventDate, '%Y%m%d') AS INT) = dw.Dim_Date.DateKey
-        JOIN dw.Dim_Product ON tmp_fact_inventory.ProductID = dw.Dim_Product.ProductID
-        JOIN dw.Dim_Location ON tmp_fact_inventory.LocationID = dw.Dim_Location.LocationID
-        JOIN dw.Dim_User ON tmp_fact_inventory.UserID = dw.Dim_User.UserID
-        WHERE NOT EXISTS (
-            SELECT 1
-            FROM dw.Fact_Inventory_Transactions
-            WHERE dw.Fact_Inventory_Transactions.TransactionID = tmp_fact_inventory.TransactionID
-        );
+def has_facts(duck_conn) -> bool:
+    """True if the fact table holds any row."""
+    return bool(duck_conn.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM dw.Fact_Inventory_Transactions LIMIT 1)"
+    ).fetchone()[0])
+
+
+def reset_inserted(duck_conn):
+    """Empties INSERTED_TABLE at the start of a run."""
+    duck_conn.execute(f"CREATE OR REPLACE TEMP TABLE {INSERTED_TABLE} (TransactionID BIGINT);")
+
+
+def record_inserted(duck_conn, source: str):
+    """Adds the TransactionIDs of `source` not yet in the fact table to INSERTED_TABLE. Call it right before inserting `source`."""
+    duck_conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {INSERTED_TABLE} (TransactionID BIGINT);")
+    duck_conn.execute(f"""
+        INSERT INTO {INSERTED_TABLE}
+        SELECT s.TransactionID FROM {source} s
+        ANTI JOIN dw.Fact_Inventory_Transactions t ON s.TransactionID = t.TransactionID;
     """)
-    after_count = duck_conn.execute(
-        "SELECT COUNT(*) FROM dw.Fact_Inventory_Transactions"
-    ).fetchone()[0]
 
-    new_rows = after_count - before_count
+
+def publish_fact_delta(duck_conn, staged: bool, retried: bool):
+    """
+    (Re)creates DELTA_VIEW over this run's staged and retried fact rows (empty if neither),
+    and NEW_ROWS_VIEW over those of them this run inserted.
+    """
+    parts = [f"SELECT * FROM {fact_source(table)}" for table, used in ((STAGING_TABLE, staged), (RETRY_TABLE, retried)) if used]
+    query = " UNION ALL ".join(parts) or "SELECT * FROM dw.Fact_Inventory_Transactions LIMIT 0"
+    duck_conn.execute(f"CREATE OR REPLACE TEMP VIEW {DELTA_VIEW} AS {query};")
+    duck_conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {INSERTED_TABLE} (TransactionID BIGINT);")
+    duck_conn.execute(f"""
+        CREATE OR REPLACE TEMP VIEW {NEW_ROWS_VIEW} AS
+        SELECT * FROM {DELTA_VIEW} WHERE TransactionID IN (SELECT TransactionID FROM {INSERTED_TABLE});
+    """)
+
+
+def _retry_candidates(duck_conn, max_age_days: int) -> pa.Table:
+    """
+    Quarantined events that may resolve now: their product, location and user IDs and their
+    event day all exist in the dimensions (a necessary condition for FactKeyMaps.resolve),
+    and, with max_age_days, they were rejected in the last max_age_days days.
+    """
+    age_filter = f"AND r.RejectedAt >= current_timestamp - INTERVAL {int(max_age_days)} DAYS" if max_age_days else ""
+    return duck_conn.execute(f"""
+        SELECT {", ".join(f"r.{col}" for col in EVENT_COLUMNS)}
+        FROM {REJECTS_TABLE} r
+        SEMI JOIN dw.Dim_Product p ON p.ProductID = r.ProductID
+        SEMI JOIN dw.Dim_Location l ON l.LocationID = r.LocationID
+        SEMI JOIN dw.Dim_User u ON u.UserID = r.UserID
+        SEMI JOIN dw.Dim_Date d ON d.FullDate = CAST(r.EventDate AS DATE)
+        WHERE TRUE {age_filter};
+    """).arrow()
+
+
+@timed_stage("Fact_Inventory.retry_rejects")
+def retry_rejects(duck_conn, key_maps: FactKeyMaps, max_age_days: int = REJECT_RETRY_DAYS) -> int:
+    """
+    Re-resolves the quarantined events against the current dimensions. Events whose missing
+    dimension row has arrived are loaded into the fact table and leave the rejects table; the
+    other candidates get their RetryCount bumped and their reason refreshed.
+    Only candidates are read (see _retry_candidates): events still missing a dimension row,
+    or older than max_age_days (0 for no limit), stay in the rejects table untouched.
+    """
+    ensure_rejects_table(duck_conn)
+    pending = _retry_candidates(duck_conn, max_age_days)
+    if not pending.num_rows:
+        return 0
+    resolved, still_rejected = key_maps.resolve(pending)
+
+    if resolved.num_rows:
+        stage_batches(duck_conn, RETRY_TABLE, [resolved])
+        record_inserted(duck_conn, fact_source(RETRY_TABLE))
+        upsert(duck_conn, "dw.Fact_Inventory_Transactions", fact_source(RETRY_TABLE), keys=["TransactionID"], columns=FACT_COLUMNS)
+        duck_conn.execute(f"DELETE FROM {REJECTS_TABLE} WHERE TransactionID IN (SELECT TransactionID FROM {RETRY_TABLE});")
+    if still_rejected.num_rows:
+        duck_conn.register("tmp_rejected_batch", still_rejected.select(["TransactionID", "RejectReason"]))
+        try:
+            duck_conn.execute(f"""
+                UPDATE {REJECTS_TABLE}
+                SET RejectReason = s.RejectReason,
+                    RetryCount = COALESCE(RetryCount, 0) + 1,
+                    LastRetriedAt = current_timestamp
+                FROM tmp_rejected_batch s
+                WHERE {REJECTS_TABLE}.TransactionID = s.TransactionID;
+            """)
+        finally:
+            duck_conn.unregister("tmp_rejected_batch")
+
+    annotate(rows_in=pending.num_rows, rows_out=resolved.num_rows)
+    if resolved.num_rows:
+        logger.info(f"♻️ {resolved.num_rows} quarantined events resolved and loaded; {still_rejected.num_rows} still pending.")
+    return resolved.num_rows
+
+
+@timed_stage("Fact_Inventory.load")
+def load_fact_inventory(
+    duck_conn,
+    fact_events: pa.Table | None = None,
+    key_maps: FactKeyMaps | None = None,
+    rejected: pa.Table | None = None,
+):
+    """
+    Incrementally inserts only new rows into Fact_Inventory_Transactions, skipping any
+    TransactionID that already exists, and quarantines the events rejected while staging
+    in dw.Fact_Inventory_Rejects.
+    Reads from the tmp_fact_inventory staging table, which only holds events whose surrogate
+    keys resolved (attached while staging); `rejected` holds the others. If fact_events is
+    given it is staged first, through key_maps or maps built here.
+    """
+    logger.info("Performing incremental load into Fact_Inventory_Transactions...")
+    if fact_events is not None:
+        key_maps = key_maps or build_key_maps(duck_conn)
+        stage_batches(duck_conn, STAGING_TABLE, [fact_events], transform=key_maps.attach)
+        rejected = key_maps.take_rejected()
+    source_rows = duck_conn.execute(f"SELECT COUNT(*) FROM {STAGING_TABLE}").fetchone()[0]
+
+    ensure_rejects_table(duck_conn)
+    quarantined = quarantine_rejected(duck_conn, rejected)
+    if quarantined:
+        logger.warning(f"⚠️ {quarantined} events with unresolved keys quarantined in {REJECTS_TABLE}.")
+
+    # Insert-only: TransactionIDs already in the fact table are skipped by one anti-join
+    record_inserted(duck_conn, fact_source())
+    counts = upsert(duck_conn, "dw.Fact_Inventory_Transactions", fact_source(), keys=["TransactionID"], columns=FACT_COLUMNS)
+    counts["rejected"] = rejected.num_rows if rejected is not None else 0
+    new_rows = counts["inserted"]
+    annotate(rows_in=source_rows + counts["rejected"], rows_out=new_rows)
     logger.info(
         f"✅ Incremental load complete. "
-        f"{new_rows} new rows inserted out of {len(df_fact_inventory)} source events."
+        f"{new_rows} new rows inserted out of {source_rows + counts['rejected']} source events."
     )
+    return counts
 
 # -------------------------
 # Orchestration
 # -------------------------
 
-def run_fact_inventory_etl(duck_conn):
+@timed_stage("Fact_Inventory")
+def run_fact_inventory_etl(
+    duck_conn,
+    full_reload: bool = False,
+    lookback_days: int = LOOKBACK_DAYS,
+    chunksize: int | None = None,
+):
     """
     Orchestrates the Fact Inventory ETL.
     Accepts a shared connection — does NOT open its own or manage transactions.
+
+    Args:
+        full_reload: If True, ignores the watermark and re-extracts the full StockEvent history.
+        lookback_days: Days before the watermark's EventDate to re-read for late-arriving events.
+        chunksize: If set, streams the extract in chunks of this size into the staging table,
+            keeping peak memory flat regardless of the number of events.
+
+    Returns:
+        Number of fact rows inserted (new events plus resolved rejects).
     """
     try:
-        df_source = extract_fact_source_data()
-        if not df_source.empty:
-            load_fact_inventory(duck_conn, df_source)
+        ensure_change_tracking(duck_conn)  # lookups need the SCD2 columns on older warehouses
+        since_id, since_date = (None, None) if full_reload else get_watermark(duck_conn)
+        if since_id is not None:
+            since_date = since_date - timedelta(days=lookback_days)
+            logger.info(f"Incremental extract: StockEventID > {since_id} or EventDate >= {since_date}.")
+        else:
+            logger.info("Full extract: no watermark in use.")
+
+        # Surrogate keys are attached to each chunk as it is staged (see surrogate_keys.py);
+        # events that do not resolve are held back by key_maps instead of being staged.
+        key_maps = build_key_maps(duck_conn)
+        reset_inserted(duck_conn)
+        retried = retry_rejects(duck_conn, key_maps, max_age_days=0 if full_reload else REJECT_RETRY_DAYS)
+        if chunksize:
+            staged = stage_batches(
+                duck_conn, STAGING_TABLE, extract_fact_source_data(since_id, since_date, chunksize),
+                transform=key_maps.attach,
+            )
+        else:
+            source_events = extract_fact_source_data(since_id, since_date)
+            staged = stage_batches(
+                duck_conn, STAGING_TABLE, [source_events], transform=key_maps.attach
+            ) if source_events.num_rows else 0
+
+        rejected = key_maps.take_rejected()
+        inserted = 0
+        if staged or rejected is not None:
+            inserted = load_fact_inventory(duck_conn, rejected=rejected)["inserted"]
+            update_watermark(duck_conn, rejected)
+        elif since_id is not None:
+            logger.info("No new events since the watermark.")
         else:
             logger.warning("No source data found to load into Fact table.")
+        publish_fact_delta(duck_conn, staged=bool(staged), retried=bool(retried))
+        refresh_current_stock(duck_conn, DELTA_VIEW, full=full_reload)
+        refresh_daily_rollup(duck_conn, DELTA_VIEW, full=full_reload)
+        refresh_cumulative_usage(duck_conn, DELTA_VIEW, full=full_reload)  # reads the daily rollup
+        return inserted + retried
     except Exception as e:
         logger.error(f"Fact Inventory ETL aborted: {e}")
         raise
@@ -0,0 +1,163 @@
+"""
+Hive-partitioned Parquet copy of dw.Fact_Inventory_Transactions.
+
+With LABHUB_FACT_STORAGE=parquet the pipeline mirrors the fact table after each commit into
+
+    FACT_PARQUET_DIR/Year=2025/Month=7/data_0.parquet
+
+(Year/Month derived from DateKey), one file per month sorted by ProductKey, LocationKey,
+DateKey. The analytics views then read the fact through dw.Fact_Inventory_Parquet
+(read_parquet with hive_partitioning), so DuckDB skips whole months on Year/Month filters and
+row groups on their DateKey / ProductKey / LocationKey min/max statistics.
+
+The DuckDB table stays the system of record: loads, dedupe and DQ run against it. After an
+incremental load only the months that received new rows are rewritten.
+"""
+
+import os
+import shutil
+from pathlib import Path
+
+from analytics.data.connect_db import PROJECT_ROOT
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+
+logger = get_logger(__name__, "Fact_Parquet")
+
+# "duckdb" (default): the views read dw.Fact_Inventory_Transactions. "parquet": the fact is
+# also exported to FACT_PARQUET_DIR and the views read the Parquet copy.
+FACT_STORAGE = os.getenv("LABHUB_FACT_STORAGE", "duckdb").lower()
+FACT_PARQUET_DIR = Path(os.getenv("LABHUB_FACT_PARQUET_DIR", PROJECT_ROOT / "warehouse" / "fact_inventory"))
+
+FACT_TABLE = "dw.Fact_Inventory_Transactions"
+PARQUET_VIEW = "dw.Fact_Inventory_Parquet"
+
+# Smaller row groups give the min/max statistics a finer grain to skip on.
+ROW_GROUP_ROWS = 65_536
+SORT_ORDER = "ProductKey, LocationKey, DateKey, TransactionID"
+
+
+def parquet_enabled() -> bool:
+    return FACT_STORAGE == "parquet"
+
+
+def _partition_dir(root: Path, year: int, month: int) -> Path:
+    return root / f"Year={year}" / f"Month={month}"
+
+
+def _exported_files(root: Path = None) -> list:
+    root = Path(root or FACT_PARQUET_DIR)
+    return sorted(root.glob("Year=*/Month=*/*.parquet")) if root.exists() else []
+
+
+def _write_month(duck_conn, root: Path, staging: Path, year: int, month: int) -> int:
+    """Writes one month to the staging area, then swaps it in with a single rename."""
+    staged_file = _partition_dir(staging, year, month) / "data_0.parquet"
+    staged_file.parent.mkdir(parents=True, exist_ok=True)
+    first_key, last_key = year * 10000 + month * 100, year * 10000 + month * 100 + 99
+    rows = duck_conn.execute(f"""
+        COPY (
+            SELECT * FROM {FACT_TABLE}
+            WHERE DateKey BETWEEN {first_key} AND {last_key}
+            ORDER BY {SORT_ORDER}
+        ) TO '{staged_file.as_posix()}' (FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {ROW_GROUP_ROWS});
+    """).fetchone()[0]
+    target = _partition_dir(root, year, month)
+    target.mkdir(parents=True, exist_ok=True)
+    os.replace(staged_file, target / staged_file.name)
+    return rows
+
+
+@timed_stage("Fact_Inventory.parquet")
+def export_fact_parquet(duck_conn, months=None, root=None) -> dict:
+    """
+    Rewrites the Parquet partitions of the given months from the DuckDB fact table.
+
+    Args:
+        duck_conn: Warehouse connection; run after COMMIT, the files are not transactional.
+        months: Iterable of (year, month) to rewrite. None exports every month in the table
+            and removes partitions whose month no longer has rows.
+        root: Target directory (FACT_PARQUET_DIR by default).
+
+    Returns:
+        {"months": n, "rows": n}
+    """
+    root = Path(root or FACT_PARQUET_DIR)
+    full = months is None
+    if full:
+        months = duck_conn.execute(
+            f"SELECT DISTINCT DateKey // 10000, DateKey // 100 % 100 FROM {FACT_TABLE} ORDER BY 1, 2"
+        ).fetchall()
+    months = sorted(set(months))
+
+    staging = root.parent / f".{root.name}.staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    rows = 0
+    try:
+        for year, month in months:
+            rows += _write_month(duck_conn, root, staging, int(year), int(month))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    if full:
+        keep = {_partition_dir(root, int(year), int(month)) for year, month in months}
+        for stale in {path.parent for path in _exported_files(root)} - keep:
+            shutil.rmtree(stale)
+
+    annotate(rows_out=rows)
+    logger.info(f"✅ Exported {rows} fact rows in {len(months)} monthly partitions to {root}.")
+    return {"months": len(months), "rows": rows}
+
+
+def refresh_fact_parquet(duck_conn, delta_view: str, new_rows: int, full: bool = False) -> dict | None:
+    """
+    Brings the Parquet copy up to date after a committed load. Only the months of the rows in
+    `delta_view` (the run's staged facts) are rewritten, and nothing when the run inserted no
+    rows, unless full=True or nothing was exported yet.
+    Returns None when LABHUB_FACT_STORAGE is not "parquet".
+    """
+    if not parquet_enabled():
+        return None
+    if full or not _exported_files():
+        return export_fact_parquet(duck_conn)
+    if not new_rows:
+        logger.info("No new fact rows; Parquet partitions unchanged.")
+        return {"months": 0, "rows": 0}
+    months = duck_conn.execute(
+        f"SELECT DISTINCT DateKey // 10000, DateKey // 100 % 100 FROM {delta_view}"
+    ).fetchall()
+    return export_fact_parquet(duck_conn, months)
+
+
+def fact_relation() -> str:
+    """
+    FROM clause the analytics views read the fact through. In Parquet mode this is
+    dw.Fact_Inventory_Parquet (see parquet_view_definition) aliased as Fact_Inventory_Transactions,
+    so the view SQL is the same in both modes. Falls back to the table if nothing was exported yet.
+    """
+    if not parquet_enabled():
+        return FACT_TABLE
+    if not _exported_files():
+        logger.warning(f"No Parquet fact files in {FACT_PARQUET_DIR}; views read {FACT_TABLE}.")
+        return FACT_TABLE
+    return f"{PARQUET_VIEW} AS Fact_Inventory_Transactions"
+
+
+def parquet_view_definition() -> str:
+    """CREATE statement of dw.Fact_Inventory_Parquet over the exported files (the glob is resolved per query)."""
+    pattern = (FACT_PARQUET_DIR / "Year=*" / "Month=*" / "*.parquet").as_posix()
+    return f"""
+        CREATE OR REPLACE VIEW {PARQUET_VIEW} AS
+        SELECT * FROM read_parquet(
+            '{pattern}', hive_partitioning = true, hive_types = {{'Year': INTEGER, 'Month': INTEGER}}
+        );
+    """
+
+
+def month_filter(relation: str, min_date_key: str) -> str:
+    """
+    Extra predicate for a DateKey >= min_date_key filter that lets DuckDB prune whole Year/Month
+    partitions (hive columns only exist on the Parquet view). Empty for the DuckDB table.
+    """
+    if not relation.startswith(PARQUET_VIEW):
+        return ""
+    return f"AND Year * 100 + Month >= ({min_date_key}) // 100"
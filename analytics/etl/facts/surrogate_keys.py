@@ -0,0 +1,209 @@
+"""
+In-memory natural -> surrogate key maps for the fact load.
+
+The fact load used to resolve its keys by joining every staged event against Dim_Date,
+Dim_Product, Dim_Location and Dim_User, computing strftime(EventDate, '%Y%m%d') per row on
+the way. The dimensions are small, so their keys are now read once per run into numpy arrays
+and attached to each staged chunk before it reaches DuckDB:
+
+    - Type 1 dimensions: an array indexed by the natural ID when the IDs are dense, otherwise
+      a sorted ID array probed with np.searchsorted.
+    - Type 2 dimensions (LABHUB_SCD2_DIMENSIONS): versions sorted by (ID, EffectiveFrom); each
+      event gets the latest version not after its EventDate, like the ASOF join it replaces.
+    - DateKey: YYYYMMDD from integer arithmetic on the event's day number, checked against the
+      days present in Dim_Date.
+
+Events whose keys do not resolve are split off in the same pass, with a reason code, so the
+load can quarantine them instead of losing them in an inner join.
+"""
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from analytics.etl.instrumentation import annotate, get_logger, timed_stage
+from analytics.etl.upsert import EFFECTIVE_FROM, IS_CURRENT, SCD2_DIMENSIONS
+
+logger = get_logger(__name__, "Surrogate_Keys")
+
+# (dimension, natural key, surrogate key) resolved for each staged event
+FACT_LOOKUPS = (
+    ("Dim_Product", "ProductID", "ProductKey"),
+    ("Dim_Location", "LocationID", "LocationKey"),
+    ("Dim_User", "UserID", "UserKey"),
+)
+
+# Reason codes recorded in dw.Fact_Inventory_Rejects, per surrogate key that did not resolve
+REJECT_REASONS = (
+    ("DateKey", "MISSING_DATE"),
+    ("ProductKey", "MISSING_PRODUCT"),
+    ("LocationKey", "MISSING_LOCATION"),
+    ("UserKey", "MISSING_USER"),
+)
+
+# A direct-index array is used while max ID <= DENSE_FACTOR * number of IDs (+ DENSE_SLACK).
+DENSE_FACTOR = 4
+DENSE_SLACK = 1024
+
+MISSING = -1
+_US_PER_DAY = 86_400_000_000
+
+
+def _int_column(table: pa.Table, name: str) -> np.ndarray:
+    """A column as int64 numpy, with NULLs as MISSING."""
+    return pc.fill_null(table[name].cast(pa.int64()), MISSING).to_numpy()
+
+
+def _event_micros(table: pa.Table) -> np.ndarray:
+    """EventDate as microseconds since the epoch (NULL -> int64 min, before every version)."""
+    micros = pc.cast(table["EventDate"].cast(pa.timestamp("us")), pa.int64())
+    return pc.fill_null(micros, np.iinfo(np.int64).min).to_numpy()
+
+
+class KeyMap:
+    """Natural ID -> surrogate key for one dimension (current rows, or all versions for SCD2)."""
+
+    def __init__(self, dimension: str, ids: np.ndarray, keys: np.ndarray, valid_from: np.ndarray | None = None):
+        self.dimension = dimension
+        self.versioned = valid_from is not None
+        self.size = len(ids)
+        self.dense = None
+        if self.versioned:
+            self._build_versioned(ids, keys, valid_from)
+        elif self.size and ids.min() >= 0 and ids.max() <= DENSE_FACTOR * self.size + DENSE_SLACK:
+            self.dense = np.full(ids.max() + 1, MISSING, dtype=np.int64)
+            self.dense[ids] = keys
+        else:
+            order = np.argsort(ids, kind="stable")
+            self.ids, self.keys = ids[order], keys[order]
+
+    def _build_versioned(self, ids, keys, valid_from):
+        # EffectiveFrom values are ranked, so (ID, rank) packs into one sortable int64.
+        self.starts = np.unique(valid_from)
+        self.base = ids.min() if self.size else 0
+        composite = (ids - self.base) * len(self.starts) + np.searchsorted(self.starts, valid_from)
+        order = np.argsort(composite, kind="stable")
+        self.composite, self.ids, self.keys = composite[order], ids[order], keys[order]
+
+    def lookup(self, ids: np.ndarray, at: np.ndarray | None = None) -> np.ndarray:
+        """Surrogate keys for `ids` (MISSING where unresolved); `at` is the event time for SCD2 maps."""
+        if not self.size:
+            return np.full(len(ids), MISSING, dtype=np.int64)
+        if self.dense is not None:
+            found = (ids >= 0) & (ids < len(self.dense))
+            return np.where(found, self.dense[np.where(found, ids, 0)], MISSING)
+        if self.versioned:
+            # Latest EffectiveFrom <= event time, then the latest version of the same ID up to it.
+            rank = np.searchsorted(self.starts, at, side="right") - 1
+            probe = (ids - self.base) * len(self.starts) + rank
+            pos = np.searchsorted(self.composite, probe, side="right") - 1
+            found = (pos >= 0) & (ids != MISSING)
+            pos = np.where(found, pos, 0)
+            found &= self.ids[pos] == ids
+            return np.where(found, self.keys[pos], MISSING)
+        pos = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return np.where(self.ids[pos] == ids, self.keys[pos], MISSING)
+
+
+class FactKeyMaps:
+    """All surrogate key maps of the fact load, built once per run from the warehouse."""
+
+    def __init__(self, duck_conn):
+        self.maps = {}
+        self.rejected = []
+        for dimension, natural_key, surrogate_key in FACT_LOOKUPS:
+            if dimension in SCD2_DIMENSIONS:
+                rows = duck_conn.execute(
+                    f"SELECT {natural_key}, {surrogate_key}, epoch_us({EFFECTIVE_FROM}) FROM dw.{dimension}"
+                ).fetchnumpy()
+                ids, keys, valid_from = (np.asarray(values, dtype=np.int64) for values in rows.values())
+                self.maps[surrogate_key] = KeyMap(dimension, ids, keys, valid_from)
+            else:
+                rows = duck_conn.execute(
+                    f"SELECT {natural_key}, {surrogate_key} FROM dw.{dimension} WHERE {IS_CURRENT}"
+                ).fetchnumpy()
+                ids, keys = (np.asarray(values, dtype=np.int64) for values in rows.values())
+                self.maps[surrogate_key] = KeyMap(dimension, ids, keys)
+
+        # Days (since the epoch) present in Dim_Date, as a flag array offset by the first day.
+        days = np.asarray(duck_conn.execute(
+            "SELECT datediff('day', DATE '1970-01-01', FullDate) AS Day FROM dw.Dim_Date"
+        ).fetchnumpy()["Day"], dtype=np.int64)
+        self.first_day = int(days.min()) if len(days) else 0
+        self.known_days = np.zeros(int(days.max()) - self.first_day + 1 if len(days) else 0, dtype=bool)
+        self.known_days[days - self.first_day] = True
+
+    def date_keys(self, micros: np.ndarray) -> np.ndarray:
+        """YYYYMMDD keys for event times in microseconds (MISSING for days not in Dim_Date)."""
+        days = np.floor_divide(micros, _US_PER_DAY)
+        dates = days.astype("datetime64[D]")
+        months = dates.astype("datetime64[M]")
+        year = months.astype(np.int64) // 12 + 1970
+        month = months.astype(np.int64) % 12 + 1
+        day = (dates - months).astype(np.int64) + 1
+        offset = days - self.first_day
+        found = (offset >= 0) & (offset < len(self.known_days))
+        found[found] = self.known_days[offset[found]]
+        return np.where(found, year * 10000 + month * 100 + day, MISSING)
+
+    def resolve(self, events: pa.Table) -> tuple[pa.Table, pa.Table]:
+        """
+        Splits events into (resolved, rejected) in one vectorized pass. Resolved rows get
+        DateKey and the dimension surrogate keys appended; rejected rows get a RejectReason
+        listing the keys that did not resolve, e.g. "MISSING_PRODUCT,MISSING_USER".
+        """
+        micros = _event_micros(events)
+        resolved = {"DateKey": self.date_keys(micros)}
+        for dimension, natural_key, surrogate_key in FACT_LOOKUPS:
+            resolved[surrogate_key] = self.maps[surrogate_key].lookup(_int_column(events, natural_key), micros)
+
+        missing = {name: keys == MISSING for name, keys in resolved.items()}
+        rejected = np.logical_or.reduce(list(missing.values()))
+        if not rejected.any():
+            for name, keys in resolved.items():
+                events = events.append_column(name, pa.array(keys.astype(np.int32)))
+            return events, events.schema.empty_table()
+
+        keep = pa.array(~rejected)
+        accepted = events.filter(keep)
+        for name, keys in resolved.items():
+            accepted = accepted.append_column(name, pa.array(keys[~rejected].astype(np.int32)))
+
+        codes = [
+            pa.array(np.where(missing[name][rejected], code, None), type=pa.string())
+            for name, code in REJECT_REASONS
+        ]
+        reason = pc.binary_join_element_wise(*codes, ",", null_handling="skip")
+        return accepted, events.filter(pa.array(rejected)).append_column("RejectReason", reason)
+
+    @timed_stage("Fact_Inventory.keys")
+    def attach(self, events: pa.Table) -> pa.Table:
+        """
+        stage_batches() transform: returns the chunk's resolved events with their keys and
+        holds back the rejected ones for take_rejected(), so nothing is re-scanned to find them.
+        """
+        accepted, rejected = self.resolve(events)
+        if rejected.num_rows:
+            self.rejected.append(rejected)
+        annotate(rows_in=events.num_rows, rows_out=accepted.num_rows)
+        return accepted
+
+    def take_rejected(self) -> pa.Table | None:
+        """Events rejected by attach() since the last call, as one table (None if there were none)."""
+        rejected, self.rejected = self.rejected, []
+        return pa.concat_tables(rejected) if rejected else None
+
+    def summary(self) -> dict:
+        """Map sizes and kinds, for the log."""
+        return {
+            map_.dimension: f"{map_.size} {'versions' if map_.versioned else 'dense' if map_.dense is not None else 'sorted'}"
+            for map_ in self.maps.values()
+        }
+
+
+@timed_stage("Fact_Inventory.key_maps")
+def build_key_maps(duck_conn) -> FactKeyMaps:
+    """Reads the dimension keys into memory; call after the dimensions are loaded."""
+    key_maps = FactKeyMaps(duck_conn)
+    logger.info(f"Surrogate key maps ready: {key_maps.summary()}, {int(key_maps.known_days.sum())} dates.")
+    return key_maps
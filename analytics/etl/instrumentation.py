@@ -0,0 +1,390 @@
+"""
+Instrumentation for the ETL: logging setup, stage spans and run metrics.
+
+- get_logger(__name__, "Dim_Product") gives every module the usual
+  "<time> - <level> - [Dim_Product] - <message>" log lines from one shared handler
+  (per-module logging.basicConfig calls only ever applied the first module's format).
+- Pipeline steps are wrapped in `stage("Views.create")` (a context manager) or decorated
+  with `@timed_stage("Dim_Product.extract")`. When a stage ends, its span is passed to every
+  registered listener (RunRecorder, the benchmark harness). With no listeners the cost is
+  two perf_counter() calls per stage.
+- RunRecorder collects the spans of one pipeline run and writes them to dw.etl_run_log and
+  to a Prometheus text file (LABHUB_METRICS_FILE) for node_exporter's textfile collector.
+
+A span is a dict:
+    stage, parent (enclosing stage on the same thread), status ("ok"/"error"/...),
+    rows_in, rows_out, bytes (None if unknown), seconds, started_at (wall clock),
+    thread, start / end (time.perf_counter() values)
+"""
+
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - [%(tag)s] - %(message)s'
+
+# Prometheus text file with the latest run's metrics. Set LABHUB_METRICS_FILE="" to disable.
+METRICS_FILE = os.getenv(
+    "LABHUB_METRICS_FILE", str(Path(__file__).resolve().parents[1] / "warehouse" / "etl_metrics.prom")
+)
+
+# -------------------------
+# Logging
+# -------------------------
+_log_tags: dict[str, str] = {}
+
+
+class _TagFormatter(logging.Formatter):
+    """Fills %(tag)s from the tag registered for the logger, or the last part of its name."""
+
+    def format(self, record):
+        record.tag = _log_tags.get(record.name, record.name.rsplit(".", 1)[-1])
+        return super().format(record)
+
+
+def configure_logging(level=logging.INFO):
+    """Installs the shared console handler on the root logger (once)."""
+    root = logging.getLogger()
+    if not any(isinstance(handler.formatter, _TagFormatter) for handler in root.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(_TagFormatter(LOG_FORMAT))
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def get_logger(name: str, tag: str | None = None) -> logging.Logger:
+    """Returns the module logger, tagged e.g. [Dim_Product] in the shared log format."""
+    configure_logging()
+    if tag:
+        _log_tags[name] = tag
+    return logging.getLogger(name)
+
+
+logger = get_logger(__name__, "Instrumentation")
+
+# -------------------------
+# Spans
+# -------------------------
+_listeners: list[Callable[[dict], None]] = []
+_active = threading.local()
+
+
+def add_stage_listener(listener: Callable[[dict], None]):
+    """Registers a callable that receives every finished span."""
+    _listeners.append(listener)
+
+
+def remove_stage_listener(listener: Callable[[dict], None]):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def _emit(span: dict):
+    for listener in list(_listeners):
+        try:
+            listener(span)
+        except Exception as e:
+            # Instrumentation must never break a load.
+            logger.warning(f"Stage listener failed for {span['stage']}: {e}")
+
+
+def row_count(obj) -> int | None:
+    """Row count of an Arrow table/batch or DataFrame, None for anything else."""
+    if hasattr(obj, "num_rows"):
+        return obj.num_rows
+    if hasattr(obj, "shape"):
+        return obj.shape[0]
+    return None
+
+
+def byte_size(obj) -> int | None:
+    """In-memory size of an Arrow table/batch or DataFrame, None for anything else."""
+    if hasattr(obj, "nbytes") and hasattr(obj, "num_rows"):
+        return obj.nbytes
+    if hasattr(obj, "memory_usage"):
+        return int(obj.memory_usage(index=True).sum())
+    return None
+
+
+def _stack() -> list:
+    if not hasattr(_active, "stack"):
+        _active.stack = []
+    return _active.stack
+
+
+def _current_stage() -> str | None:
+    stack = _stack()
+    return stack[-1]["stage"] if stack else getattr(_active, "parent", None)
+
+
+def _new_span(name: str) -> dict:
+    span = {
+        "stage": name, "parent": _current_stage(), "status": "ok",
+        "rows_in": None, "rows_out": None, "bytes": None,
+        "thread": threading.current_thread().name, "started_at": datetime.now(),
+        "start": time.perf_counter(),
+    }
+    _stack().append(span)
+    return span
+
+
+def _finish(span: dict, seconds: float | None = None):
+    stack = _stack()
+    if span in stack:
+        stack.remove(span)
+    span["end"] = time.perf_counter()
+    span["seconds"] = span["end"] - span["start"] if seconds is None else seconds
+    _emit(span)
+
+
+def annotate(**fields):
+    """
+    Sets fields (rows_in, rows_out, bytes, status) on the innermost open span of this thread,
+    e.g. annotate(rows_in=source_rows, rows_out=inserted) at the end of a load.
+    """
+    stack = _stack()
+    if stack:
+        stack[-1].update(fields)
+
+
+def in_current_stage(fn):
+    """
+    Wraps fn for a worker thread: stages it opens get the caller's current stage as parent,
+    e.g. pool.submit(in_current_stage(prepare_dim_product)).
+    """
+    parent = _current_stage()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_active, "parent", None)
+        _active.parent = parent
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _active.parent = previous
+    return wrapper
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times the enclosed block as one stage; the span dict is yielded for annotation.
+    Exceptions propagate and the span is still emitted, with status "error".
+    """
+    span = _new_span(name)
+    try:
+        yield span
+    except BaseException:
+        span["status"] = "error"
+        raise
+    finally:
+        _finish(span)
+
+
+def _timed_batches(span: dict, batches, busy: float):
+    """
+    Passes batches through, timing only the time spent producing them (e.g. fetchmany round trips),
+    not the consumer's work between batches. Emits the span once the iterator is drained, or
+    closed early by the consumer; only errors raised while producing a batch mark it "error".
+    """
+    span["rows_out"], span["bytes"] = 0, 0
+    iterator = iter(batches)
+    try:
+        while True:
+            tick = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                break
+            except BaseException:
+                span["status"] = "error"
+                raise
+            finally:
+                busy += time.perf_counter() - tick
+            span["rows_out"] += row_count(batch) or 0
+            span["bytes"] += byte_size(batch) or 0
+            yield batch
+    finally:
+        _finish(span, busy)
+
+
+def timed_stage(name: str):
+    """
+    Decorator form of stage(). Stage names can use the call's arguments, e.g. "DQ.{scope}".
+    rows_in is taken from the first table argument, rows_out/bytes from a table return value,
+    unless the function sets them with annotate().
+    If the function returns an iterator of batches (streaming extracts), the span covers
+    producing those batches and is emitted once the iterator is drained.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            stage_name = name
+            if "{" in name:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                stage_name = name.format(**bound.arguments)
+
+            span = _new_span(stage_name)
+            span["rows_in"] = next((n for n in map(row_count, args) if n is not None), None)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                span["status"] = "error"
+                _finish(span)
+                raise
+
+            if span["rows_out"] is None:
+                span["rows_out"] = row_count(result)
+            if span["bytes"] is None:
+                span["bytes"] = byte_size(result)
+            if span["rows_out"] is None and hasattr(result, "__next__"):
+                # Streaming: stays open (but off this thread's stack) until the batches are drained.
+                _stack().remove(span)
+                return _timed_batches(span, result, time.perf_counter() - span["start"])
+            _finish(span)
+            return result
+        return wrapper
+    return decorator
+
+# -------------------------
+# Run metrics
+# -------------------------
+def summarize_spans(spans: list[dict]) -> list[dict]:
+    """
+    Aggregates spans by stage name, in first-seen order. Streamed transforms emit one span
+    per batch; their rows, bytes and seconds are summed into one entry with a call count.
+    """
+    stages = {}
+    for span in spans:
+        entry = stages.setdefault(span["stage"], {
+            "stage": span["stage"], "parent": span["parent"], "status": "ok", "calls": 0,
+            "rows_in": None, "rows_out": None, "bytes": None, "seconds": 0.0,
+            "started_at": span["started_at"], "thread": span["thread"],
+        })
+        entry["calls"] += 1
+        entry["seconds"] += span["seconds"]
+        for field in ("rows_in", "rows_out", "bytes"):
+            if span[field] is not None:
+                entry[field] = (entry[field] or 0) + span[field]
+        if span["status"] != "ok":
+            entry["status"] = span["status"]
+        entry["started_at"] = min(entry["started_at"], span["started_at"])
+    return list(stages.values())
+
+
+def ensure_run_log_table(duck_conn):
+    """Creates dw.etl_run_log on warehouses initialized before it existed."""
+    duck_conn.execute("""
+        CREATE TABLE IF NOT EXISTS dw.etl_run_log (
+            RunID VARCHAR(32) NOT NULL,
+            Stage VARCHAR(128) NOT NULL,
+            ParentStage VARCHAR(128),
+            Status VARCHAR(16) NOT NULL,
+            Calls INTEGER NOT NULL,
+            RowsIn BIGINT,
+            RowsOut BIGINT,
+            Bytes BIGINT,
+            DurationSeconds DOUBLE NOT NULL,
+            StartedAt TIMESTAMP NOT NULL,
+            ThreadName VARCHAR(64)
+        );
+    """)
+
+
+def _prometheus_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RunRecorder:
+    """
+    Collects every span emitted during one pipeline run (all threads) and exports them.
+
+        with RunRecorder() as recorder:
+            ...run the pipeline...
+        recorder.write_run_log(duck_conn)
+        recorder.write_prometheus()
+    """
+
+    def __init__(self, run_id: str | None = None):
+        self.run_id = run_id or uuid.uuid4().hex[:16]
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def _record(self, span: dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def __enter__(self):
+        add_stage_listener(self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        remove_stage_listener(self._record)
+
+    def summary(self) -> list[dict]:
+        with self._lock:
+            return summarize_spans(self.spans)
+
+    def write_run_log(self, duck_conn):
+        """
+        Appends one row per stage to dw.etl_run_log. Call it outside the load transaction
+        so failed and rolled-back runs are logged too.
+        """
+        ensure_run_log_table(duck_conn)
+        rows = [
+            (self.run_id, s["stage"], s["parent"], s["status"], s["calls"], s["rows_in"], s["rows_out"],
+             s["bytes"], round(s["seconds"], 6), s["started_at"], s["thread"])
+            for s in self.summary()
+        ]
+        if rows:
+            duck_conn.executemany("INSERT INTO dw.etl_run_log VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        logger.info(f"Run {self.run_id}: {len(rows)} stage metrics written to dw.etl_run_log.")
+
+    def write_prometheus(self, path=None):
+        """
+        Writes the run's per-stage gauges in the Prometheus text format. The file is replaced
+        atomically, so a scraper never reads a half-written file. path defaults to METRICS_FILE.
+        """
+        path = METRICS_FILE if path is None else path
+        if not path:
+            return
+        metrics = {
+            "labhub_etl_stage_duration_seconds": ("Stage wall time in the latest run.", "seconds"),
+            "labhub_etl_stage_rows_in": ("Rows read by the stage in the latest run.", "rows_in"),
+            "labhub_etl_stage_rows_out": ("Rows produced or written by the stage in the latest run.", "rows_out"),
+            "labhub_etl_stage_bytes": ("In-memory bytes handled by the stage in the latest run.", "bytes"),
+            "labhub_etl_stage_success": ("1 if the stage finished without error in the latest run.", "status"),
+        }
+        summary = self.summary()
+        lines = []
+        for metric, (help_text, field) in metrics.items():
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            for s in summary:
+                value = int(s["status"] == "ok") if field == "status" else s[field]
+                if isinstance(value, float):
+                    value = round(value, 6)
+                if value is not None:
+                    lines.append(f'{metric}{{stage="{_prometheus_label(s["stage"])}"}} {value}')
+        lines += [
+            "# HELP labhub_etl_last_run_timestamp_seconds Unix time the latest run was exported.",
+            "# TYPE labhub_etl_last_run_timestamp_seconds gauge",
+            f"labhub_etl_last_run_timestamp_seconds {time.time():.3f}",
+        ]
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+        logger.info(f"Run {self.run_id}: metrics written to {path}.")
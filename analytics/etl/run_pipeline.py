@@ -1,79 +1,193 @@
-import logging
-from analytics.data.connect_db import get_warehouse_conn
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from analytics.data.connect_db import get_warehouse_conn, get_oltp_pool, POOL_SIZE
 from analytics.etl.dimensions import dim_product, dim_user, dim_location, dim_date
 from analytics.etl.facts import fact_inventory
+from analytics.etl.facts.fact_parquet import refresh_fact_parquet
+from analytics.etl.facts.compaction import compact_fact_table
 from analytics.warehouse.create_views import create_analytics_views
-from analytics.etl.data_quality import run_dq_checks, print_dq_report, inspect_warehouse
+from analytics.etl.dq_anomalies import run_anomaly_checks
+from analytics.etl.data_quality import run_dq_checks, print_dq_report, inspect_warehouse, full_audit_due, save_dq_results
+from analytics.etl.staging import DEFAULT_CHUNK_SIZE
+from analytics.etl.change_detection import get_fingerprints, save_fingerprint
+from analytics.etl.instrumentation import RunRecorder, get_logger, in_current_stage, stage
 
 # --- Logging Setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - [PIPELINE] - %(message)s'
+logger = get_logger(__name__, "PIPELINE")
+
+# (name, extract+transform in a worker thread, load on the pipeline connection)
+DIMENSION_STEPS = (
+    ("Dim_Date", dim_date.prepare_dim_date, dim_date.load_dim_date),
+    ("Dim_Product", dim_product.prepare_dim_product, dim_product.load_dim_product),
+    ("Dim_User", dim_user.prepare_dim_user, dim_user.load_dim_user),
+    ("Dim_Location", dim_location.prepare_dim_location, dim_location.load_dim_location),
 )
-logger = logging.getLogger(__name__)
 
-def run_inventory_warehouse(inspect: bool = False):
+def load_dimensions_parallel(duck_conn, force: bool = False):
+    """
+    Runs the four dimension extracts concurrently (each on its own OLTP connection),
+    then applies their loads one by one on the pipeline's DuckDB connection, inside
+    the caller's transaction. Wall-clock time is close to the slowest extract.
+    A dimension whose source fingerprint matches its last committed load is not
+    extracted at all (force=True reloads everything).
+    """
+    start = time.perf_counter()
+    known = {} if force else get_fingerprints(duck_conn)
+    with ThreadPoolExecutor(max_workers=len(DIMENSION_STEPS), thread_name_prefix="dim-extract") as pool:
+        futures = [(name, pool.submit(in_current_stage(prepare), known.get(name)), load) for name, prepare, load in DIMENSION_STEPS]
+        try:
+            # DuckDB connections are not shared across threads: loads stay on this thread, in a fixed order.
+            for name, future, load in futures:
+                staged, fingerprint = future.result()
+                if staged is None:
+                    logger.info(f"⏭️ {name} source unchanged since the last load. Skipped.")
+                    continue
+                load(duck_conn, staged)
+                save_fingerprint(duck_conn, name, fingerprint)
+                logger.info(f"✅ {name} loaded.")
+        except Exception as e:
+            logger.error(f"Dimension refresh failed: {e}")
+            pool.shutdown(cancel_futures=True)
+            raise
+    logger.info(f"Dimensions refreshed in {time.perf_counter() - start:.2f}s.")
+
+def export_run_metrics(duck_conn, recorder: RunRecorder, dq_reports=()):
+    """
+    Writes the run's stage metrics to dw.etl_run_log and the Prometheus metrics file, and its
+    DQ results to dw.dq_results.
+    Runs after COMMIT/ROLLBACK, so failed runs are recorded too; export errors are only logged.
+    """
+    try:
+        recorder.write_run_log(duck_conn)
+    except Exception as e:
+        logger.warning(f"Could not write dw.etl_run_log: {e}")
+    try:
+        save_dq_results(duck_conn, dq_reports, recorder.run_id)
+    except Exception as e:
+        logger.warning(f"Could not write dw.dq_results: {e}")
+    try:
+        recorder.write_prometheus()
+    except Exception as e:
+        logger.warning(f"Could not write the metrics file: {e}")
+
+def run_inventory_warehouse(
+    inspect: bool = False,
+    full_reload: bool = False,
+    chunksize: int | None = None,
+    parallel_dimensions: bool = True,
+    compact: bool = False,
+):
     """
     Run the Inventory Data Warehouse ETL pipeline.
 
     Coordinates dimension and fact loads:
     - Loads dimensions (date, product, user, location).
-    - Loads facts: fact skip rows already present in OLAP
+    - Loads facts: only events past the stored watermark, skipping rows already present in OLAP
 
     Args:
         inspect: If True, prints a warehouse shape summary after a successful load.
+        full_reload: If True, the fact extract ignores the watermark and re-reads all StockEvents,
+            and every dimension is reloaded even if its source fingerprint is unchanged.
+        chunksize: If set, OLTP extracts are streamed in chunks of this many rows into
+            DuckDB staging tables instead of being read into memory at once.
+        parallel_dimensions: If True, the dimension extracts run concurrently in a thread pool
+            and are held in memory until loaded. Dimensions are small, so chunksize then only
+            applies to the fact extract. If False, dimensions run one after another.
+        compact: If True, rewrites the fact table clustered by date/product after the load even
+            if its zone maps do not call for it yet (see facts/compaction.py).
     """
     duck_conn = get_warehouse_conn()
+    recorder = RunRecorder()
+    dq_reports = []
     try:
-        
-        duck_conn.execute("BEGIN TRANSACTION;")
-
-        # 1. Load Dimensions
-        logger.info("Step 1/3: Refreshing Dimensions...")
-        dim_date.run_dim_date_etl(duck_conn)
-        dim_product.run_dim_product_etl(duck_conn)
-        dim_user.run_dim_user_etl(duck_conn)
-        dim_location.run_dim_location_etl(duck_conn)
-
-        # 1B. Dimensions Quality Check
-        logger.info("Running Dimension Data Quality Checks...") 
-        dim_dq_report = run_dq_checks(duck_conn, scope="dimensions") 
-        print_dq_report(dim_dq_report)
-
-        if not dim_dq_report["passed_all"]: 
-            logger.error("🛑 Dimension DQ FAILED — rolling back and aborting pipeline.") 
-            duck_conn.execute("ROLLBACK;") 
-            return
-    
-        # 2. Load Facts 
-        logger.info("Step 2/3: Performing Incremental Fact Load...")
-        fact_inventory.run_fact_inventory_etl(duck_conn)
-
-        # 3. Data Quality
-        logger.info("Step 3/3: Running Data Quality Audit...")
-        dq_report = run_dq_checks(duck_conn)
-        print_dq_report(dq_report)
-
-        if dq_report["passed_all"]:
-            logger.info("✅ All checks PASS")
-            duck_conn.execute("COMMIT;")
-        else:
-            logger.error("🛑 DQ FAILED — rolling back. Warehouse NOT updated.")
-            duck_conn.execute("ROLLBACK;")
-            logger.error(
-                "❌ Review the DQ report above. "
-                "No data was written to the warehouse."
-            )
-            return
+        with recorder, stage("Pipeline") as run_span:
+            duck_conn.execute("BEGIN TRANSACTION;")
+
+            # 1. Load Dimensions
+            logger.info("Step 1/3: Refreshing Dimensions...")
+            with stage("Dimensions"):
+                if parallel_dimensions:
+                    load_dimensions_parallel(duck_conn, force=full_reload)
+                else:
+                    dim_date.run_dim_date_etl(duck_conn, force=full_reload)
+                    dim_product.run_dim_product_etl(duck_conn, chunksize=chunksize, force=full_reload)
+                    dim_user.run_dim_user_etl(duck_conn, chunksize=chunksize, force=full_reload)
+                    dim_location.run_dim_location_etl(duck_conn, chunksize=chunksize, force=full_reload)
+
+            # 1B. Dimensions Quality Check
+            logger.info("Running Dimension Data Quality Checks...")
+            dim_dq_report = run_dq_checks(duck_conn, scope="dimensions")
+            print_dq_report(dim_dq_report)
+            dq_reports.append(dim_dq_report)
+
+            if not dim_dq_report["passed_all"]:
+                logger.error("🛑 Dimension DQ FAILED — rolling back and aborting pipeline.")
+                duck_conn.execute("ROLLBACK;")
+                run_span["status"] = "rolled_back"
+                return
+
+            # 2. Load Facts
+            logger.info("Step 2/3: Performing Incremental Fact Load...")
+            had_facts = fact_inventory.has_facts(duck_conn)
+            new_facts = fact_inventory.run_fact_inventory_etl(duck_conn, full_reload=full_reload, chunksize=chunksize)
+
+            # 3. Data Quality: the run's new rows plus a spot check, or the full history when the
+            # scheduled audit is due (LABHUB_DQ_FULL_AUDIT_HOURS) or on --full-reload
+            if full_reload or full_audit_due(duck_conn):
+                logger.info("Step 3/3: Running full Data Quality Audit...")
+                dq_report = run_dq_checks(duck_conn)
+            else:
+                logger.info("Step 3/3: Running Data Quality Audit on the loaded batch...")
+                dq_report = run_dq_checks(duck_conn, scope="delta", delta_view=fact_inventory.DELTA_VIEW)
+            print_dq_report(dq_report)
+            dq_reports.append(dq_report)
+
+            # 3A. Batch anomalies against rolling baselines (warnings only, never rolls back).
+            # Only the rows this run inserted are scored. A full reload or the first load of
+            # an empty warehouse is not a batch, so it is not scored.
+            if not full_reload and had_facts and new_facts:
+                try:
+                    anomaly_report = run_anomaly_checks(duck_conn, fact_inventory.NEW_ROWS_VIEW)
+                    print_dq_report(anomaly_report)
+                    dq_reports.append(anomaly_report)
+                except Exception as e:
+                    logger.warning(f"Anomaly scan skipped: {e}")
+
+            if dq_report["passed_all"]:
+                logger.info("✅ All checks PASS")
+                duck_conn.execute("COMMIT;")
+            else:
+                logger.error("🛑 DQ FAILED — rolling back. Warehouse NOT updated.")
+                duck_conn.execute("ROLLBACK;")
+                run_span["status"] = "rolled_back"
+                logger.error(
+                    "❌ Review the DQ report above. "
+                    "No data was written to the warehouse."
+                )
+                return
+
+            # 3B. Parquet copy of the fact (LABHUB_FACT_STORAGE=parquet): files are written after COMMIT
+            refresh_fact_parquet(duck_conn, fact_inventory.DELTA_VIEW, new_facts, full=full_reload)
+
+            # 4. Refresh Views: only views whose SQL changed are recreated, on the pipeline connection
+            with stage("Views.create"):
+                view_counts = create_analytics_views(duck_conn, force=full_reload)
+            logger.info(f"✅ Analytics views refreshed: {view_counts}.")
 
-        # 4. Refresh Views
-        create_analytics_views()
-        logger.info("✅ Analytics views refreshed.")
+            # 5. Fact layout: compacted in its own transaction when the zone maps call for it.
+            # A run that loaded no rows cannot have changed the layout, so it is not checked.
+            # The load is already committed, so a failure here is only logged.
+            if compact or new_facts:
+                try:
+                    compact_fact_table(duck_conn, force=compact)
+                except Exception as e:
+                    logger.warning(f"Fact compaction skipped: {e}")
 
-        if inspect:
-            inspect_warehouse(duck_conn)
+            if inspect:
+                inspect_warehouse(duck_conn)
 
-        logger.info("✅ Warehouse Refresh Completed Successfully.")
+            logger.info("✅ Warehouse Refresh Completed Successfully.")
 
     except Exception as e:
         logger.critical(f"Pipeline failed during execution: {e}")
@@ -83,8 +197,27 @@ def run_inventory_warehouse(inspect: bool = False):
             pass
         raise
     finally:
+        export_run_metrics(duck_conn, recorder, dq_reports)
         duck_conn.close()
+        if POOL_SIZE > 0:
+            logger.info(f"OLTP connection pool: {get_oltp_pool().stats()}")
 
 if __name__ == "__main__":
-    run_inventory_warehouse()
+    parser = argparse.ArgumentParser(description="Run the LabHub inventory warehouse pipeline.")
+    parser.add_argument("--inspect", action="store_true", help="Print a warehouse shape summary after the load.")
+    parser.add_argument("--full-reload", action="store_true", help="Ignore the fact watermark and dimension fingerprints; re-extract everything.")
+    parser.add_argument(
+        "--stream", nargs="?", type=int, const=DEFAULT_CHUNK_SIZE, default=None, metavar="CHUNK_SIZE",
+        help=f"Stream OLTP extracts into DuckDB in chunks (default {DEFAULT_CHUNK_SIZE} rows)."
+    )
+    parser.add_argument("--sequential-dims", action="store_true", help="Extract dimensions one after another.")
+    parser.add_argument("--compact", action="store_true", help="Rewrite the fact table clustered by date/product after the load.")
+    args = parser.parse_args()
+    run_inventory_warehouse(
+        inspect=args.inspect,
+        full_reload=args.full_reload,
+        chunksize=args.stream,
+        parallel_dimensions=not args.sequential_dims,
+        compact=args.compact,
+    )
 
@@ -0,0 +1,198 @@
+"""
+Staging helpers shared by the dimension and fact ETL modules.
+
+Extracts are read from the OLTP cursor straight into Arrow record batches
+(no pandas object columns in between) and handed to DuckDB, which scans the
+Arrow buffers without copying them. Batches are appended into a TEMP staging
+table on the warehouse connection, so peak memory stays bounded by the batch
+size no matter how big the source table is. The load steps then read from the
+staging table.
+
+Parquet/CSV snapshots of the OLTP tables can be staged the same way.
+"""
+
+import datetime
+import decimal
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from analytics.data.connect_db import get_oltp_connection
+from analytics.etl.instrumentation import get_logger
+
+logger = get_logger(__name__, "Staging")
+
+# Rows per fetchmany() round trip / record batch.
+DEFAULT_CHUNK_SIZE = int(os.getenv("LABHUB_EXTRACT_CHUNK_SIZE", "50000"))
+
+# Rows inspected to infer a column type when the driver does not report one.
+TYPE_SAMPLE_ROWS = 1000
+
+# DB-API cursors like pyodbc report a Python type per column in cursor.description;
+# DuckDB (the local OLTP) reports type names instead. "NUMBER" covers integers and
+# decimals alike, so it is left to inference.
+_PYTHON_TO_ARROW = {
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bool: pa.bool_(),
+    bytes: pa.binary(),
+    datetime.datetime: pa.timestamp("us"),
+    datetime.date: pa.date32(),
+    "STRING": pa.string(),
+    "bool": pa.bool_(),
+    "BINARY": pa.binary(),
+    "DATETIME": pa.timestamp("us"),
+    "Date": pa.date32(),
+}
+
+
+def _arrow_type(column_description):
+    """
+    Maps one cursor.description entry to an Arrow type.
+    Returns None when the driver does not report a usable type (type is inferred from the data).
+    """
+    type_code = column_description[1]
+    if type_code is decimal.Decimal:
+        precision, scale = column_description[4], column_description[5]
+        if precision and scale is not None:
+            return pa.decimal128(precision, scale)
+        return None
+    try:
+        return _PYTHON_TO_ARROW.get(type_code)
+    except TypeError:   # unhashable driver type objects
+        return None
+
+
+def _infer_type(values):
+    """
+    Infers an Arrow type from a sample of column values. Returns None if the sample is all NULL.
+    Decimals are widened from the sample's narrowest precision so later batches still fit.
+    """
+    sample_type = pa.array(values[:TYPE_SAMPLE_ROWS]).type
+    if pa.types.is_null(sample_type):
+        return None
+    if pa.types.is_decimal(sample_type):
+        return pa.decimal128(18 if sample_type.precision <= 18 else 38, sample_type.scale)
+    return sample_type
+
+
+def iter_oltp_batches(query: str, params=None, chunksize: int = DEFAULT_CHUNK_SIZE, conn=None) -> Iterator[pa.RecordBatch]:
+    """
+    Runs a query against the OLTP and yields the result as Arrow record batches of at most
+    `chunksize` rows, built column-wise straight from cursor.fetchmany().
+    Always yields at least one (possibly empty) batch so callers see the schema.
+
+    Args:
+        conn: Optional DB-API connection managed by the caller. If omitted, an OLTP
+            connection is opened and closed once the cursor is drained.
+    """
+    owns_conn = conn is None
+    if owns_conn:
+        conn = get_oltp_connection()
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        names = [col[0] for col in cursor.description]
+        types = [_arrow_type(col) for col in cursor.description]
+
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            columns = list(zip(*rows)) if rows else [[] for _ in names]
+            # Converting with a known type is much cheaper than per-value inference (notably for Decimal).
+            types = [arrow_type or _infer_type(values) for values, arrow_type in zip(columns, types)]
+            yield pa.record_batch(
+                [pa.array(values, type=arrow_type) for values, arrow_type in zip(columns, types)],
+                names=names,
+            )
+            if len(rows) < chunksize:
+                break
+    finally:
+        # Close the cursor explicitly so a pooled connection never goes back with pending results.
+        if cursor is not None:
+            cursor.close()
+        if owns_conn:
+            conn.close()
+
+
+def iter_snapshot_batches(path, file_format: str = "parquet", columns=None, chunksize: int = DEFAULT_CHUNK_SIZE) -> Iterator[pa.RecordBatch]:
+    """
+    Yields Arrow record batches from a Parquet or CSV snapshot (a file or a directory of files).
+    Useful for staging OLTP exports without a live connection.
+    """
+    dataset = ds.dataset(Path(path), format=file_format)
+    yield from dataset.to_batches(columns=columns, batch_size=chunksize)
+
+
+def _widen_untyped(duck_conn, table_name: str, batch, untyped: set) -> None:
+    """
+    Retypes the staging columns in `untyped` that `batch` (registered as tmp_stage_batch)
+    brings values for, and drops them from the set.
+    """
+    typed = [field.name for field in batch.schema if field.name in untyped and not pa.types.is_null(field.type)]
+    if not typed:
+        return
+    duck_types = dict(duck_conn.execute("SELECT column_name, column_type FROM (DESCRIBE SELECT * FROM tmp_stage_batch);").fetchall())
+    for name in typed:
+        duck_conn.execute(f'ALTER TABLE {table_name} ALTER COLUMN "{name}" TYPE {duck_types[name]};')
+        untyped.discard(name)
+        logger.debug(f"Widened {table_name}.{name} to {duck_types[name]}.")
+
+
+def stage_batches(
+    duck_conn,
+    table_name: str,
+    batches: Iterable,
+    transform: Callable[[pa.Table], pa.Table] | None = None,
+) -> int:
+    """
+    Materializes Arrow data into a TEMP table on the warehouse connection.
+    The first batch (re)creates the table, later batches are appended. DuckDB scans
+    each registered Arrow batch in place, so rows are not converted on the way in.
+    A column that is all NULL in the first batch has no type yet (DuckDB stages the Arrow
+    null type as INTEGER); it is widened to the type of the first batch that has values.
+
+    Args:
+        duck_conn: Warehouse connection (managed by the caller).
+        table_name: Name of the TEMP staging table, e.g. "tmp_dim_product".
+        batches: Arrow RecordBatches or Tables, e.g. from iter_oltp_batches() or a single [table].
+        transform: Optional per-batch transform (pa.Table -> pa.Table) applied before staging.
+
+    Returns:
+        Number of rows staged.
+    """
+    staged_rows = 0
+    created = False
+    untyped = set()   # staging columns created from an all-NULL (Arrow null) column
+    for batch in batches:
+        if created and not batch.num_rows:
+            continue  # e.g. the trailing empty fetchmany() batch; it would also skip the transform
+        if transform is not None and batch.num_rows:
+            if isinstance(batch, pa.RecordBatch):
+                batch = pa.Table.from_batches([batch])
+            batch = transform(batch)
+
+        duck_conn.register("tmp_stage_batch", batch)
+        try:
+            if not created:
+                duck_conn.execute(f"CREATE OR REPLACE TEMP TABLE {table_name} AS SELECT * FROM tmp_stage_batch;")
+                created = True
+                untyped = {field.name for field in batch.schema if pa.types.is_null(field.type)}
+            else:
+                if untyped:
+                    _widen_untyped(duck_conn, table_name, batch, untyped)
+                duck_conn.execute(f"INSERT INTO {table_name} SELECT * FROM tmp_stage_batch;")
+        finally:
+            duck_conn.unregister("tmp_stage_batch")
+
+        staged_rows += batch.num_rows
+        logger.debug(f"Staged {batch.num_rows} rows into {table_name} ({staged_rows} total).")
+
+    logger.info(f"Staged {staged_rows} rows into {table_name}.")
+    return staged_rows
@@ -0,0 +1,235 @@
+"""
+Bulk upsert shared by the dimension and fact loads.
+
+The loads used to scan the target twice per refresh: an UPDATE ... IS DISTINCT FROM pass
+and an INSERT ... WHERE NOT EXISTS pass. upsert() classifies the staged rows in one
+LEFT JOIN against the target instead:
+
+    I  key not in the target              -> inserted
+    U  key found, hash-diff differs       -> updated
+    N  key found, same hash-diff          -> unchanged
+
+The hash-diff is hash() over the compared columns, cast to the target's column types, so
+staged and stored values hash alike. With a hash_column, the staged hash is compared with
+the hash stored on the target row and written back on insert/update, so the stored columns are
+not re-hashed on every run. The classified rows are kept in a TEMP table, so the INSERT and
+UPDATE only read that table. When nothing changed, the UPDATE does not run at all.
+
+upsert_scd2() uses the same classification against the current versions only, but closes the
+current version of a changed row and inserts a new one (SCD Type 2) instead of overwriting it.
+Dimensions listed in LABHUB_SCD2_DIMENSIONS are loaded this way; the others stay Type 1.
+
+The natural keys (ProductID, UserID, ...) are not UNIQUE in the warehouse schema, so
+INSERT ... ON CONFLICT cannot be used for the dimensions.
+
+swap_table() replaces a derived table's whole contents (the full rebuilds of the stored
+aggregates) inside the pipeline transaction.
+"""
+
+import os
+import re
+from datetime import datetime
+
+from analytics.etl.instrumentation import get_logger
+
+logger = get_logger(__name__, "Upsert")
+
+DIFF_TABLE = "tmp_upsert_diff"
+
+# Dimensions that keep attribute history (SCD Type 2), e.g. "Dim_Product,Dim_Location".
+SCD2_DIMENSIONS = {
+    name.strip() for name in os.getenv("LABHUB_SCD2_DIMENSIONS", "").split(",") if name.strip()
+}
+
+# Validity columns on the dimensions. First versions are valid from SCD_START, so facts
+# older than the first load still resolve; the current version has EffectiveTo NULL.
+EFFECTIVE_FROM = "EffectiveFrom"
+EFFECTIVE_TO = "EffectiveTo"
+IS_CURRENT = "IsCurrent"
+SCD_START = datetime(1900, 1, 1)
+
+
+def _column_types(duck_conn, target: str) -> dict:
+    """Column name -> SQL type of a schema-qualified warehouse table, e.g. "dw.Dim_Product"."""
+    schema, table = target.split(".", 1)
+    rows = duck_conn.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_schema = ? AND table_name = ?",
+        [schema, table],
+    ).fetchall()
+    return dict(rows)
+
+
+def hash_diff(alias: str, columns, column_types: dict) -> str:
+    """SQL expression hashing `columns` of `alias`, cast to the target's types (NULLs hash alike)."""
+    return "hash(" + ", ".join(f"CAST({alias}.{col} AS {column_types[col]})" for col in columns) + ")"
+
+
+def _classify(duck_conn, target: str, source: str, keys: list, compare_columns: list,
+              hash_column: str | None, current_column: str | None) -> dict:
+    """
+    Materializes the source rows into DIFF_TABLE with an UpsertAction (I/U/N) and, with a
+    hash_column, their hash-diff under that column name. Only the target's current rows
+    are matched when current_column is given. Returns the counts per action.
+    """
+    column_types = _column_types(duck_conn, target)
+    staged_hash = hash_diff("s", compare_columns, column_types)
+    stored_hash = f"t.{hash_column}" if hash_column else hash_diff("t", compare_columns, column_types)
+    on_keys = " AND ".join(f"s.{key} = t.{key}" for key in keys)
+    if current_column:
+        on_keys += f" AND t.{current_column}"
+
+    duck_conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {DIFF_TABLE} AS
+        SELECT
+            s.*,
+            {staged_hash} AS {hash_column or "StagedHash"},
+            CASE
+                WHEN t.{keys[0]} IS NULL THEN 'I'
+                WHEN {staged_hash} IS DISTINCT FROM {stored_hash} THEN 'U'
+                ELSE 'N'
+            END AS UpsertAction
+        FROM {source} s
+        LEFT JOIN {target} t ON {on_keys};
+    """)
+    actions = dict(duck_conn.execute(
+        f"SELECT UpsertAction, COUNT(*) FROM {DIFF_TABLE} GROUP BY UpsertAction"
+    ).fetchall())
+    return {
+        "source": sum(actions.values()),
+        "inserted": actions.get("I", 0),
+        "updated": actions.get("U", 0),
+        "unchanged": actions.get("N", 0),
+    }
+
+
+def upsert(duck_conn, target: str, source: str, keys, columns, update_columns=(),
+           hash_column: str | None = None, current_column: str | None = None) -> dict:
+    """
+    Inserts new rows from `source` into `target` and overwrites changed ones (SCD Type 1).
+
+    Args:
+        duck_conn: Warehouse connection; runs inside the caller's transaction.
+        target: Warehouse table, e.g. "dw.Dim_Product".
+        source: Staging table name or a parenthesized subquery exposing `keys` and `columns`.
+        keys: Natural key column(s) matched between source and target.
+        columns: Non-key columns written on insert.
+        update_columns: Columns compared by hash-diff and overwritten when they differ.
+            Empty for insert-only loads (Dim_Date, the fact table), which skip classification
+            and insert through a single anti-join.
+        hash_column: Optional target column storing each row's hash-diff (e.g. "RowHash").
+            Rows with no stored hash yet are rewritten once to fill it in.
+        current_column: Optional boolean column (e.g. "IsCurrent"); only current rows are
+            matched and overwritten, so Type 2 history written earlier is left untouched.
+
+    Returns:
+        {"source": n, "inserted": n, "updated": n, "unchanged": n}
+    """
+    keys, columns, update_columns = list(keys), list(columns), list(update_columns)
+    insert_columns = ", ".join(keys + columns)
+
+    if not update_columns:
+        on_keys = " AND ".join(f"s.{key} = t.{key}" for key in keys)
+        source_rows = duck_conn.execute(f"SELECT COUNT(*) FROM {source} s").fetchone()[0]
+        inserted = duck_conn.execute(f"""
+            INSERT INTO {target} ({insert_columns})
+            SELECT {", ".join(f"s.{col}" for col in keys + columns)}
+            FROM {source} s
+            ANTI JOIN {target} t ON {on_keys};
+        """).fetchone()[0]
+        counts = {"source": source_rows, "inserted": inserted, "updated": 0, "unchanged": source_rows - inserted}
+        logger.info(f"{target}: {counts}")
+        return counts
+
+    counts = _classify(duck_conn, target, source, keys, update_columns, hash_column, current_column)
+    if hash_column:
+        update_columns = update_columns + [hash_column]
+        insert_columns += f", {hash_column}"
+
+    if counts["updated"]:
+        assignments = ", ".join(f"{col} = d.{col}" for col in update_columns)
+        match_keys = " AND ".join(f"{target}.{key} = d.{key}" for key in keys)
+        if current_column:
+            match_keys += f" AND {target}.{current_column}"
+        duck_conn.execute(f"""
+            UPDATE {target}
+            SET {assignments}
+            FROM {DIFF_TABLE} d
+            WHERE d.UpsertAction = 'U' AND {match_keys};
+        """)
+    if counts["inserted"]:
+        duck_conn.execute(f"""
+            INSERT INTO {target} ({insert_columns})
+            SELECT {insert_columns} FROM {DIFF_TABLE} WHERE UpsertAction = 'I';
+        """)
+
+    duck_conn.execute(f"DROP TABLE {DIFF_TABLE};")
+    logger.info(f"{target}: {counts}")
+    return counts
+
+
+def upsert_scd2(duck_conn, target: str, source: str, keys, columns, hash_column: str,
+                effective_at: datetime | None = None) -> dict:
+    """
+    SCD Type 2 load: a changed row closes its current version (EffectiveTo = effective_at,
+    IsCurrent = FALSE) and gets a new version valid from effective_at, with a new surrogate key.
+    New keys get a first version valid from SCD_START. Unchanged rows are not touched.
+
+    Args:
+        columns: Tracked attributes; a change in any of them creates a new version.
+        hash_column: Target column holding each version's hash-diff (e.g. "RowHash").
+        effective_at: Change timestamp; defaults to now (the OLTP has no change timestamps).
+
+    Returns:
+        {"source": n, "inserted": n, "updated": n, "unchanged": n}; "updated" counts new versions.
+    """
+    keys, columns = list(keys), list(columns)
+    effective_at = effective_at or datetime.now()
+    counts = _classify(duck_conn, target, source, keys, columns, hash_column, IS_CURRENT)
+
+    if counts["updated"]:
+        match_keys = " AND ".join(f"{target}.{key} = d.{key}" for key in keys)
+        duck_conn.execute(f"""
+            UPDATE {target}
+            SET {EFFECTIVE_TO} = ?, {IS_CURRENT} = FALSE
+            FROM {DIFF_TABLE} d
+            WHERE d.UpsertAction = 'U' AND {match_keys} AND {target}.{IS_CURRENT};
+        """, [effective_at])
+    if counts["inserted"] or counts["updated"]:
+        version_columns = ", ".join(keys + columns + [hash_column])
+        duck_conn.execute(f"""
+            INSERT INTO {target} ({version_columns}, {EFFECTIVE_FROM}, {EFFECTIVE_TO}, {IS_CURRENT})
+            SELECT
+                {version_columns},
+                CASE WHEN UpsertAction = 'I' THEN ? ELSE ? END,
+                NULL,
+                TRUE
+            FROM {DIFF_TABLE}
+            WHERE UpsertAction IN ('I', 'U');
+        """, [SCD_START, effective_at])
+
+    duck_conn.execute(f"DROP TABLE {DIFF_TABLE};")
+    logger.info(f"{target} (SCD2): {counts}")
+    return counts
+
+
+def swap_table(duck_conn, target: str, select_sql: str) -> int:
+    """
+    Replaces the contents of `target` with the rows of `select_sql`. The rows go into a copy
+    of the table (same DDL and constraints), which then replaces it by DROP + RENAME. DuckDB
+    rejects re-inserting primary keys deleted in the same transaction, so DELETE + INSERT fails
+    inside the pipeline transaction once the table has rows.
+
+    Returns:
+        Number of rows in the new table.
+    """
+    schema, name = target.split(".", 1)
+    ddl = duck_conn.execute(
+        "SELECT sql FROM duckdb_tables() WHERE schema_name = ? AND table_name = ?", [schema, name]
+    ).fetchone()[0]
+    scratch = f"{target}_rebuild"
+    duck_conn.execute(f"DROP TABLE IF EXISTS {scratch};")
+    duck_conn.execute(re.sub(re.escape(target) + r"\b", scratch, ddl, count=1))
+    rows = duck_conn.execute(f"INSERT INTO {scratch} {select_sql};").fetchone()[0]
+    duck_conn.execute(f"DROP TABLE {target};")
+    duck_conn.execute(f"ALTER TABLE {scratch} RENAME TO {name};")
+    return rows
@@ -1,31 +1,54 @@
 # --Current inventory--
-from multiprocessing.dummy import connection
-import duckdb
 from analytics.data.connect_db import get_warehouse_conn
+from analytics.etl.facts.fact_parquet import PARQUET_VIEW, fact_relation, month_filter, parquet_view_definition
+from analytics.warehouse.view_manager import ViewManager
 
-def create_analytics_views():
-    conn = get_warehouse_conn()
+# Usage-window bounds as DateKeys. Kept as inline constant expressions (not a CTE) so DuckDB can
+# push them into the fact scan and skip row groups / Parquet partitions outside the window.
+KEY_30D = "CAST(strftime(CURRENT_DATE - INTERVAL '30 days', '%Y%m%d') AS INTEGER)"
+KEY_6M = "CAST(strftime(CURRENT_DATE - INTERVAL '6 months', '%Y%m%d') AS INTEGER)"
+KEY_12M = "CAST(strftime(CURRENT_DATE - INTERVAL '12 months', '%Y%m%d') AS INTEGER)"
+
+def create_analytics_views(conn=None, force: bool = False) -> dict:
+    """
+    Creates the analytics views, skipping those whose SQL is unchanged since they were last
+    created (see view_manager.py).
+
+    Args:
+        conn: Open warehouse connection to reuse (the pipeline's). None opens and closes one.
+        force: Recreate every view regardless of its stored definition hash.
+
+    Returns:
+        {"created": n, "unchanged": n}
+    """
+    own_conn = conn is None
+    conn = conn or get_warehouse_conn()
+    views = ViewManager(conn, force=force)
 
     try:
+        # dw.Fact_Inventory_Transactions, or its Parquet copy (LABHUB_FACT_STORAGE=parquet)
+        fact = fact_relation()
+        if fact.startswith(PARQUET_VIEW):
+            views.define(parquet_view_definition())
+
         #-- Base metrics view
-        conn.execute("""
+        # Stored as dw.Fact_Inventory_Daily, refreshed by the fact load for the days it touched
+        views.define("""
             CREATE OR REPLACE VIEW dw.v_inventory_metrics_base AS
             SELECT 
                 ProductKey,
                 LocationKey,
                 UserKey,
                 DateKey,
-                -- central logic for metrics
-                ABS(SUM(CASE WHEN QuantityDelta < 0 THEN QuantityDelta ELSE 0 END)) AS TotalQuantityConsumed,
-                COUNT(CASE WHEN QuantityDelta < 0 THEN 1 END) AS TransactionCount,
-                COUNT(CASE WHEN QuantityDelta > 0 THEN 1 END) AS ReplenishmentCount,
-                SUM(QuantityDelta) AS NetStockChange
-            FROM dw.Fact_Inventory_Transactions
-            GROUP BY ProductKey, LocationKey, UserKey, DateKey;
+                TotalQuantityConsumed,
+                TransactionCount,
+                ReplenishmentCount,
+                NetStockChange
+            FROM dw.Fact_Inventory_Daily;
             """)
         
         # --- 1. Current Stock on Hand ---
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_current_inventory AS
         SELECT 
             Dim_Product.ProductName,
@@ -35,7 +58,7 @@ def create_analytics_views():
             Dim_Location.RoomNumber,
             SUM(Fact_Inventory_Transactions.QuantityDelta) AS StockOnHand,
             Dim_Product.UnitOfMeasure
-        FROM dw.Fact_Inventory_Transactions
+        FROM {fact}
         JOIN dw.Dim_Product ON Fact_Inventory_Transactions.ProductKey = Dim_Product.ProductKey
         JOIN dw.Dim_Location ON Fact_Inventory_Transactions.LocationKey = Dim_Location.LocationKey
         GROUP BY
@@ -49,19 +72,19 @@ def create_analytics_views():
         """)
 
         # --- 1A. Current Stock of each item ---
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_kpi_stock_risk AS
         WITH ProductMax AS (
             -- Calculates 20% of the peak historical stock as the threshold
             SELECT 
                 ProductKey,
                 MAX(AbsoluteQuantity) * 0.20 AS LowStockThreshold
-            FROM dw.Fact_Inventory_Transactions
+            FROM {fact}
             GROUP BY ProductKey
         ),
         CurrentStock AS (
             SELECT ProductKey, SUM(QuantityDelta) AS StockOnHand
-            FROM dw.Fact_Inventory_Transactions
+            FROM {fact}
             GROUP BY ProductKey
         )
         SELECT 
@@ -72,17 +95,17 @@ def create_analytics_views():
         """)
 
         # --- 2. Monthly Usage Trends ---
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_monthly_usage AS
         SELECT 
             Dim_Date.Year,
             Dim_Date.Month,
             Dim_Date.MonthName,
             Dim_Product.CategoryName,
-            SUM(v_inventory_metrics_base.TotalQuantityConsumed) AS TotalQuantityConsumed,
-        FROM dw.v_inventory_metrics_base
-        JOIN dw.Dim_Date ON v_inventory_metrics_base.DateKey = Dim_Date.DateKey
-        JOIN dw.Dim_Product ON v_inventory_metrics_base.ProductKey = Dim_Product.ProductKey
+            SUM(Fact_Inventory_Daily.TotalQuantityConsumed) AS TotalQuantityConsumed,
+        FROM dw.Fact_Inventory_Daily
+        JOIN dw.Dim_Date ON Fact_Inventory_Daily.DateKey = Dim_Date.DateKey
+        JOIN dw.Dim_Product ON Fact_Inventory_Daily.ProductKey = Dim_Product.ProductKey
         GROUP BY 
             Dim_Date.Year, 
             Dim_Date.Month, 
@@ -92,14 +115,14 @@ def create_analytics_views():
         """)
 
         # --- 2A. Monthly-over-month events ---
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_kpi_monthly_events AS
         SELECT 
             Dim_Date.Year,
             Dim_Date.Month,
             COUNT(*) AS EventCount,
             LAG(COUNT(*)) OVER (ORDER BY Dim_Date.Year, Dim_Date.Month) AS PreviousMonthCount
-        FROM dw.Fact_Inventory_Transactions
+        FROM {fact}
         JOIN dw.Dim_Date ON Fact_Inventory_Transactions.DateKey = Dim_Date.DateKey
         GROUP BY 
             Dim_Date.Year, 
@@ -108,20 +131,25 @@ def create_analytics_views():
         """)
 
         # --- 2B. products with zero consumption ---
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_kpi_zero_usage AS
+        -- Counted per ProductID: with SCD Type 2 a product's usage can be spread over several versions
         SELECT 
-            COUNT(DISTINCT Dim_Product.ProductKey) AS ZeroUsageCount,
+            COUNT(DISTINCT Dim_Product.ProductID) AS ZeroUsageCount,
         FROM dw.Dim_Product
-        LEFT JOIN dw.Fact_Inventory_Transactions ON Dim_Product.ProductKey = Fact_Inventory_Transactions.ProductKey
-            AND Fact_Inventory_Transactions.QuantityDelta < 0
-            AND Fact_Inventory_Transactions.DateKey >= (SELECT MIN(DateKey) FROM dw.Dim_Date WHERE Month = extract(month from current_date))
-        WHERE Fact_Inventory_Transactions.TransactionID IS NULL;
+        WHERE Dim_Product.IsCurrent
+          AND Dim_Product.ProductID NOT IN (
+            SELECT UsedProduct.ProductID
+            FROM {fact}
+            JOIN dw.Dim_Product AS UsedProduct ON Fact_Inventory_Transactions.ProductKey = UsedProduct.ProductKey
+            WHERE Fact_Inventory_Transactions.QuantityDelta < 0
+              AND Fact_Inventory_Transactions.DateKey >= (SELECT MIN(DateKey) FROM dw.Dim_Date WHERE Month = extract(month from current_date))
+        );
         """)
 
         # --- 3. User Activity Audit ---
         # Useful for a "Recent Activity" table in your UI
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_recent_activity AS
         SELECT 
             Dim_Date.FullDate,
@@ -130,7 +158,7 @@ def create_analytics_views():
             Fact_Inventory_Transactions.EventType,
             Fact_Inventory_Transactions.QuantityDelta,
             Dim_Location.SiteName
-        FROM dw.Fact_Inventory_Transactions
+        FROM {fact}
         JOIN dw.Dim_Date ON Fact_Inventory_Transactions.DateKey = Dim_Date.DateKey
         JOIN dw.Dim_User ON Fact_Inventory_Transactions.UserKey = Dim_User.UserKey
         JOIN dw.Dim_Product ON Fact_Inventory_Transactions.ProductKey = Dim_Product.ProductKey
@@ -139,16 +167,16 @@ def create_analytics_views():
         """)
 
         # --- 4. Product Consumption Summary
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_consumption_summary AS
         SELECT 
             Dim_Product.ProductName,
             Dim_Product.CategoryName,
             Dim_Product.UnitOfMeasure,
-            SUM(v_inventory_metrics_base.TotalQuantityConsumed) AS TotalQuantityConsumed,
-            SUM(v_inventory_metrics_base.TransactionCount) AS TransactionCount,
-        FROM dw.v_inventory_metrics_base
-        JOIN dw.Dim_Product ON v_inventory_metrics_base.ProductKey = Dim_Product.ProductKey
+            SUM(Fact_Inventory_Daily.TotalQuantityConsumed) AS TotalQuantityConsumed,
+            SUM(Fact_Inventory_Daily.TransactionCount) AS TransactionCount,
+        FROM dw.Fact_Inventory_Daily
+        JOIN dw.Dim_Product ON Fact_Inventory_Daily.ProductKey = Dim_Product.ProductKey
         GROUP BY 
             Dim_Product.ProductName, 
             Dim_Product.CategoryName, 
@@ -157,69 +185,57 @@ def create_analytics_views():
         """)
 
         # --- 5. Location level Hotspots ---
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_location_hotspots AS
-        WITH LatestProductStock AS (
-            -- latest snapshot for every product in every location as latest_rank = 1
-            SELECT 
-                LocationKey, --for each location and product key
-                ProductKey,
-                AbsoluteQuantity,
-                ROW_NUMBER() OVER ( -- assign a row number based in the location, product, and latest transaction ID
-                    PARTITION BY LocationKey, ProductKey 
-                    ORDER BY DateKey DESC, TransactionID DESC
-                ) as latest_rank
-            FROM dw.Fact_Inventory_Transactions
-            ),
-            LatestDate AS (
+        WITH LatestDate AS (
+            -- dw.Current_Stock holds each pair's latest event, so its max DateKey is the location's
             SELECT 
                 LocationKey, 
                 MAX(DateKey) as LastDateKey
-            FROM dw.Fact_Inventory_Transactions
+            FROM dw.Current_Stock
             GROUP BY LocationKey
             ),
             RoomStockBalance AS (
-            -- Sum only the most recent snapshots for each room
+            -- Sum the latest known stock snapshot of every product in each room
                 SELECT 
                     LocationKey,
                     SUM(AbsoluteQuantity) as TrueCurrentStock
-                FROM LatestProductStock
-                WHERE latest_rank = 1 -- the letest known stock snapshot of this product at this location
+                FROM dw.Current_Stock
                 GROUP BY LocationKey
             ),
             LabGlobalUsage AS (
                 SELECT SUM(ABS(QuantityDelta)) as GlobalTotal
-                FROM dw.Fact_Inventory_Transactions
+                FROM {fact}
                 WHERE QuantityDelta < 0 --to show only gross number, not inventory change
             ),
             CampusUsage AS (
                 SELECT
                     dw.Dim_Location.SiteName,
-                    SUM(ABS(dw.Fact_Inventory_Transactions.QuantityDelta)) AS CampusTotal
-                    FROM dw.Fact_Inventory_Transactions
-                    JOIN dw.Dim_Location ON dw.Fact_Inventory_Transactions.LocationKey = dw.Dim_Location.LocationKey
-                    WHERE dw.Fact_Inventory_Transactions.QuantityDelta < 0 --to show only gross number, not inventory change
+                    SUM(ABS(Fact_Inventory_Transactions.QuantityDelta)) AS CampusTotal
+                    FROM {fact}
+                    JOIN dw.Dim_Location ON Fact_Inventory_Transactions.LocationKey = dw.Dim_Location.LocationKey
+                    WHERE Fact_Inventory_Transactions.QuantityDelta < 0 --to show only gross number, not inventory change
                     GROUP BY dw.Dim_Location.SiteName
             )
         SELECT
             dw.Dim_Location.SiteName || ' › ' || dw.Dim_Location.Building as LocationPath,
             dw.Dim_Location.RoomNumber,
             -- -- USAGE: The sum of what was taken out (displayed as a positive number)
-            SUM(CASE WHEN dw.Fact_Inventory_Transactions.QuantityDelta < 0 
-                    THEN ABS(dw.Fact_Inventory_Transactions.QuantityDelta) ELSE 0 END) AS TotalUsage,
+            SUM(CASE WHEN Fact_Inventory_Transactions.QuantityDelta < 0 
+                    THEN ABS(Fact_Inventory_Transactions.QuantityDelta) ELSE 0 END) AS TotalUsage,
             -- Stock: The actual shelf balance from the CTE
             MAX(RoomStockBalance.TrueCurrentStock) AS CurrentLocalStock,
-            MAX(DATE(STRPTIME(CAST(LatestDate.LastDateKey AS VARCHAR), '%Y%m%d'))) AS LastUpdatedKey,
+            MAX(CAST(STRPTIME(CAST(LatestDate.LastDateKey AS VARCHAR), '%Y%m%d') AS DATE)) AS LastUpdatedKey,
             -- Percentage: Usage vs Lab Global
-            ROUND((SUM(CASE WHEN dw.Fact_Inventory_Transactions.QuantityDelta < 0 
-                            THEN ABS(dw.Fact_Inventory_Transactions.QuantityDelta) ELSE 0 END) * 100.0) 
+            ROUND((SUM(CASE WHEN Fact_Inventory_Transactions.QuantityDelta < 0 
+                            THEN ABS(Fact_Inventory_Transactions.QuantityDelta) ELSE 0 END) * 100.0) 
                   / (SELECT GlobalTotal FROM LabGlobalUsage), 2) as PercentOfLabUsage,
             -- percentage of campus usage
-            ROUND((SUM(CASE WHEN dw.Fact_Inventory_Transactions.QuantityDelta < 0 
-                            THEN ABS(dw.Fact_Inventory_Transactions.QuantityDelta) ELSE 0 END) * 100.0) 
+            ROUND((SUM(CASE WHEN Fact_Inventory_Transactions.QuantityDelta < 0 
+                            THEN ABS(Fact_Inventory_Transactions.QuantityDelta) ELSE 0 END) * 100.0) 
                   / ANY_VALUE(CampusUsage.CampusTotal), 2) as PercentOfCampusUsage
-        FROM dw.Fact_Inventory_Transactions
-        JOIN dw.Dim_Location ON dw.Fact_Inventory_Transactions.LocationKey = dw.Dim_Location.LocationKey
+        FROM {fact}
+        JOIN dw.Dim_Location ON Fact_Inventory_Transactions.LocationKey = dw.Dim_Location.LocationKey
         LEFT JOIN RoomStockBalance ON dw.Dim_Location.LocationKey = RoomStockBalance.LocationKey
         LEFT JOIN LatestDate ON dw.Dim_Location.LocationKey = LatestDate.LocationKey
         LEFT JOIN CampusUsage ON dw.Dim_Location.SiteName = CampusUsage.SiteName
@@ -229,35 +245,42 @@ def create_analytics_views():
         ORDER BY TotalUsage DESC;
         """)
 
+        # --- Usage over any window: dw.product_usage_window(first_key[, last_key := ...]) ---
+        # Two ASOF lookups per product in dw.Product_Usage_Cumulative (prefix sums kept by the fact
+        # load), so the cost does not depend on the window length or the fact history.
+        views.define("""
+        CREATE OR REPLACE MACRO dw.product_usage_window(first_key, last_key := 99991231) AS TABLE
+        SELECT
+            Bounds.ProductKey,
+            COALESCE(UpToLast.CumulativeConsumed, 0) - COALESCE(BeforeFirst.CumulativeConsumed, 0) AS WindowConsumed
+        FROM (SELECT ProductKey, first_key AS FirstKey, last_key AS LastKey FROM dw.Dim_Product) Bounds
+        ASOF LEFT JOIN dw.Product_Usage_Cumulative UpToLast
+            ON Bounds.ProductKey = UpToLast.ProductKey AND Bounds.LastKey >= UpToLast.DateKey
+        ASOF LEFT JOIN dw.Product_Usage_Cumulative BeforeFirst
+            ON Bounds.ProductKey = BeforeFirst.ProductKey AND Bounds.FirstKey > BeforeFirst.DateKey;
+        """)
+
         # --- Global Product Performance (6-Month usage) ---
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_product_performance_global AS
-        WITH DateThresholds AS (
-            SELECT 
-                CAST(strftime(CURRENT_DATE - INTERVAL '30 days', '%Y%m%d') AS INTEGER) as key_30d,
-                CAST(strftime(CURRENT_DATE - INTERVAL '6 months', '%Y%m%d') AS INTEGER) as key_6m,
-                CAST(strftime(CURRENT_DATE - INTERVAL '12 months', '%Y%m%d') AS INTEGER) as key_12m
-            ),
-            LatestGlobalProductStock AS (
-                -- Find the latest snapshot for each product per location
-                SELECT 
-                    ProductKey,
-                    LocationKey,
-                    AbsoluteQuantity,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY ProductKey, LocationKey 
-                        ORDER BY DateKey DESC, TransactionID DESC
-                    ) as latest_rank
-                FROM dw.Fact_Inventory_Transactions
-            ),
-            GlobalStockLevels AS (
-                -- Sum the latest counts across ALL locations
+        WITH GlobalStockLevels AS (
+                -- Sum the latest counts across ALL locations (dw.Current_Stock, kept by the fact load)
                 SELECT 
                     ProductKey,
                     SUM(AbsoluteQuantity) as TotalGlobalStock
-                FROM LatestGlobalProductStock
-                WHERE latest_rank = 1
+                FROM dw.Current_Stock
                 GROUP BY ProductKey
+            ),
+            ProductUsage AS (
+                -- Trailing windows from the cumulative usage series, not a rescan of the fact
+                SELECT 
+                    Usage30d.ProductKey,
+                    Usage30d.WindowConsumed AS Usage30d,
+                    Usage6m.WindowConsumed AS Usage6m,
+                    Usage12m.WindowConsumed AS Usage12m
+                FROM dw.product_usage_window({KEY_30D}) Usage30d
+                JOIN dw.product_usage_window({KEY_6M}) Usage6m ON Usage30d.ProductKey = Usage6m.ProductKey
+                JOIN dw.product_usage_window({KEY_12M}) Usage12m ON Usage30d.ProductKey = Usage12m.ProductKey
             )
         SELECT 
             dw.Dim_Product.ProductID,
@@ -265,26 +288,20 @@ def create_analytics_views():
             dw.Dim_Product.CategoryName,
             dw.Dim_Product.UnitOfMeasure,
             dw.Dim_Product.Description,
-            SUM(CASE WHEN dw.Fact_Inventory_Transactions.QuantityDelta < 0 
-                    AND dw.Fact_Inventory_Transactions.DateKey >= (SELECT key_30d FROM DateThresholds) 
-                    THEN ABS(dw.Fact_Inventory_Transactions.QuantityDelta) ELSE 0 END) AS Usage30d,
-            SUM(CASE WHEN dw.Fact_Inventory_Transactions.QuantityDelta < 0 
-                    AND dw.Fact_Inventory_Transactions.DateKey >= (SELECT key_6m FROM DateThresholds) 
-                    THEN ABS(dw.Fact_Inventory_Transactions.QuantityDelta) ELSE 0 END) AS Usage6m,
-            SUM(CASE WHEN dw.Fact_Inventory_Transactions.QuantityDelta < 0 
-                    AND dw.Fact_Inventory_Transactions.DateKey >= (SELECT key_12m FROM DateThresholds) 
-                    THEN ABS(dw.Fact_Inventory_Transactions.QuantityDelta) ELSE 0 END) AS Usage12m,
+            COALESCE(SUM(ProductUsage.Usage30d), 0) AS Usage30d,
+            COALESCE(SUM(ProductUsage.Usage6m), 0) AS Usage6m,
+            COALESCE(SUM(ProductUsage.Usage12m), 0) AS Usage12m,
             -- Global Balance: Sum of all transactions. 
             MAX(GlobalStockLevels.TotalGlobalStock) AS GlobalStockBalance
         FROM dw.Dim_Product
-        JOIN dw.Fact_Inventory_Transactions ON dw.Dim_Product.ProductKey = dw.Fact_Inventory_Transactions.ProductKey
-        LEFT JOIN GlobalStockLevels ON dw.Dim_Product.ProductKey = GlobalStockLevels.ProductKey
+        JOIN GlobalStockLevels ON dw.Dim_Product.ProductKey = GlobalStockLevels.ProductKey  -- products with any transaction
+        LEFT JOIN ProductUsage ON dw.Dim_Product.ProductKey = ProductUsage.ProductKey
         GROUP BY 1, 2, 3, 4, 5
         ORDER BY Usage30d DESC;
         """)
 
         # --- 6. Product x Location Matrix ---
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_product_location_matrix AS
         SELECT 
             Dim_Product.ProductName,
@@ -295,7 +312,7 @@ def create_analytics_views():
                         THEN Fact_Inventory_Transactions.QuantityDelta 
                         ELSE 0 END)) AS QuantityConsumed,
             SUM(Fact_Inventory_Transactions.QuantityDelta) AS CurrentLocalStock
-        FROM dw.Fact_Inventory_Transactions
+        FROM {fact}
         JOIN dw.Dim_Product  ON Fact_Inventory_Transactions.ProductKey = dw.Dim_Product.ProductKey
         JOIN dw.Dim_Location ON Fact_Inventory_Transactions.LocationKey = dw.Dim_Location.LocationKey
         GROUP BY 
@@ -306,26 +323,26 @@ def create_analytics_views():
         """)
 
         # --- 6A.  Global Product Distribution ---
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_product_distribution_detailed AS
         WITH ProductThresholds AS (
             SELECT ProductKey, MAX(AbsoluteQuantity) * 0.20 as LowThreshold
-            FROM dw.Fact_Inventory_Transactions GROUP BY ProductKey
+            FROM {fact} GROUP BY ProductKey
         ),
         LocalUsage AS (
+            -- Only the last year is read; pairs without usage in it come back NULL (COALESCEd below)
             SELECT ProductKey, LocationKey,
-                SUM(CASE WHEN QuantityDelta < 0 AND DateKey >= CAST(strftime(CURRENT_DATE - INTERVAL '30 days', '%Y%m%d') AS INTEGER) 
-                            THEN ABS(QuantityDelta) ELSE 0 END) as LocalUsage1M,
-                SUM(CASE WHEN QuantityDelta < 0 AND DateKey >= CAST(strftime(CURRENT_DATE - INTERVAL '6 months', '%Y%m%d') AS INTEGER) 
-                            THEN ABS(QuantityDelta) ELSE 0 END) as LocalUsage6M,
-                SUM(CASE WHEN QuantityDelta < 0 AND DateKey >= CAST(strftime(CURRENT_DATE - INTERVAL '1 year', '%Y%m%d') AS INTEGER) 
-                            THEN ABS(QuantityDelta) ELSE 0 END) as LocalUsage1Y
-            FROM dw.Fact_Inventory_Transactions GROUP BY 1, 2
+                SUM(CASE WHEN DateKey >= {KEY_30D} THEN ABS(QuantityDelta) ELSE 0 END) as LocalUsage1M,
+                SUM(CASE WHEN DateKey >= {KEY_6M} THEN ABS(QuantityDelta) ELSE 0 END) as LocalUsage6M,
+                SUM(ABS(QuantityDelta)) as LocalUsage1Y
+            FROM {fact}
+            WHERE QuantityDelta < 0 AND DateKey >= {KEY_12M} {month_filter(fact, KEY_12M)}
+            GROUP BY 1, 2
         ),
         LatestState AS ( --inventory = flow (how much moved) and state (how much left)
-            SELECT ProductKey, LocationKey, AbsoluteQuantity,
-                   ROW_NUMBER() OVER (PARTITION BY ProductKey, LocationKey ORDER BY DateKey DESC, TransactionID DESC) as r
-            FROM dw.Fact_Inventory_Transactions --ledger of every move 
+            -- one row per product/location with any transaction, kept by the fact load
+            SELECT ProductKey, LocationKey, AbsoluteQuantity
+            FROM dw.Current_Stock
         )
         SELECT 
             dw.Dim_Product.ProductName,
@@ -333,23 +350,21 @@ def create_analytics_views():
             dw.Dim_Location.SiteName || ' › ' || dw.Dim_Location.Building as LocationPath,
             dw.Dim_Location.RoomNumber,
             MAX(LatestState.AbsoluteQuantity) as CurrentStock,
-            MAX(LocalUsage.LocalUsage1Y) as LocalUsage1Y,
+            COALESCE(MAX(LocalUsage.LocalUsage1Y), 0) as LocalUsage1Y,
             CEIL(MAX(ProductThresholds.LowThreshold)) as Threshold,
             (MAX(LatestState.AbsoluteQuantity) - CEIL(MAX(ProductThresholds.LowThreshold))) as StockBuffer
-        FROM dw.Fact_Inventory_Transactions
-        JOIN dw.Dim_Product ON dw.Fact_Inventory_Transactions.ProductKey = dw.Dim_Product.ProductKey
-        JOIN dw.Dim_Location ON dw.Fact_Inventory_Transactions.LocationKey = dw.Dim_Location.LocationKey
-        JOIN LatestState ON dw.Fact_Inventory_Transactions.ProductKey = LatestState.ProductKey 
-             AND dw.Fact_Inventory_Transactions.LocationKey = LatestState.LocationKey AND LatestState.r = 1
-        LEFT JOIN LocalUsage ON dw.Fact_Inventory_Transactions.ProductKey = LocalUsage.ProductKey 
-             AND dw.Fact_Inventory_Transactions.LocationKey = LocalUsage.LocationKey
-        LEFT JOIN ProductThresholds ON dw.Fact_Inventory_Transactions.ProductKey = ProductThresholds.ProductKey
+        FROM LatestState
+        JOIN dw.Dim_Product ON LatestState.ProductKey = dw.Dim_Product.ProductKey
+        JOIN dw.Dim_Location ON LatestState.LocationKey = dw.Dim_Location.LocationKey
+        LEFT JOIN LocalUsage ON LatestState.ProductKey = LocalUsage.ProductKey 
+             AND LatestState.LocationKey = LocalUsage.LocationKey
+        LEFT JOIN ProductThresholds ON LatestState.ProductKey = ProductThresholds.ProductKey
         GROUP BY 1, 2, 3, 4;
         """)
         
 
         # --- 7. User x Product Consumption (Accountability)   
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_user_product_consumption AS
         SELECT 
             Dim_User.UserName,
@@ -360,7 +375,7 @@ def create_analytics_views():
                         THEN Fact_Inventory_Transactions.QuantityDelta 
                         ELSE 0 END)) AS TotalQuantityConsumed,
             COUNT(Fact_Inventory_Transactions.TransactionID) AS TotalActions
-        FROM dw.Fact_Inventory_Transactions
+        FROM {fact}
         JOIN dw.Dim_User ON Fact_Inventory_Transactions.UserKey = dw.Dim_User.UserKey
         JOIN dw.Dim_Product ON Fact_Inventory_Transactions.ProductKey = dw.Dim_Product.ProductKey
         GROUP BY 
@@ -371,7 +386,7 @@ def create_analytics_views():
         ORDER BY TotalQuantityConsumed DESC;
         """)
         # --- 8. Daily Inventory Movement Log (The Audit Trail) 
-        conn.execute("""
+        views.define(f"""
         CREATE OR REPLACE VIEW dw.v_movement_log AS
         SELECT 
             Dim_Date.FullDate,
@@ -383,7 +398,7 @@ def create_analytics_views():
             Fact_Inventory_Transactions.QuantityDelta,
             Fact_Inventory_Transactions.AbsoluteQuantity AS NewQuantity,
             Fact_Inventory_Transactions.CurrentStockSnapshot
-        FROM dw.Fact_Inventory_Transactions
+        FROM {fact}
         JOIN dw.Dim_Date ON Fact_Inventory_Transactions.DateKey = dw.Dim_Date.DateKey
         JOIN dw.Dim_Product ON Fact_Inventory_Transactions.ProductKey = dw.Dim_Product.ProductKey
         JOIN dw.Dim_Location ON Fact_Inventory_Transactions.LocationKey = dw.Dim_Location.LocationKey
@@ -391,13 +406,16 @@ def create_analytics_views():
         ORDER BY Dim_Date.FullDate DESC;
         """)
         
-        print("✅ Analytics Views created in dw schema.")
+        counts = views.summary()
+        print(f"✅ Analytics Views in dw schema: {counts['created']} created, {counts['unchanged']} unchanged.")
+        return counts
 
     except Exception as e:
         print(f"❌ Error creating views: {e}")
         raise
     finally:
-        conn.close()
+        if own_conn:
+            conn.close()
 
 if __name__ == "__main__":
     create_analytics_views()
\ No newline at end of file
@@ -1,5 +1,6 @@
 import duckdb
 from pathlib import Path
+from analytics.data.connect_db import WAREHOUSE_DB
 
 """
 THIS IS THE WAREHOUSE INITIALIZATION FILE. 
@@ -9,25 +10,27 @@ IT DOES NOT LOAD ANY DATA. THAT HAPPENS IN THE ETL STEP.
 
 # Paths
 PROJECT_ROOT = Path(__file__).resolve().parent
-DB_PATH = PROJECT_ROOT / "warehouse.duckdb"
+DB_PATH = WAREHOUSE_DB  # analytics/warehouse/warehouse.duckdb unless LABHUB_WAREHOUSE_DB is set
 SCHEMA_SQL_PATH = PROJECT_ROOT / "warehouse_schema.sql"
 
-def init_warehouse():
+def init_warehouse(db_path=None):
+    """Deletes and recreates the warehouse file (DB_PATH by default, e.g. a scratch file for benchmarks)."""
+    db_path = Path(db_path) if db_path else DB_PATH
 
-    if DB_PATH.exists():
+    if db_path.exists():
         try:
-            DB_PATH.unlink()
-            print(f"⚠️ Existing warehouse found and deleted: {DB_PATH}")
+            db_path.unlink()
+            print(f"⚠️ Existing warehouse found and deleted: {db_path}")
         except PermissionError:
-            print(f"❌ Permission denied when trying to delete existing warehouse at {DB_PATH}.")
+            print(f"❌ Permission denied when trying to delete existing warehouse at {db_path}.")
             print("Please close any applications that might be using the file and try again.")
             return
         
     # Ensure data folder exists
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Connect to DuckDB
-    conn = duckdb.connect(str(DB_PATH))
+    conn = duckdb.connect(str(db_path))
 
     try:
         # Read DDL
@@ -41,7 +44,7 @@ def init_warehouse():
             if clean_sql:
                 conn.execute(clean_sql)
         
-        print(f"✅ Warehouse initialized at: {DB_PATH}")
+        print(f"✅ Warehouse initialized at: {db_path}")
 
         #IMMEDIATE VERIFICATION (Inside the same connection)
         print("\n--- Verifying Tables ---")
@@ -0,0 +1,74 @@
+"""
+Definition-hash tracking for the analytics views (and the table macros they use).
+
+create_analytics_views() used to re-issue every CREATE OR REPLACE VIEW after each load, on a
+connection of its own, although the view SQL rarely changes between runs. Each statement now
+goes through ViewManager.define(), which hashes the (whitespace-normalized) statement and
+compares it with the hash stored in dw.etl_view_state at the last creation. Only views whose
+SQL changed, or that no longer exist, are recreated.
+
+The stored aggregates the views read (dw.Current_Stock, dw.Fact_Inventory_Daily) are refreshed
+by the fact load from the run's delta, so an unchanged view already sees the new rows.
+"""
+
+import hashlib
+import re
+
+VIEW_STATE_TABLE = "dw.etl_view_state"
+
+_VIEW_NAME = re.compile(r"CREATE\s+OR\s+REPLACE\s+(?:VIEW|MACRO)\s+([\w.]+)", re.IGNORECASE)
+
+
+def ensure_view_state_table(conn):
+    """Creates dw.etl_view_state on warehouses initialized before it existed."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VIEW_STATE_TABLE} (
+            ViewName VARCHAR(128) PRIMARY KEY,
+            DefinitionHash VARCHAR(64) NOT NULL,
+            UpdatedAt TIMESTAMP NOT NULL
+        );
+    """)
+
+
+def definition_hash(statement: str) -> str:
+    """sha256 of a view statement with its whitespace collapsed, so re-indenting is not a change."""
+    return hashlib.sha256(" ".join(statement.split()).encode("utf-8")).hexdigest()
+
+
+class ViewManager:
+    """Creates views on an open warehouse connection, skipping those whose definition is unchanged."""
+
+    def __init__(self, conn, force: bool = False):
+        self.conn = conn
+        self.force = force
+        ensure_view_state_table(conn)
+        self.stored = dict(conn.execute(f"SELECT ViewName, DefinitionHash FROM {VIEW_STATE_TABLE}").fetchall())
+        self.existing = {
+            f"{schema}.{name}".lower()
+            for schema, name in conn.execute("""
+                SELECT schema_name, view_name FROM duckdb_views() WHERE NOT internal
+                UNION ALL
+                SELECT schema_name, function_name FROM duckdb_functions() WHERE function_type IN ('macro', 'table_macro') AND NOT internal
+            """).fetchall()
+        }
+        self.created, self.unchanged = [], []
+
+    def define(self, statement: str) -> bool:
+        """Runs a CREATE OR REPLACE VIEW / MACRO statement unless the same definition is already in place."""
+        name = _VIEW_NAME.search(statement).group(1).lower()
+        digest = definition_hash(statement)
+        if not self.force and self.stored.get(name) == digest and name in self.existing:
+            self.unchanged.append(name)
+            return False
+
+        self.conn.execute(statement)
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {VIEW_STATE_TABLE} VALUES (?, ?, current_timestamp)", [name, digest]
+        )
+        self.stored[name] = digest
+        self.existing.add(name)
+        self.created.append(name)
+        return True
+
+    def summary(self) -> dict:
+        return {"created": len(self.created), "unchanged": len(self.unchanged)}
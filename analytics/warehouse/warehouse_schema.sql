@@ -34,7 +34,11 @@ CREATE TABLE IF NOT EXISTS dw.Dim_Product (
     ProductName VARCHAR(128) NOT NULL,
     CategoryName VARCHAR(64) NOT NULL,
     UnitOfMeasure VARCHAR(64) NOT NULL,
-    Description TEXT
+    Description TEXT,
+    RowHash UBIGINT,                      -- hash of the tracked attributes, see analytics/etl/upsert.py
+    EffectiveFrom TIMESTAMP DEFAULT TIMESTAMP '1900-01-01 00:00:00',  -- SCD2 version validity
+    EffectiveTo TIMESTAMP,                -- NULL for the current version
+    IsCurrent BOOLEAN DEFAULT TRUE
 );
 
 -- =========================
@@ -46,7 +50,11 @@ CREATE TABLE IF NOT EXISTS dw.Dim_Location (
     SiteName VARCHAR(256),
     Building VARCHAR(256),
     RoomNumber VARCHAR(256),
-    StorageType VARCHAR(32)
+    StorageType VARCHAR(32),
+    RowHash UBIGINT,                      -- hash of the tracked attributes, see analytics/etl/upsert.py
+    EffectiveFrom TIMESTAMP DEFAULT TIMESTAMP '1900-01-01 00:00:00',  -- SCD2 version validity
+    EffectiveTo TIMESTAMP,                -- NULL for the current version
+    IsCurrent BOOLEAN DEFAULT TRUE
 );
 
 -- =========================
@@ -57,7 +65,11 @@ CREATE TABLE IF NOT EXISTS dw.Dim_User (
     UserID INT NOT NULL,
     UserName VARCHAR(128) NOT NULL,
     UserRole VARCHAR(64) NOT NULL,
-    DepartmentName VARCHAR(255) NOT NULL
+    DepartmentName VARCHAR(255) NOT NULL,
+    RowHash UBIGINT,                      -- hash of the tracked attributes, see analytics/etl/upsert.py
+    EffectiveFrom TIMESTAMP DEFAULT TIMESTAMP '1900-01-01 00:00:00',  -- SCD2 version validity
+    EffectiveTo TIMESTAMP,                -- NULL for the current version
+    IsCurrent BOOLEAN DEFAULT TRUE
 );
 
 -- =========================
@@ -86,4 +98,116 @@ CREATE TABLE IF NOT EXISTS dw.Fact_Inventory_Transactions (
 
     CONSTRAINT fk_fact_user
         FOREIGN KEY (UserKey) REFERENCES dw.Dim_User(UserKey)
-);
\ No newline at end of file
+);
+
+-- =========================
+-- Quarantine: fact events with unresolved keys
+-- =========================
+CREATE TABLE IF NOT EXISTS dw.Fact_Inventory_Rejects (
+    TransactionID BIGINT NOT NULL,        -- From inventory.StockEvent.StockEventID
+    ProductID INT,
+    LocationID INT,
+    UserID INT,
+    EventDate TIMESTAMP,
+    OldQuantity DECIMAL(12,2),
+    NewQuantity DECIMAL(12,2),
+    EventType VARCHAR(32),
+    CurrentStockSnapshot DECIMAL(12,2),
+    RejectReason VARCHAR(128) NOT NULL,   -- e.g. MISSING_PRODUCT,MISSING_USER
+    RejectedAt TIMESTAMP NOT NULL,
+    RetryCount INTEGER DEFAULT 0,         -- runs that re-checked the event since it was quarantined
+    LastRetriedAt TIMESTAMP
+);
+
+-- Latest stock level per product and location, maintained by the fact load
+CREATE TABLE IF NOT EXISTS dw.Current_Stock (
+    ProductKey INT NOT NULL,
+    LocationKey INT NOT NULL,
+    AbsoluteQuantity DECIMAL(12,2) NOT NULL,
+    DateKey INT NOT NULL,                 -- DateKey and TransactionID of the latest event
+    TransactionID INT NOT NULL,
+    PRIMARY KEY (ProductKey, LocationKey)
+);
+
+-- Fact rolled up per product, location, user and day, maintained by the fact load
+CREATE TABLE IF NOT EXISTS dw.Fact_Inventory_Daily (
+    ProductKey INT NOT NULL,
+    LocationKey INT NOT NULL,
+    UserKey INT NOT NULL,
+    DateKey INT NOT NULL,
+    TotalQuantityConsumed DECIMAL(18,2) NOT NULL,  -- units taken out (positive)
+    TransactionCount BIGINT NOT NULL,              -- consumption events
+    ReplenishmentCount BIGINT NOT NULL,            -- restock events
+    NetStockChange DECIMAL(18,2) NOT NULL,
+    PRIMARY KEY (ProductKey, LocationKey, UserKey, DateKey)
+);
+
+-- Running consumption total per product (days with consumption only), maintained by the fact load
+CREATE TABLE IF NOT EXISTS dw.Product_Usage_Cumulative (
+    ProductKey INT NOT NULL,
+    DateKey INT NOT NULL,
+    DailyConsumed DECIMAL(18,2) NOT NULL,
+    CumulativeConsumed DECIMAL(18,2) NOT NULL,   -- units consumed on or before DateKey
+    PRIMARY KEY (ProductKey, DateKey)
+);
+
+-- =========================
+-- Control: ETL watermarks
+-- =========================
+CREATE TABLE IF NOT EXISTS dw.etl_watermark (
+    SourceName VARCHAR(64) PRIMARY KEY,   -- e.g. inventory.StockEvent
+    LastEventID BIGINT,                   -- highest source ID loaded so far
+    LastEventDate TIMESTAMP,              -- highest source event date loaded so far
+    UpdatedAt TIMESTAMP NOT NULL
+);
+
+-- =========================
+-- Control: ETL run log
+-- =========================
+CREATE TABLE IF NOT EXISTS dw.etl_run_log (
+    RunID VARCHAR(32) NOT NULL,           -- one id per pipeline run
+    Stage VARCHAR(128) NOT NULL,          -- e.g. Dim_Product.load, Fact_Inventory, DQ.all
+    ParentStage VARCHAR(128),             -- enclosing stage, NULL for Pipeline
+    Status VARCHAR(16) NOT NULL,          -- ok, error, failed (DQ) or rolled_back
+    Calls INTEGER NOT NULL,               -- spans aggregated (streamed transforms run per batch)
+    RowsIn BIGINT,
+    RowsOut BIGINT,
+    Bytes BIGINT,                         -- in-memory Arrow/pandas bytes, where known
+    DurationSeconds DOUBLE NOT NULL,
+    StartedAt TIMESTAMP NOT NULL,
+    ThreadName VARCHAR(64)
+);
+
+-- =========================
+-- Control: dimension source fingerprints
+-- =========================
+CREATE TABLE IF NOT EXISTS dw.etl_fingerprint (
+    DimensionName VARCHAR(64) PRIMARY KEY,  -- e.g. Dim_Product
+    Fingerprint VARCHAR(128) NOT NULL,      -- source row count and checksum at the last load
+    UpdatedAt TIMESTAMP NOT NULL
+);
+
+-- =========================
+-- Control: analytics view definitions
+-- =========================
+CREATE TABLE IF NOT EXISTS dw.etl_view_state (
+    ViewName VARCHAR(128) PRIMARY KEY,      -- e.g. dw.v_monthly_usage
+    DefinitionHash VARCHAR(64) NOT NULL,    -- sha256 of the CREATE statement at the last creation
+    UpdatedAt TIMESTAMP NOT NULL
+);
+
+-- =========================
+-- Control: data quality results
+-- =========================
+CREATE TABLE IF NOT EXISTS dw.dq_results (
+    RunID VARCHAR(32),                    -- dw.etl_run_log RunID, NULL for standalone audits
+    CheckedAt TIMESTAMP NOT NULL,
+    Scope VARCHAR(16) NOT NULL,           -- dimensions, facts, all or delta
+    CheckName VARCHAR(160) NOT NULL,      -- rule name, plus [new rows] / [spot check] in delta audits
+    TableName VARCHAR(128),
+    Severity VARCHAR(16),                 -- critical or warning
+    Status VARCHAR(16) NOT NULL,          -- PASS, FAIL, WARN, ERROR or TIMEOUT
+    Value BIGINT,
+    Error VARCHAR,
+    DurationSeconds DOUBLE                -- duration of the query the rule ran in
+);
@@ -35,28 +35,16 @@ def show_stock_detail(product_id, db_path):
     
 
     location_df = conn.execute("""
-    WITH LatestState AS (
-        SELECT 
-            ProductKey,
-            LocationKey,
-            AbsoluteQuantity,
-            ROW_NUMBER() OVER (
-                PARTITION BY ProductKey, LocationKey
-                ORDER BY DateKey DESC, TransactionID DESC
-            ) AS r
-        FROM dw.Fact_Inventory_Transactions
-    )
     SELECT 
         dl.SiteName AS LocationPath,
-        CAST(ls.AbsoluteQuantity AS INT) AS CurrentStock
-    FROM LatestState ls
+        CAST(cs.AbsoluteQuantity AS INT) AS CurrentStock
+    FROM dw.Current_Stock cs -- latest AbsoluteQuantity per product/location, kept by the ETL
     JOIN dw.Dim_Product dp 
-        ON ls.ProductKey = dp.ProductKey
+        ON cs.ProductKey = dp.ProductKey
     JOIN dw.Dim_Location dl
-        ON ls.LocationKey = dl.LocationKey
+        ON cs.LocationKey = dl.LocationKey
     WHERE dp.ProductID = ?
-      AND ls.r = 1
-      AND ls.AbsoluteQuantity > 0
+      AND cs.AbsoluteQuantity > 0
 """, [product_id]).df()
 
 
@@ -71,7 +59,7 @@ def show_stock_detail(product_id, db_path):
     
     description_row = conn.execute("""
         SELECT Description 
-        FROM dw.Dim_Product WHERE ProductID = ?
+        FROM dw.Dim_Product WHERE ProductID = ? AND IsCurrent
     """, [product_id]).fetchone()
 
     description = description_row[0] if description_row else None
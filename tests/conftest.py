@@ -0,0 +1,15 @@
+import duckdb
+import pytest
+
+from analytics.warehouse.init_warehouse import SCHEMA_SQL_PATH
+
+
+@pytest.fixture
+def warehouse():
+    """In-memory warehouse with the full dw schema and no rows."""
+    conn = duckdb.connect()
+    for statement in SCHEMA_SQL_PATH.read_text(encoding="utf-8").split(";"):
+        if statement.strip():
+            conn.execute(statement)
+    yield conn
+    conn.close()
@@ -0,0 +1,56 @@
+"""Row builders for the in-memory warehouse fixture (see conftest.py)."""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pyarrow as pa
+
+
+def add_dates(conn, first: date, last: date):
+    """Fills dw.Dim_Date for every day from `first` to `last`."""
+    days = (last - first).days + 1
+    conn.executemany(
+        "INSERT INTO dw.Dim_Date VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (int(day.strftime("%Y%m%d")), day, day.day, day.month, day.strftime("%B"),
+             (day.month - 1) // 3 + 1, day.year, day.strftime("%A"))
+            for day in (first + timedelta(days=i) for i in range(days))
+        ],
+    )
+
+
+def add_products(conn, *product_ids):
+    conn.executemany(
+        "INSERT INTO dw.Dim_Product (ProductID, ProductName, CategoryName, UnitOfMeasure) VALUES (?, ?, 'Glass', 'ea')",
+        [(product_id, f"Product {product_id}") for product_id in product_ids],
+    )
+
+
+def add_locations(conn, *location_ids):
+    conn.executemany(
+        "INSERT INTO dw.Dim_Location (LocationID, SiteName, Building, RoomNumber, StorageType) VALUES (?, 'Main', 'A', ?, 'Shelf')",
+        [(location_id, str(location_id)) for location_id in location_ids],
+    )
+
+
+def add_users(conn, *user_ids):
+    conn.executemany(
+        "INSERT INTO dw.Dim_User (UserID, UserName, UserRole, DepartmentName) VALUES (?, ?, 'Tech', 'Lab')",
+        [(user_id, f"User {user_id}") for user_id in user_ids],
+    )
+
+
+def events(*rows):
+    """Source events shaped like the fact extract: (TransactionID, ProductID, LocationID, UserID, EventDate)."""
+    columns = list(zip(*rows))
+    return pa.table({
+        "TransactionID": pa.array(columns[0], pa.int64()),
+        "ProductID": pa.array(columns[1], pa.int64()),
+        "LocationID": pa.array(columns[2], pa.int64()),
+        "UserID": pa.array(columns[3], pa.int64()),
+        "EventDate": pa.array(columns[4], pa.timestamp("us")),
+        "OldQuantity": pa.array([Decimal("5.00")] * len(rows), pa.decimal128(12, 2)),
+        "NewQuantity": pa.array([Decimal("3.00")] * len(rows), pa.decimal128(12, 2)),
+        "EventType": pa.array(["Remove"] * len(rows)),
+        "CurrentStockSnapshot": pa.array([Decimal("3.00")] * len(rows), pa.decimal128(12, 2)),
+    })
@@ -0,0 +1,47 @@
+import duckdb
+
+from analytics.etl.change_detection import fingerprint_query
+from analytics.etl.dimensions.dim_product import EXTRACT_QUERY
+
+
+def _call_args(sql, function):
+    """The argument text of every `function(...)` call in `sql`."""
+    args, start = [], sql.find(f"{function}(")
+    while start != -1:
+        depth, i = 0, start + len(function)
+        for i in range(i, len(sql)):
+            depth += {"(": 1, ")": -1}.get(sql[i], 0)
+            if depth == 0:
+                break
+        args.append(sql[start + len(function) + 1:i])
+        start = sql.find(f"{function}(", i)
+    return args
+
+
+def test_sql_server_fingerprint_has_no_subquery_in_an_aggregate():
+    sql = fingerprint_query(EXTRACT_QUERY, "mssql")
+
+    # Msg 130: SQL Server cannot aggregate an expression containing a subquery
+    for function in ("SUM", "COUNT_BIG"):
+        for arg in _call_args(sql, function):
+            assert "SELECT" not in arg.upper()
+    assert _call_args(sql, "SUM") == ["CAST(CAST(CAST(row_hash.RowHash AS BINARY(8)) AS BIGINT) AS DECIMAL(38, 0))"]
+
+    # The per-row hash is computed in the CROSS APPLY, over the whole extract row
+    apply = sql[sql.index("CROSS APPLY"):]
+    assert "HASHBYTES('SHA2_256'" in apply
+    assert "SELECT src.* FOR JSON PATH, WITHOUT_ARRAY_WRAPPER, INCLUDE_NULL_VALUES" in apply
+    assert f"FROM ({EXTRACT_QUERY.strip().rstrip(';')}) src" in sql
+    assert ";" not in sql
+
+
+def test_local_fingerprint_is_order_independent():
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE t AS SELECT i AS id, 'p' || i AS name FROM range(100) r(i);")
+
+    ascending = conn.execute(fingerprint_query("SELECT * FROM t ORDER BY id", "local")).fetchone()
+    descending = conn.execute(fingerprint_query("SELECT * FROM t ORDER BY id DESC;", "local")).fetchone()
+    assert ascending == descending and ascending[0] == 100
+
+    conn.execute("UPDATE t SET name = 'changed' WHERE id = 7;")
+    assert conn.execute(fingerprint_query("SELECT * FROM t", "local")).fetchone() != ascending
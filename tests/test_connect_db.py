@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from analytics.data.connect_db import OLTPConnectionPool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, query):
+        if not self._conn.healthy:
+            raise RuntimeError("connection is broken")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.healthy = True
+        self.rollback_fails = False
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.rollback_fails:
+            raise RuntimeError("rollback failed")
+
+    def close(self):
+        self.closed = True
+
+
+def _acquire_in_thread(pool):
+    """Starts a thread blocked in pool.acquire(); returns (thread, result dict)."""
+    result = {}
+
+    def run():
+        start = time.monotonic()
+        try:
+            result["conn"] = pool.acquire()
+        except Exception as e:
+            result["error"] = e
+        result["seconds"] = time.monotonic() - start
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    deadline = time.monotonic() + 2
+    while pool.stats()["waits"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.stats()["waits"] == 1, "the thread never started waiting"
+    return thread, result
+
+
+def test_waiter_is_woken_when_release_discards():
+    pool = OLTPConnectionPool(connect=FakeConnection, max_size=1, timeout=5)
+    held = pool.acquire()
+    thread, result = _acquire_in_thread(pool)
+
+    held._conn.rollback_fails = True   # release() discards instead of returning it to the idle stack
+    held.close()
+    thread.join(timeout=5)
+
+    assert "conn" in result and result["seconds"] < 2
+    assert pool.stats() == {"created": 2, "reused": 0, "discarded": 1, "waits": 1,
+                            "wait_seconds": pytest.approx(result["seconds"], abs=0.5), "open": 1, "idle": 0}
+
+
+def test_threads_sharing_a_small_pool_never_time_out_when_connections_are_discarded():
+    pool = OLTPConnectionPool(connect=FakeConnection, max_size=2, timeout=3)
+    errors = []
+
+    def worker(n):
+        for i in range(30):
+            try:
+                conn = pool.acquire()
+            except TimeoutError as e:
+                errors.append(e)
+                return
+            time.sleep(0.001)
+            conn._conn.rollback_fails = (n + i) % 3 == 0   # every third release discards
+            conn.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert not errors
+    stats = pool.stats()
+    assert stats["discarded"] == 80 and stats["open"] <= 2 and stats["open"] == stats["idle"]
+
+
+def test_acquire_times_out_when_the_pool_stays_full():
+    pool = OLTPConnectionPool(connect=FakeConnection, max_size=1, timeout=0.2)
+    pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    assert pool.stats()["open"] == 1
+
+
+def test_close_all_discards_idle_connections():
+    pool = OLTPConnectionPool(connect=FakeConnection, max_size=2, timeout=1)
+    conns = [pool.acquire(), pool.acquire()]
+    raw = [c._conn for c in conns]
+    for c in conns:
+        c.close()
+    pool.close_all()
+
+    assert all(c.closed for c in raw)
+    assert pool.stats()["open"] == 0 and pool.stats()["idle"] == 0
+    assert pool.acquire()._conn not in raw
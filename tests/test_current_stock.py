@@ -0,0 +1,41 @@
+import duckdb
+import pytest
+
+from analytics.etl.facts.current_stock import CURRENT_STOCK_TABLE, refresh_current_stock
+
+
+@pytest.fixture
+def duck_conn():
+    conn = duckdb.connect()
+    conn.execute("CREATE SCHEMA dw;")
+    conn.execute("""
+        CREATE TABLE dw.Fact_Inventory_Transactions (
+            TransactionID INT PRIMARY KEY,
+            DateKey INT NOT NULL,
+            ProductKey INT NOT NULL,
+            LocationKey INT NOT NULL,
+            AbsoluteQuantity DECIMAL(12,2) NOT NULL
+        );
+    """)
+    conn.execute("""
+        INSERT INTO dw.Fact_Inventory_Transactions VALUES
+            (1, 20250101, 1, 42, 10), (2, 20250102, 1, 42, 7),
+            (3, 20250101, 2, 42, 5), (4, 20250103, 2, 43, 9);
+    """)
+    conn.execute("CREATE TEMP VIEW tmp_fact_delta AS SELECT * FROM dw.Fact_Inventory_Transactions;")
+    yield conn
+    conn.close()
+
+
+def test_full_refresh_twice_in_one_transaction(duck_conn):
+    refresh_current_stock(duck_conn, "tmp_fact_delta")   # a committed normal load first
+
+    duck_conn.execute("BEGIN TRANSACTION;")
+    assert refresh_current_stock(duck_conn, "tmp_fact_delta", full=True) == 3
+    assert refresh_current_stock(duck_conn, "tmp_fact_delta", full=True) == 3
+    duck_conn.execute("COMMIT;")
+
+    rows = duck_conn.execute(
+        f"SELECT ProductKey, LocationKey, AbsoluteQuantity, TransactionID FROM {CURRENT_STOCK_TABLE} ORDER BY ALL"
+    ).fetchall()
+    assert [(p, l, float(q), t) for p, l, q, t in rows] == [(1, 42, 7.0, 2), (2, 42, 5.0, 3), (2, 43, 9.0, 4)]
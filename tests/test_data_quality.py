@@ -0,0 +1,183 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from analytics.etl import data_quality, dq_anomalies
+from analytics.etl.data_quality import compile_checks, full_audit_due, run_dq_checks
+from analytics.etl.dq_anomalies import run_anomaly_checks
+from tests.fixtures import add_dates, add_locations, add_products, add_users
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def duck_conn(warehouse):
+    """A warehouse with one of each dimension and ten valid fact rows dated today."""
+    add_dates(warehouse, TODAY - timedelta(days=5), TODAY)
+    add_products(warehouse, 1)
+    add_locations(warehouse, 10)
+    add_users(warehouse, 100)
+    today_key = int(TODAY.strftime("%Y%m%d"))
+    warehouse.executemany(
+        "INSERT INTO dw.Fact_Inventory_Transactions VALUES (?, ?, 1, 1, 1, -1, ?, ?, 'Remove')",
+        [(transaction_id, today_key, 20 - transaction_id, 20 - transaction_id) for transaction_id in range(1, 11)],
+    )
+    return warehouse
+
+
+def _checks(report):
+    return {check["check_name"]: check["status"].split()[-1] for check in report["checks"]}
+
+
+def test_rules_on_a_table_compile_into_one_aggregate_query():
+    rules = [
+        {"name": "Negative", "aggregate": "COUNT(*) FILTER (WHERE AbsoluteQuantity < 0)"},
+        {"name": "From today", "aggregate": "COUNT(*) FILTER (WHERE DateKey = {today_key})"},
+    ]
+    sql = compile_checks("dw.Fact_Inventory_Transactions", rules, "WHERE TransactionID BETWEEN 1 AND 9")
+
+    assert sql.count("SELECT") == 1 and sql.count("FROM") == 1
+    assert 'COUNT(*) FILTER (WHERE AbsoluteQuantity < 0) AS "Negative"' in sql
+    assert f'DateKey = {TODAY.strftime("%Y%m%d")}) AS "From today"' in sql
+    assert sql.endswith("FROM dw.Fact_Inventory_Transactions WHERE TransactionID BETWEEN 1 AND 9")
+
+
+def test_clean_warehouse_passes(duck_conn):
+    report = run_dq_checks(duck_conn)
+
+    assert report["passed_all"]
+    checks = _checks(report)
+    assert checks["Negative Stock (Absolute)"] == "PASS" and checks["Data is from Today"] == "PASS"
+    # Test products have no description: a warning, which does not fail the audit
+    assert checks["Missing AI Descriptions"] == "WARN"
+
+
+def test_failing_critical_rule_fails_the_audit(duck_conn):
+    duck_conn.execute("UPDATE dw.Fact_Inventory_Transactions SET AbsoluteQuantity = -3 WHERE TransactionID IN (3, 4);")
+    report = run_dq_checks(duck_conn, scope="facts")
+
+    assert not report["passed_all"]
+    negative = next(check for check in report["checks"] if check["check_name"] == "Negative Stock (Absolute)")
+    assert negative["status"] == "❌ FAIL" and negative["value"] == 2
+    assert _checks(report)["Orphaned Products"] == "PASS"
+    assert all(check["check_name"] != "Dim_Product populated" for check in report["checks"])   # facts scope only
+
+
+def test_delta_scope_audits_the_batch_and_a_spot_check_window(duck_conn, monkeypatch):
+    # Row 2 is bad but was loaded by an earlier run; this run's delta is rows 8-10
+    duck_conn.execute("UPDATE dw.Fact_Inventory_Transactions SET AbsoluteQuantity = -5 WHERE TransactionID = 2;")
+    duck_conn.execute("CREATE TEMP VIEW tmp_fact_delta AS SELECT * FROM dw.Fact_Inventory_Transactions WHERE TransactionID >= 8;")
+    monkeypatch.setattr(data_quality, "DQ_SPOT_CHECK_ROWS", 3)
+
+    assert not run_dq_checks(duck_conn, scope="all")["passed_all"]
+
+    monkeypatch.setattr(data_quality.random, "randint", lambda low, high: 5)   # window 5-7
+    report = run_dq_checks(duck_conn, scope="delta", delta_view="tmp_fact_delta")
+    checks = _checks(report)
+    assert report["passed_all"]
+    assert checks["Negative Stock (Absolute) [new rows]"] == "PASS"
+    assert checks["Negative Stock (Absolute) [spot check]"] == "PASS"
+    assert "Negative Stock (Absolute)" not in checks
+    assert checks["Dim_Product populated"] == "PASS"
+    # Warnings are not repeated in the spot check
+    assert "Data is from Today [new rows]" in checks and "Data is from Today [spot check]" not in checks
+
+    monkeypatch.setattr(data_quality.random, "randint", lambda low, high: 1)   # window 1-3
+    report = run_dq_checks(duck_conn, scope="delta", delta_view="tmp_fact_delta")
+    assert not report["passed_all"]
+    assert _checks(report)["Negative Stock (Absolute) [spot check]"] == "FAIL"
+
+    # A bad row inside the batch fails its [new rows] check
+    duck_conn.execute("UPDATE dw.Fact_Inventory_Transactions SET AbsoluteQuantity = -1 WHERE TransactionID = 9;")
+    assert _checks(run_dq_checks(duck_conn, scope="delta", delta_view="tmp_fact_delta"))["Negative Stock (Absolute) [new rows]"] == "FAIL"
+
+
+def test_delta_scope_with_an_empty_batch(duck_conn):
+    duck_conn.execute("CREATE TEMP VIEW tmp_fact_delta AS SELECT * FROM dw.Fact_Inventory_Transactions LIMIT 0;")
+    checks = _checks(run_dq_checks(duck_conn, scope="delta", delta_view="tmp_fact_delta"))
+    assert checks["Negative Stock (Absolute) [new rows]"] == "PASS"
+    assert checks["Data is from Today [new rows]"] == "WARN"
+
+
+def _log_dq_all(conn, status, hours_ago):
+    conn.execute(
+        "INSERT INTO dw.etl_run_log VALUES ('run', 'DQ.all', 'Pipeline', ?, 1, NULL, NULL, NULL, 0.1, ?, 'MainThread')",
+        [status, datetime.now() - timedelta(hours=hours_ago)],
+    )
+
+
+def test_full_audit_due_reads_the_run_log(warehouse, monkeypatch):
+    monkeypatch.setattr(data_quality, "DQ_FULL_AUDIT_HOURS", 24)
+    assert full_audit_due(warehouse)                  # never ran
+
+    _log_dq_all(warehouse, "ok", hours_ago=30)
+    assert full_audit_due(warehouse)                  # too old
+    _log_dq_all(warehouse, "failed", hours_ago=1)
+    assert full_audit_due(warehouse)                  # recent, but did not pass
+    _log_dq_all(warehouse, "ok", hours_ago=1)
+    assert not full_audit_due(warehouse)
+
+    warehouse.execute("DROP TABLE dw.etl_run_log;")
+    assert full_audit_due(warehouse)                  # warehouse without a run log
+
+
+@pytest.fixture
+def daily_history(warehouse):
+    """40 days of steady daily rollups for product 1 at location 1, and the last 5 days of product 2 there."""
+    first = date(2025, 1, 1)
+    add_dates(warehouse, first, first + timedelta(days=40))
+    rows = []
+    for i in range(40):
+        day_key = int((first + timedelta(days=i)).strftime("%Y%m%d"))
+        removes = 4 + i % 3                                   # 4, 5, 6 events a day
+        rows.append((1, 1, 1, day_key, 10 + i % 3, removes, 1, -(10 + i % 3) + 5))
+        if i >= 35:
+            rows.append((2, 1, 1, day_key, 10, 5, 1, -5))     # too little history to score
+    warehouse.executemany("INSERT INTO dw.Fact_Inventory_Daily VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return warehouse, first
+
+
+def _touch(conn, *days):
+    """Delta view with one fact row per (ProductKey, LocationKey, DateKey)."""
+    values = ", ".join(f"({product}, {location}, {day})" for product, location, day in days)
+    conn.execute(f"CREATE OR REPLACE TEMP VIEW tmp_fact_new AS SELECT * FROM (VALUES {values}) v(ProductKey, LocationKey, DateKey);")
+
+
+def test_anomaly_scan_flags_a_crafted_outlier_day(daily_history, monkeypatch):
+    conn, first = daily_history
+    monkeypatch.setattr(dq_anomalies, "DQ_ANOMALY_METHOD", "both")
+    outlier_key = int((first + timedelta(days=40)).strftime("%Y%m%d"))
+    conn.execute(f"INSERT INTO dw.Fact_Inventory_Daily VALUES (1, 1, 1, {outlier_key}, 500, 60, 1, -495);")
+    _touch(conn, (1, 1, outlier_key))
+
+    report = run_anomaly_checks(conn, "tmp_fact_new")
+
+    assert report["passed_all"]                       # anomalies only warn
+    flagged = report["anomalies"]
+    assert set(zip(flagged["Grain"], flagged["GrainKey"], flagged["DateKey"])) == {
+        ("product", 1, outlier_key), ("location", 1, outlier_key),
+    }
+    assert {"Events", "Consumed"} <= set(flagged["Metric"])
+    checks = {check["check_name"]: check["value"] for check in report["checks"]}
+    assert checks["Event count outliers (product)"] == 1 and checks["Units consumed outliers (location)"] == 1
+    assert flagged["BaselineDays"].min() >= dq_anomalies.DQ_ANOMALY_MIN_DAYS
+
+
+def test_anomaly_scan_ignores_normal_days_and_short_histories(daily_history):
+    conn, first = daily_history
+    last_key = int((first + timedelta(days=39)).strftime("%Y%m%d"))
+    _touch(conn, (1, 1, last_key), (2, 1, last_key))
+    conn.execute(f"UPDATE dw.Fact_Inventory_Daily SET TransactionCount = 90 WHERE ProductKey = 2 AND DateKey = {last_key};")
+
+    report = run_anomaly_checks(conn, "tmp_fact_new")
+
+    # Product 2's spike has only 4 baseline days; its location is still scored as a whole
+    assert not (report["anomalies"]["Grain"] == "product").any()
+    assert all(check["status"] == "✅ PASS" for check in report["checks"] if "(product)" in check["check_name"])
+
+
+def test_anomaly_scan_of_an_empty_batch(daily_history):
+    conn, _ = daily_history
+    conn.execute("CREATE OR REPLACE TEMP VIEW tmp_fact_new AS SELECT 1 AS ProductKey, 1 AS LocationKey, 1 AS DateKey WHERE FALSE;")
+    report = run_anomaly_checks(conn, "tmp_fact_new")
+    assert report["checks"] == [] and report["anomalies"] is None
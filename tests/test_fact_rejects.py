@@ -0,0 +1,90 @@
+from datetime import date, datetime
+
+import pytest
+
+from analytics.etl.facts.fact_inventory import (
+    REJECTS_TABLE, ensure_rejects_table, load_fact_inventory, quarantine_rejected, retry_rejects,
+)
+from analytics.etl.facts.surrogate_keys import FactKeyMaps
+from tests.fixtures import add_dates, add_locations, add_products, add_users, events
+
+
+@pytest.fixture
+def duck_conn(warehouse):
+    add_dates(warehouse, date(2024, 1, 1), date(2024, 1, 31))
+    add_products(warehouse, 1)
+    add_locations(warehouse, 10)
+    add_users(warehouse, 100)
+    ensure_rejects_table(warehouse)
+    return warehouse
+
+
+def _rejects(conn):
+    return conn.execute(
+        f"SELECT TransactionID, RejectReason, RetryCount FROM {REJECTS_TABLE} ORDER BY TransactionID"
+    ).fetchall()
+
+
+def _fact_ids(conn):
+    return [row[0] for row in conn.execute("SELECT TransactionID FROM dw.Fact_Inventory_Transactions ORDER BY 1").fetchall()]
+
+
+def test_misses_are_quarantined_once(duck_conn):
+    batch = events(
+        (1, 1, 10, 100, datetime(2024, 1, 5)),
+        (2, 2, 10, 100, datetime(2024, 1, 5)),     # product 2 not loaded yet
+        (3, 1, 10, 100, datetime(2024, 2, 5)),     # day not in Dim_Date
+    )
+    counts = load_fact_inventory(duck_conn, fact_events=batch, key_maps=FactKeyMaps(duck_conn))
+
+    assert counts["inserted"] == 1 and counts["rejected"] == 2
+    assert _fact_ids(duck_conn) == [1]
+    assert _rejects(duck_conn) == [(2, "MISSING_PRODUCT", 0), (3, "MISSING_DATE", 0)]
+
+    # The lookback window re-reads the same events: nothing is quarantined twice, and
+    # events already in the fact table are never quarantined
+    key_maps = FactKeyMaps(duck_conn)
+    _, rejected = key_maps.resolve(batch)
+    assert quarantine_rejected(duck_conn, rejected) == 0
+    assert quarantine_rejected(duck_conn, None) == 0
+    assert len(_rejects(duck_conn)) == 2
+
+
+def test_reject_is_released_once_its_dimension_row_arrives(duck_conn):
+    batch = events((1, 2, 10, 100, datetime(2024, 1, 5)), (2, 3, 10, 100, datetime(2024, 1, 6)))
+    load_fact_inventory(duck_conn, fact_events=batch, key_maps=FactKeyMaps(duck_conn))
+    assert [row[0] for row in _rejects(duck_conn)] == [1, 2]
+
+    # Nothing arrived: neither reject is a candidate, so neither is touched
+    assert retry_rejects(duck_conn, FactKeyMaps(duck_conn)) == 0
+    assert _rejects(duck_conn) == [(1, "MISSING_PRODUCT", 0), (2, "MISSING_PRODUCT", 0)]
+
+    add_products(duck_conn, 2)
+    assert retry_rejects(duck_conn, FactKeyMaps(duck_conn)) == 1
+
+    assert _fact_ids(duck_conn) == [1]
+    assert duck_conn.execute(
+        "SELECT p.ProductID FROM dw.Fact_Inventory_Transactions f JOIN dw.Dim_Product p USING (ProductKey)"
+    ).fetchall() == [(2,)]
+    assert _rejects(duck_conn) == [(2, "MISSING_PRODUCT", 0)]
+
+
+def test_candidate_that_still_misses_is_counted(duck_conn):
+    # Product 2 exists, but only as a closed version, so the key maps still miss it
+    add_products(duck_conn, 2)
+    duck_conn.execute("UPDATE dw.Dim_Product SET IsCurrent = FALSE WHERE ProductID = 2;")
+    load_fact_inventory(duck_conn, fact_events=events((1, 2, 10, 100, datetime(2024, 1, 5))), key_maps=FactKeyMaps(duck_conn))
+
+    assert retry_rejects(duck_conn, FactKeyMaps(duck_conn)) == 0
+    assert _rejects(duck_conn) == [(1, "MISSING_PRODUCT", 1)]
+
+
+def test_retry_skips_rejects_older_than_the_age_limit(duck_conn):
+    load_fact_inventory(duck_conn, fact_events=events((1, 2, 10, 100, datetime(2024, 1, 5))), key_maps=FactKeyMaps(duck_conn))
+    duck_conn.execute(f"UPDATE {REJECTS_TABLE} SET RejectedAt = current_timestamp - INTERVAL 60 DAYS;")
+    add_products(duck_conn, 2)
+
+    assert retry_rejects(duck_conn, FactKeyMaps(duck_conn), max_age_days=30) == 0
+    assert len(_rejects(duck_conn)) == 1
+    assert retry_rejects(duck_conn, FactKeyMaps(duck_conn), max_age_days=0) == 1
+    assert _rejects(duck_conn) == [] and _fact_ids(duck_conn) == [1]
@@ -0,0 +1,83 @@
+import pyarrow as pa
+import pytest
+
+from analytics.etl.instrumentation import RunRecorder, timed_stage
+
+
+def _batch(rows):
+    return pa.record_batch([pa.array(range(rows), pa.int64())], names=["id"])
+
+
+BATCHES = [_batch(3), _batch(4), _batch(0)]
+
+
+@timed_stage("Test.extract")
+def stream_batches(fail_after=None):
+    for i, batch in enumerate(BATCHES):
+        if i == fail_after:
+            raise RuntimeError("connection lost")
+        yield batch
+
+
+def test_streaming_extract_emits_one_span_with_summed_rows_and_bytes():
+    with RunRecorder() as recorder:
+        batches = stream_batches()
+        assert recorder.spans == []          # the span stays open until the batches are drained
+        assert [batch.num_rows for batch in batches] == [3, 4, 0]
+
+    assert len(recorder.spans) == 1
+    span = recorder.spans[0]
+    assert span["stage"] == "Test.extract" and span["status"] == "ok"
+    assert span["rows_out"] == 7
+    assert span["bytes"] == sum(batch.nbytes for batch in BATCHES)
+
+
+def test_streaming_extract_closed_early_is_not_an_error():
+    with RunRecorder() as recorder:
+        batches = stream_batches()
+        next(batches)
+        batches.close()
+
+    assert [(span["status"], span["rows_out"]) for span in recorder.spans] == [("ok", 3)]
+
+
+def test_streaming_extract_that_fails_is_an_error():
+    with RunRecorder() as recorder:
+        with pytest.raises(RuntimeError):
+            list(stream_batches(fail_after=1))
+
+    assert [(span["status"], span["rows_out"]) for span in recorder.spans] == [("error", 3)]
+
+
+def test_write_prometheus_writes_the_stage_gauges(tmp_path):
+    @timed_stage("Dim_Product.load")
+    def load(table):
+        return table
+
+    with RunRecorder(run_id="run1") as recorder:
+        load(pa.table({"id": [1, 2]}))
+        list(stream_batches())
+        with pytest.raises(RuntimeError):
+            list(stream_batches(fail_after=0))     # same stage again: summed, and marked failed
+
+    path = tmp_path / "metrics" / "etl.prom"
+    recorder.write_prometheus(path)
+    lines = path.read_text().splitlines()
+
+    assert "# TYPE labhub_etl_stage_duration_seconds gauge" in lines
+    assert 'labhub_etl_stage_rows_in{stage="Dim_Product.load"} 2' in lines
+    assert 'labhub_etl_stage_rows_out{stage="Dim_Product.load"} 2' in lines
+    assert 'labhub_etl_stage_rows_out{stage="Test.extract"} 7' in lines
+    assert 'labhub_etl_stage_success{stage="Dim_Product.load"} 1' in lines
+    assert 'labhub_etl_stage_success{stage="Test.extract"} 0' in lines
+    # Stages without a rows_in value get no rows_in sample
+    assert not any(line.startswith('labhub_etl_stage_rows_in{stage="Test.extract"}') for line in lines)
+    assert any(line.startswith("labhub_etl_last_run_timestamp_seconds ") for line in lines)
+    assert not path.with_name("etl.prom.tmp").exists()
+
+
+def test_write_prometheus_can_be_disabled(tmp_path):
+    with RunRecorder() as recorder:
+        list(stream_batches())
+    recorder.write_prometheus("")
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,118 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from analytics.etl.facts.surrogate_keys import MISSING, FactKeyMaps, KeyMap, _event_micros
+from tests.fixtures import add_dates, add_locations, add_products, add_users, events
+
+
+def _micros(*timestamps):
+    return np.array([int((ts - datetime(1970, 1, 1)).total_seconds() * 1_000_000) for ts in timestamps], dtype=np.int64)
+
+
+def _ids(*values):
+    return np.array(values, dtype=np.int64)
+
+
+def test_dense_key_map():
+    key_map = KeyMap("Dim_Product", _ids(1, 2, 5), _ids(10, 20, 50))
+    assert key_map.dense is not None
+    assert key_map.lookup(_ids(5, 1, 3, MISSING, 0, 6, 10_000)).tolist() == [50, 10, MISSING, MISSING, MISSING, MISSING, MISSING]
+
+
+def test_sorted_key_map_for_sparse_ids():
+    key_map = KeyMap("Dim_Product", _ids(5_000_000, 7, 3), _ids(1, 2, 3))
+    assert key_map.dense is None and not key_map.versioned
+    assert key_map.lookup(_ids(3, 7, 5_000_000, 2, 4, 9_000_000, MISSING)).tolist() == [3, 2, 1, MISSING, MISSING, MISSING, MISSING]
+
+
+def test_empty_key_map_misses_everything():
+    key_map = KeyMap("Dim_Product", _ids(), _ids())
+    assert key_map.lookup(_ids(1, 2)).tolist() == [MISSING, MISSING]
+
+
+def test_versioned_key_map_picks_the_version_valid_at_the_event():
+    start, change, later_start = datetime(1900, 1, 1), datetime(2025, 6, 1), datetime(2025, 3, 1)
+    # ID 7 has two versions; ID 8 only exists from 2025-03-01
+    key_map = KeyMap(
+        "Dim_Product", _ids(7, 7, 8), _ids(1, 2, 3), valid_from=_micros(start, change, later_start),
+    )
+    assert key_map.versioned
+
+    at = _micros(datetime(2025, 1, 1), datetime(2025, 5, 31, 23, 59), change, datetime(2026, 1, 1))
+    assert key_map.lookup(_ids(7, 7, 7, 7), at).tolist() == [1, 1, 2, 2]
+    # Before its first version ID 8 must miss, not fall back to another ID's version
+    assert key_map.lookup(_ids(8, 8, 8), _micros(datetime(2025, 1, 1), later_start, change)).tolist() == [MISSING, 3, 3]
+    # Unknown IDs, NULL IDs and NULL event times (int64 min) miss
+    null_time = np.iinfo(np.int64).min
+    assert key_map.lookup(_ids(9, 6, MISSING, 7), np.array([at[0], at[0], at[0], null_time])).tolist() == [MISSING] * 4
+
+
+@pytest.fixture
+def key_maps(warehouse):
+    add_dates(warehouse, date(2023, 12, 30), date(2024, 3, 1))
+    warehouse.execute("DELETE FROM dw.Dim_Date WHERE DateKey = 20240115;")   # a gap
+    add_products(warehouse, 1, 2)
+    add_locations(warehouse, 10)
+    add_users(warehouse, 100)
+    return FactKeyMaps(warehouse)
+
+
+def test_date_keys_at_month_year_and_leap_day_edges(key_maps):
+    at = _micros(
+        datetime(2023, 12, 30), datetime(2023, 12, 31, 23, 59, 59, 999999), datetime(2024, 1, 1),
+        datetime(2024, 1, 31, 12), datetime(2024, 2, 1), datetime(2024, 2, 29, 23), datetime(2024, 3, 1),
+        datetime(2023, 12, 29, 23, 59), datetime(2024, 3, 2), datetime(2024, 1, 15, 8),
+    )
+    assert key_maps.date_keys(at).tolist() == [
+        20231230, 20231231, 20240101, 20240131, 20240201, 20240229, 20240301,
+        MISSING, MISSING, MISSING,   # before/after Dim_Date, and the missing day
+    ]
+
+
+def test_date_keys_before_the_epoch(warehouse):
+    add_dates(warehouse, date(1969, 12, 30), date(1970, 1, 2))
+    key_maps = FactKeyMaps(warehouse)
+    at = _micros(datetime(1969, 12, 31, 23), datetime(1970, 1, 1), datetime(1969, 12, 30))
+    assert key_maps.date_keys(at).tolist() == [19691231, 19700101, 19691230]
+
+
+def test_resolve_splits_misses_with_reasons(key_maps):
+    batch = events(
+        (1, 1, 10, 100, datetime(2024, 1, 2)),
+        (2, 99, 10, 555, datetime(2024, 1, 2)),     # unknown product and user
+        (3, 2, 11, 100, datetime(2024, 2, 29)),     # unknown location
+        (4, 2, 10, 100, datetime(2024, 1, 15)),     # day not in Dim_Date
+        (5, None, 10, 100, None),                   # NULL product and date
+    )
+    accepted, rejected = key_maps.resolve(batch)
+
+    assert accepted["TransactionID"].to_pylist() == [1]
+    assert accepted.select(["DateKey", "ProductKey", "LocationKey", "UserKey"]).to_pylist() == [
+        {"DateKey": 20240102, "ProductKey": 1, "LocationKey": 1, "UserKey": 1},
+    ]
+    assert dict(zip(rejected["TransactionID"].to_pylist(), rejected["RejectReason"].to_pylist())) == {
+        2: "MISSING_PRODUCT,MISSING_USER",
+        3: "MISSING_LOCATION",
+        4: "MISSING_DATE",
+        5: "MISSING_DATE,MISSING_PRODUCT",
+    }
+    # Rejected rows keep the source columns only
+    assert rejected.column_names == batch.column_names + ["RejectReason"]
+
+
+def test_attach_holds_back_rejects_until_taken(key_maps):
+    assert key_maps.take_rejected() is None
+    first = key_maps.attach(events((1, 1, 10, 100, datetime(2024, 1, 2)), (2, 99, 10, 100, datetime(2024, 1, 2))))
+    second = key_maps.attach(events((3, 1, 10, 100, datetime(2024, 1, 2))))
+    third = key_maps.attach(events((4, 1, 10, 999, datetime(2024, 1, 2))))
+
+    assert first.num_rows == 1 and second.num_rows == 1 and third.num_rows == 0
+    assert key_maps.take_rejected()["TransactionID"].to_pylist() == [2, 4]
+    assert key_maps.take_rejected() is None
+
+
+def test_event_micros_treats_null_dates_as_before_every_version():
+    micros = _event_micros(events((1, 1, 1, 1, None), (2, 1, 1, 1, datetime(1970, 1, 1, 0, 0, 1))))
+    assert micros.tolist() == [np.iinfo(np.int64).min, 1_000_000]
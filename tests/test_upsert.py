@@ -0,0 +1,142 @@
+from datetime import datetime
+
+import duckdb
+import pytest
+
+from analytics.etl.upsert import DIFF_TABLE, SCD_START, swap_table, upsert, upsert_scd2
+
+COLUMNS = ["ProductName", "CategoryName"]
+
+
+@pytest.fixture
+def duck_conn():
+    conn = duckdb.connect()
+    conn.execute("CREATE SCHEMA dw;")
+    conn.execute("CREATE SEQUENCE dw.seq_product_key START 1;")
+    conn.execute("""
+        CREATE TABLE dw.Dim_Product (
+            ProductKey INTEGER PRIMARY KEY DEFAULT nextval('dw.seq_product_key'),
+            ProductID INT NOT NULL,
+            ProductName VARCHAR(128) NOT NULL,
+            CategoryName VARCHAR(64),
+            RowHash UBIGINT,
+            EffectiveFrom TIMESTAMP DEFAULT TIMESTAMP '1900-01-01 00:00:00',
+            EffectiveTo TIMESTAMP,
+            IsCurrent BOOLEAN DEFAULT TRUE
+        );
+    """)
+    yield conn
+    conn.close()
+
+
+def _stage(conn, rows):
+    conn.execute("CREATE OR REPLACE TEMP TABLE tmp_dim_product (ProductID INT, ProductName VARCHAR, CategoryName VARCHAR);")
+    conn.executemany("INSERT INTO tmp_dim_product VALUES (?, ?, ?)", rows)
+
+
+def _products(conn):
+    return conn.execute("""
+        SELECT ProductKey, ProductID, ProductName, CategoryName, EffectiveFrom, EffectiveTo, IsCurrent
+        FROM dw.Dim_Product ORDER BY ProductKey
+    """).fetchall()
+
+
+def test_upsert_classifies_inserts_updates_and_unchanged_rows(duck_conn):
+    _stage(duck_conn, [(1, "Pipette", "Glass"), (2, "Beaker", None), (3, "Flask", "Glass")])
+    assert upsert(duck_conn, "dw.Dim_Product", "tmp_dim_product", ["ProductID"], COLUMNS, COLUMNS,
+                  hash_column="RowHash") == {"source": 3, "inserted": 3, "updated": 0, "unchanged": 0}
+
+    # 1 unchanged, 2 changed from NULL (hash-diff treats NULLs as values), 3 renamed, 4 new
+    _stage(duck_conn, [(1, "Pipette", "Glass"), (2, "Beaker", "Glass"), (3, "Flask 250ml", "Glass"), (4, "Tube", "Plastic")])
+    assert upsert(duck_conn, "dw.Dim_Product", "tmp_dim_product", ["ProductID"], COLUMNS, COLUMNS,
+                  hash_column="RowHash") == {"source": 4, "inserted": 1, "updated": 2, "unchanged": 1}
+
+    assert sorted(row[1:4] for row in _products(duck_conn)) == [
+        (1, "Pipette", "Glass"), (2, "Beaker", "Glass"), (3, "Flask 250ml", "Glass"), (4, "Tube", "Plastic"),
+    ]
+    # The stored hash is written back, so a rerun of the same batch changes nothing
+    assert upsert(duck_conn, "dw.Dim_Product", "tmp_dim_product", ["ProductID"], COLUMNS, COLUMNS,
+                  hash_column="RowHash") == {"source": 4, "inserted": 0, "updated": 0, "unchanged": 4}
+    assert not duck_conn.execute(
+        f"SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = '{DIFF_TABLE}'"
+    ).fetchone()[0]
+
+
+def test_upsert_without_hash_column_compares_stored_columns(duck_conn):
+    duck_conn.execute("INSERT INTO dw.Dim_Product (ProductID, ProductName, CategoryName) VALUES (1, 'Pipette', 'Glass'), (2, 'Beaker', 'Glass');")
+    _stage(duck_conn, [(1, "Pipette", "Glass"), (2, "Beaker", "Plastic")])
+
+    assert upsert(duck_conn, "dw.Dim_Product", "tmp_dim_product", ["ProductID"], COLUMNS, COLUMNS) == {
+        "source": 2, "inserted": 0, "updated": 1, "unchanged": 1,
+    }
+    assert [row[3] for row in _products(duck_conn)] == ["Glass", "Plastic"]
+
+
+def test_insert_only_upsert_anti_joins_existing_keys(duck_conn):
+    duck_conn.execute("INSERT INTO dw.Dim_Product (ProductID, ProductName, CategoryName) VALUES (1, 'Pipette', 'Glass');")
+    _stage(duck_conn, [(1, "Renamed", "Plastic"), (2, "Beaker", "Glass")])
+
+    assert upsert(duck_conn, "dw.Dim_Product", "tmp_dim_product", ["ProductID"], COLUMNS) == {
+        "source": 2, "inserted": 1, "updated": 0, "unchanged": 1,
+    }
+    # Existing rows are never overwritten on the insert-only path
+    assert [row[:4] for row in _products(duck_conn)] == [(1, 1, "Pipette", "Glass"), (2, 2, "Beaker", "Glass")]
+
+
+def test_upsert_scd2_closes_the_current_version_and_opens_a_new_one(duck_conn):
+    first_load, change = datetime(2025, 1, 1), datetime(2025, 6, 1)
+    _stage(duck_conn, [(1, "Pipette", "Glass"), (2, "Beaker", "Glass")])
+    assert upsert_scd2(duck_conn, "dw.Dim_Product", "tmp_dim_product", ["ProductID"], COLUMNS, "RowHash",
+                       effective_at=first_load) == {"source": 2, "inserted": 2, "updated": 0, "unchanged": 0}
+
+    _stage(duck_conn, [(1, "Pipette", "Glass"), (2, "Beaker", "Plastic"), (3, "Flask", "Glass")])
+    assert upsert_scd2(duck_conn, "dw.Dim_Product", "tmp_dim_product", ["ProductID"], COLUMNS, "RowHash",
+                       effective_at=change) == {"source": 3, "inserted": 1, "updated": 1, "unchanged": 1}
+
+    versions = sorted(_products(duck_conn), key=lambda row: (row[1], row[4]))
+    assert [row[1:] for row in versions] == [
+        (1, "Pipette", "Glass", SCD_START, None, True),
+        (2, "Beaker", "Glass", SCD_START, change, False),    # closed
+        (2, "Beaker", "Plastic", change, None, True),        # new version
+        (3, "Flask", "Glass", SCD_START, None, True),        # new keys are valid from SCD_START
+    ]
+    # The closed version keeps its surrogate key (facts point at it); the new one gets its own
+    assert versions[1][0] == 2 and versions[2][0] not in (1, 2, versions[3][0])
+
+    # Only the current version is compared: changing back opens a third version
+    _stage(duck_conn, [(2, "Beaker", "Glass")])
+    assert upsert_scd2(duck_conn, "dw.Dim_Product", "tmp_dim_product", ["ProductID"], COLUMNS, "RowHash",
+                       effective_at=datetime(2025, 9, 1))["updated"] == 1
+    assert duck_conn.execute(
+        "SELECT COUNT(*), COUNT(*) FILTER (WHERE IsCurrent) FROM dw.Dim_Product WHERE ProductID = 2"
+    ).fetchone() == (3, 1)
+
+
+def test_swap_table_inside_an_open_transaction(duck_conn):
+    duck_conn.execute("INSERT INTO dw.Dim_Product (ProductID, ProductName) VALUES (1, 'Pipette'), (2, 'Beaker');")
+
+    duck_conn.execute("BEGIN TRANSACTION;")
+    # The same primary keys are written twice in one transaction, which DELETE + INSERT cannot do
+    for _ in range(2):
+        assert swap_table(duck_conn, "dw.Dim_Product",
+                          "SELECT ProductKey, ProductID, upper(ProductName), 'Glass', NULL, TIMESTAMP '1900-01-01', NULL, TRUE "
+                          "FROM dw.Dim_Product") == 2
+    duck_conn.execute("COMMIT;")
+
+    assert [row[:4] for row in _products(duck_conn)] == [(1, 1, "PIPETTE", "Glass"), (2, 2, "BEAKER", "Glass")]
+    # The copy keeps the DDL: primary key and sequence default
+    with pytest.raises(duckdb.ConstraintException):
+        duck_conn.execute("INSERT INTO dw.Dim_Product (ProductKey, ProductID, ProductName) VALUES (1, 9, 'Dup');")
+    duck_conn.execute("INSERT INTO dw.Dim_Product (ProductID, ProductName) VALUES (3, 'Flask');")
+    assert duck_conn.execute("SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'Dim_Product_rebuild'").fetchone()[0] == 0
+
+
+def test_swap_table_rolls_back_with_the_transaction(duck_conn):
+    duck_conn.execute("INSERT INTO dw.Dim_Product (ProductID, ProductName) VALUES (1, 'Pipette');")
+
+    duck_conn.execute("BEGIN TRANSACTION;")
+    swap_table(duck_conn, "dw.Dim_Product", "SELECT * FROM dw.Dim_Product WHERE FALSE")
+    assert duck_conn.execute("SELECT COUNT(*) FROM dw.Dim_Product").fetchone()[0] == 0
+    duck_conn.execute("ROLLBACK;")
+
+    assert [row[2] for row in _products(duck_conn)] == ["Pipette"]